@@ -5,6 +5,13 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+The async endpoints under /api/async/ only run natively on the event loop when
+served from here, e.g.:
+
+    gunicorn dissertation_project.asgi:application -k uvicorn.workers.UvicornWorker -w 4
+
+Compare against the WSGI deployment with ``python manage.py loadtest``.
 """
 
 import os
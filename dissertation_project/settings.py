@@ -59,8 +59,13 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     # 'corsheaders.middleware.CorsMiddleware',
+    'student_dissertation.middleware.RequestMetricsMiddleware',
+    'student_dissertation.middleware.AuditRequestMiddleware',
 ]
 
+# Log every SQL query slower than this many milliseconds (None disables the slow query log)
+SLOW_QUERY_THRESHOLD_MS = None
+
 # Allow React frontend
 CORS_ALLOWED_ORIGINS = [
     "https://react-dissertation.vercel.app",  # React frontend domain
@@ -139,6 +144,44 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Cold tier for closed repository years (see archive_repository_year); kept outside MEDIA_ROOT
+REPOSITORY_ARCHIVE_ROOT = os.path.join(BASE_DIR, 'archive')
+
+# Presigned uploads go straight to the object store (see student_dissertation/object_storage.py).
+# Without OBJECT_STORAGE the local stand-in under MEDIA_ROOT is used; for S3 or MinIO use e.g.
+# OBJECT_STORAGE = {
+#     'BACKEND': 'student_dissertation.object_storage.S3ObjectStorage',
+#     'OPTIONS': {'bucket': 'dissertations', 'endpoint_url': 'http://localhost:9000',
+#                 'access_key': '...', 'secret_key': '...'},
+# }
+# together with a matching django-storages 'repository' entry in STORAGES.
+OBJECT_STORAGE_MAX_UPLOAD_SIZE = 200 * 1024 * 1024
+
+# Per file_type upload quotas and allowed content (see student_dissertation/upload_validation.py);
+# REPOSITORY_UPLOAD_RULES overrides the defaults there.
+# Optional background malware scan of uploads, e.g.
+# UPLOAD_SCANNER = {'BACKEND': 'student_dissertation.scanners.ClamdScanner', 'OPTIONS': {'host': 'localhost'}}
+UPLOAD_SCANNER = None
+UPLOAD_QUARANTINE_ROOT = os.path.join(BASE_DIR, 'quarantine')
+
+# Storage quotas, counted from StorageUsage (see student_dissertation/quotas.py)
+STUDENT_STORAGE_QUOTA = 1024 * 1024 * 1024
+GROUP_STORAGE_QUOTA = 5 * 1024 * 1024 * 1024
+
+# Default most projects (individual students or groups) per supervisor for automatic allocation
+SUPERVISOR_CAPACITY = 10
+
+# Minutes a consultation booked without an availability slot is taken to last
+CONSULTATION_LENGTH = 30
+
+# Audit events are buffered in memory and written in batches by a background thread
+# (see student_dissertation/audit.py); FLUSH_INTERVAL None writes them only on flush()
+AUDIT_LOG = {'BUFFER_SIZE': 10000, 'BATCH_SIZE': 500, 'FLUSH_INTERVAL': 2.0}
+
+# Notifications and emails triggered by saves run after commit, emails on a pool of WORKERS
+# threads (see student_dissertation/side_effects.py); WORKERS 0 sends them inline
+SIDE_EFFECTS = {'WORKERS': 4}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
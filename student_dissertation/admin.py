@@ -1,16 +1,245 @@
-from django.contrib import admin
-from .models import Student, Document, Consultation, Announcement, Feedback, Stage, Milestone, Course, YearOfStudy, ProjectGroup, Project, FileRepository, Notification
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.prefetch import GenericPrefetch
+from django.core.paginator import Paginator
+from django.db import connections, DatabaseError
+from django.utils.functional import cached_property
+
+from .models import Student, Document, Consultation, Announcement, Feedback, Stage, Milestone, Course, YearOfStudy, ProjectGroup, Project
+from .models import FileRepository, Notification, ArchivedNotification, RepositoryArchive, ArchiveEntry, AuditEvent
+from . import allocation
+
+# Unfiltered changelists of tables at least this big show the database's row estimate
+ESTIMATE_THRESHOLD = 100000
+
+
+def estimated_count(queryset):
+    """
+    The database's own estimate of the rows in the queryset's table (None if it has none):
+    pg_class.reltuples, information_schema TABLE_ROWS or, after ANALYZE, sqlite_stat1.
+    """
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    queries = {
+        'postgresql': ("SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)", [connection.ops.quote_name(table)]),
+        'mysql': ("SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s", [table]),
+        'sqlite': ("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table]),
+    }
+    if connection.vendor not in queries:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(*queries[connection.vendor])
+            row = cursor.fetchone()
+    except DatabaseError:
+        # No statistics gathered yet (sqlite_stat1 only exists after ANALYZE)
+        return None
+    if row is None or row[0] is None:
+        return None
+    estimate = int(str(row[0]).split()[0]) if connection.vendor == 'sqlite' else int(row[0])
+    return estimate if estimate >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that does not COUNT(*) a large table for an unfiltered changelist.
+    """
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            estimate = estimated_count(self.object_list)
+            if estimate is not None and estimate >= ESTIMATE_THRESHOLD:
+                return estimate
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    # Filtered changelists would otherwise count the whole table a second time
+    show_full_result_count = False
+    list_per_page = 50
+
+
+class SupervisorActionForm(ActionForm):
+    supervisor = forms.ModelChoiceField(
+        queryset=User.objects.filter(groups__name='Supervisor').order_by('username'), required=False,
+        help_text="For the assign supervisor action.",
+    )
+
+
+def _assign_supervisor(modeladmin, request, queryset, target):
+    form = modeladmin.action_form(request.POST)
+    form.fields['action'].choices = modeladmin.get_action_choices(request)
+    supervisor = form.cleaned_data['supervisor'] if form.is_valid() else None
+    if supervisor is None:
+        modeladmin.message_user(request, "Choose a supervisor to assign.", messages.WARNING)
+        return
+    changed = sum(allocation.assign_supervisor(supervisor, **{target: queryset}))
+    modeladmin.message_user(request, f"Assigned {supervisor.username} to {changed} {target}.", messages.SUCCESS)
+
+
+@admin.register(Student)
+class StudentAdmin(LargeTableAdmin):
+    list_display = ('reg_number', 'full_name', 'course', 'year_of_study', 'supervisor', 'current_group')
+    list_select_related = ('course', 'year_of_study', 'supervisor', 'current_group__course', 'current_group__year')
+    list_filter = ('course', 'year_of_study')
+    search_fields = ('reg_number', 'full_name')
+    autocomplete_fields = ('user', 'supervisor')
+    # Kept in step with ProjectGroup.members by signals; an edit here would drift from them
+    readonly_fields = ('current_group',)
+    action_form = SupervisorActionForm
+    actions = ['assign_supervisor']
+
+    @admin.action(description="Assign the chosen supervisor to the selected students")
+    def assign_supervisor(self, request, queryset):
+        _assign_supervisor(self, request, queryset, 'students')
+
+
+@admin.register(ProjectGroup)
+class ProjectGroupAdmin(LargeTableAdmin):
+    list_display = ('name', 'course', 'year', 'supervisor', 'leader', 'project_title')
+    list_select_related = ('course', 'year', 'supervisor', 'leader')
+    list_filter = ('course', 'year')
+    search_fields = ('name', 'project_title')
+    autocomplete_fields = ('supervisor', 'leader')
+    raw_id_fields = ('members',)
+    action_form = SupervisorActionForm
+    actions = ['assign_supervisor']
+
+    @admin.action(description="Assign the chosen supervisor to the selected groups")
+    def assign_supervisor(self, request, queryset):
+        _assign_supervisor(self, request, queryset, 'groups')
+
+
+@admin.register(Milestone)
+class MilestoneAdmin(LargeTableAdmin):
+    list_display = ('milestone', 'target', 'stage', 'status', 'completion_date', 'supervisor')
+    list_select_related = ('student', 'group', 'stage', 'supervisor')
+    list_filter = ('status', 'stage')
+    search_fields = ('milestone', 'student__reg_number', 'group__name')
+    autocomplete_fields = ('student', 'group', 'supervisor')
+    actions = ['mark_pending', 'mark_in_progress', 'mark_completed']
+
+    @admin.display(description="Student or group")
+    def target(self, obj):
+        return obj.student.full_name if obj.student_id else f"Group: {obj.group.name}"
+
+    def _set_status(self, request, queryset, status):
+        updated = queryset.exclude(status=status).update(status=status)
+        self.message_user(request, f"{updated} milestone(s) marked {status}.", messages.SUCCESS)
+
+    @admin.action(description="Mark the selected milestones Pending")
+    def mark_pending(self, request, queryset):
+        self._set_status(request, queryset, 'Pending')
+
+    @admin.action(description="Mark the selected milestones In Progress")
+    def mark_in_progress(self, request, queryset):
+        self._set_status(request, queryset, 'In Progress')
+
+    @admin.action(description="Mark the selected milestones Completed")
+    def mark_completed(self, request, queryset):
+        self._set_status(request, queryset, 'Completed')
+
+
+@admin.register(Document)
+class DocumentAdmin(LargeTableAdmin):
+    list_display = ('title', 'owner', 'supervisor', 'uploaded_at', 'size')
+    list_select_related = ('supervisor',)
+    search_fields = ('title',)
+    autocomplete_fields = ('supervisor',)
+
+    def get_queryset(self, request):
+        # Owners in one query per type instead of one per row, groups with what __str__ needs
+        return super().get_queryset(request).prefetch_related(
+            GenericPrefetch('owner', [Student.objects.all(), ProjectGroup.objects.select_related('course', 'year')]),
+        )
+
+
+@admin.register(Notification)
+class NotificationAdmin(LargeTableAdmin):
+    list_display = ('recipient', 'short_message', 'is_read', 'created_at')
+    list_select_related = ('recipient',)
+    list_filter = ('is_read',)
+    search_fields = ('recipient__username',)
+    autocomplete_fields = ('recipient',)
+    actions = ['mark_read', 'mark_unread']
+
+    @admin.display(description="Message")
+    def short_message(self, obj):
+        return obj.message[:80]
+
+    @admin.action(description="Mark the selected notifications read")
+    def mark_read(self, request, queryset):
+        updated = queryset.filter(is_read=False).update(is_read=True)
+        self.message_user(request, f"{updated} notification(s) marked read.", messages.SUCCESS)
+
+    @admin.action(description="Mark the selected notifications unread")
+    def mark_unread(self, request, queryset):
+        updated = queryset.filter(is_read=True).update(is_read=False)
+        self.message_user(request, f"{updated} notification(s) marked unread.", messages.SUCCESS)
+
+
+@admin.register(ArchivedNotification)
+class ArchivedNotificationAdmin(LargeTableAdmin):
+    list_display = ('recipient', 'created_at', 'archived_at')
+    list_select_related = ('recipient',)
+    autocomplete_fields = ('recipient',)
+
+
+@admin.register(Consultation)
+class ConsultationAdmin(LargeTableAdmin):
+    list_display = ('topic', 'student', 'supervisor', 'proposed_date', 'status')
+    list_select_related = ('student', 'supervisor')
+    list_filter = ('status',)
+    autocomplete_fields = ('student', 'supervisor')
+    raw_id_fields = ('slot',)
+
+
+@admin.register(Feedback)
+class FeedbackAdmin(LargeTableAdmin):
+    list_display = ('student', 'supervisor', 'created_at')
+    list_select_related = ('student', 'supervisor')
+    autocomplete_fields = ('student', 'supervisor')
+
+
+@admin.register(FileRepository)
+class FileRepositoryAdmin(LargeTableAdmin):
+    list_display = ('id', 'file', 'student', 'group', 'file_type', 'version', 'year', 'scan_status')
+    list_select_related = ('student', 'group__course', 'group__year')
+    list_filter = ('file_type', 'scan_status', 'year')
+    autocomplete_fields = ('student', 'group')
+    raw_id_fields = ('delta_base',)
+
+
+@admin.register(ArchiveEntry)
+class ArchiveEntryAdmin(LargeTableAdmin):
+    list_display = ('file', 'archive', 'offset', 'length', 'size')
+    list_select_related = ('file', 'archive')
+    raw_id_fields = ('file',)
+
+
+@admin.register(AuditEvent)
+class AuditEventAdmin(LargeTableAdmin):
+    list_display = ('created_at', 'actor', 'action', 'target_type', 'target_id', 'changes')
+    list_select_related = ('actor',)
+
+    # Append-only: events are written by audit.py alone
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 
 admin.site.register(Course)
 admin.site.register(YearOfStudy)
-admin.site.register(Student)
-admin.site.register(Document)
-admin.site.register(Consultation)
 admin.site.register(Announcement)
-admin.site.register(Feedback)
 admin.site.register(Stage)
-admin.site.register(Milestone)
-admin.site.register(ProjectGroup)
 admin.site.register(Project)
-admin.site.register(FileRepository)
-admin.site.register(Notification)
+admin.site.register(RepositoryArchive)
@@ -0,0 +1,326 @@
+"""
+Automatic supervisor allocation.
+
+Students without a group and groups that have no supervisor yet ("units") are assigned to
+members of the Supervisor group as a min-cost flow: every unit sends one unit of flow to a
+supervisor and on to the sink. A unit -> supervisor arc costs how much worse the pairing is
+than the best preference score given, and each project a supervisor takes on costs
+``balance`` times the projects they already have, so loads are evened out as far as the
+preferences allow. A group is one project,
+the same as an individual student. Capacities, scores and ``balance`` come from the caller.
+
+Units are placed one at a time along the cheapest augmenting path from any unit still to be
+placed (successive shortest paths), which may move already placed units between
+supervisors; this places as many units as capacity allows at the least total cost. Because
+every placed unit sits at exactly one supervisor, paths are searched on the supervisors
+alone: moving a unit from supervisor a to b costs cost[u, b] - cost[u, a], and the cheapest
+such move for each (a, b) is kept in a supervisors x supervisors matrix, so a search costs a
+few S x S NumPy operations whatever the number of students.
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count
+import numpy as np
+
+from .models import Student, ProjectGroup, Notification
+from . import audit, side_effects
+
+
+class Allocation:
+    """
+    Result of ``allocate``: ``assignment[i]`` is the index into ``supervisors`` of the
+    supervisor chosen for ``units[i]``, or -1 if it could not be placed.
+    """
+
+    def __init__(self, units, supervisors, capacity, load_before, assignment, scores):
+        self.units = units
+        self.supervisors = supervisors
+        self.capacity = capacity
+        self.load_before = load_before
+        self.assignment = assignment
+        self.scores = scores
+
+    @property
+    def load_after(self):
+        placed = self.assignment[self.assignment >= 0]
+        return self.load_before + np.bincount(placed, minlength=len(self.supervisors))
+
+    def pairs(self):
+        for unit, index in zip(self.units, self.assignment.tolist()):
+            yield unit, self.supervisors[index] if index >= 0 else None
+
+    def as_dict(self):
+        students, groups, unassigned = [], [], {'students': [], 'groups': []}
+        for (unit, supervisor), score in zip(self.pairs(), self.scores.tolist()):
+            if isinstance(unit, ProjectGroup):
+                if supervisor is None:
+                    unassigned['groups'].append(unit.id)
+                    continue
+                groups.append({'group_id': unit.id, 'name': unit.name})
+                row = groups[-1]
+            else:
+                if supervisor is None:
+                    unassigned['students'].append(unit.reg_number)
+                    continue
+                students.append({'reg_number': unit.reg_number, 'full_name': unit.full_name})
+                row = students[-1]
+            row.update({'supervisor_id': supervisor.id, 'supervisor': supervisor.username, 'score': score})
+
+        loads = [
+            {'supervisor_id': supervisor.id, 'supervisor': supervisor.username,
+             'before': int(before), 'after': int(after), 'capacity': int(capacity)}
+            for supervisor, before, after, capacity
+            in zip(self.supervisors, self.load_before, self.load_after, self.capacity)
+        ]
+        return {'students': students, 'groups': groups, 'unassigned': unassigned, 'loads': loads}
+
+
+def solve(cost, capacity, load, balance=1.0):
+    """
+    Assign each row of ``cost`` (units x supervisors, np.inf where a pairing is not allowed)
+    to a supervisor with spare ``capacity``, minimising the total cost plus ``balance`` times
+    the projects each supervisor already has (``load``) for every project added.
+    Returns the supervisor index per unit, -1 for units that cannot be placed.
+    """
+    n_units, n_supervisors = cost.shape
+    load = np.array(load, dtype=np.int64)
+    capacity = np.asarray(capacity)
+    assignment = np.full(n_units, -1, dtype=np.int64)
+    members = [[] for _ in range(n_supervisors)]
+    columns = np.arange(n_supervisors)
+
+    # move[a, b]: cheapest cost of moving one of a's units to b; via[a, b]: that unit
+    move = np.full((n_supervisors, n_supervisors), np.inf)
+    via = np.full((n_supervisors, n_supervisors), -1, dtype=np.int64)
+
+    def refresh(supervisor):
+        if not members[supervisor]:
+            move[supervisor] = np.inf
+            return
+        units = np.array(members[supervisor])
+        delta = cost[units] - cost[units, supervisor][:, None]
+        best = delta.argmin(axis=0)
+        move[supervisor] = delta[best, columns]
+        via[supervisor] = units[best]
+        move[supervisor, supervisor] = np.inf
+
+    # Costs from units not placed yet, supervisor-major; a placed unit's column is blanked
+    # out. first[s] is the cheapest pending unit for supervisor s
+    pending = cost.T.copy()
+    first = pending.argmin(axis=1)
+    while True:
+        # Bellman-Ford from all pending units at once over the supervisors; the residual graph
+        # has no negative cycles, so it settles within n_supervisors rounds
+        distance = pending[columns, first]
+        previous = np.full(n_supervisors, -1, dtype=np.int64)
+        for _ in range(n_supervisors):
+            through = distance[:, None] + move
+            source = through.argmin(axis=0)
+            best = through[source, columns]
+            improved = best < distance - 1e-9
+            if not improved.any():
+                break
+            distance[improved] = best[improved]
+            previous[improved] = source[improved]
+
+        total = np.where(load < capacity, distance + balance * load, np.inf)
+        end = int(total.argmin())
+        if not np.isfinite(total[end]):
+            # No pending unit can be placed any more
+            break
+
+        changed = {end}
+        supervisor = end
+        while previous[supervisor] != -1:
+            origin = int(previous[supervisor])
+            moved = int(via[origin, supervisor])
+            members[origin].remove(moved)
+            members[supervisor].append(moved)
+            assignment[moved] = supervisor
+            changed.add(origin)
+            supervisor = origin
+        unit = int(first[supervisor])
+        members[supervisor].append(unit)
+        assignment[unit] = supervisor
+        pending[:, unit] = np.inf
+        stale = np.flatnonzero(first == unit)
+        first[stale] = pending[stale].argmin(axis=1)
+        changed.add(supervisor)
+        load[end] += 1
+
+        for supervisor in changed:
+            refresh(supervisor)
+
+    return assignment
+
+
+def current_loads(supervisors):
+    """
+    Projects each supervisor already has: individual students plus groups.
+    """
+    ids = [supervisor.id for supervisor in supervisors]
+    counts = dict.fromkeys(ids, 0)
+    students = (
+        Student.objects.filter(supervisor_id__in=ids, project_groups__isnull=True)
+        .values('supervisor_id').annotate(n=Count('id')).order_by()
+    )
+    groups = ProjectGroup.objects.filter(supervisor_id__in=ids).values('supervisor_id').annotate(n=Count('id')).order_by()
+    for row in list(students) + list(groups):
+        counts[row['supervisor_id']] += row['n']
+    return np.array([counts[id] for id in ids], dtype=np.int64)
+
+
+def allocate(capacities=None, scores=(), balance=1.0, course=None, year=None):
+    """
+    Compute (without saving) an allocation for every unsupervised student without a group and
+    every unsupervised group, optionally only those of one course and year.
+
+    ``capacities`` maps supervisor id to the most projects they may have (default
+    SUPERVISOR_CAPACITY). ``scores`` is an iterable of dicts with ``student`` (reg number) or
+    ``group`` (id), ``supervisor_id`` and ``score``; higher scores are preferred, pairs
+    without one score 0 and a ``None`` score rules the pairing out.
+    """
+    students = Student.objects.filter(supervisor__isnull=True, project_groups__isnull=True)
+    groups = ProjectGroup.objects.filter(supervisor__isnull=True)
+    if course is not None:
+        students = students.filter(course_id=course)
+        groups = groups.filter(course_id=course)
+    if year is not None:
+        students = students.filter(year_of_study_id=year)
+        groups = groups.filter(year_id=year)
+    units = list(students.order_by('id')) + list(groups.order_by('id'))
+    supervisors = list(User.objects.filter(groups__name='Supervisor').order_by('id'))
+
+    capacities = {int(key): int(value) for key, value in (capacities or {}).items()}
+    default_capacity = getattr(settings, 'SUPERVISOR_CAPACITY', 10)
+    capacity = np.array([capacities.get(supervisor.id, default_capacity) for supervisor in supervisors], dtype=np.int64)
+    load = current_loads(supervisors)
+
+    row_of = {}
+    for row, unit in enumerate(units):
+        row_of[('group', unit.id) if isinstance(unit, ProjectGroup) else ('student', unit.reg_number)] = row
+    column_of = {supervisor.id: column for column, supervisor in enumerate(supervisors)}
+
+    score = np.zeros((len(units), len(supervisors)))
+    allowed = np.ones_like(score, dtype=bool)
+    for entry in scores:
+        key = ('group', int(entry['group'])) if entry.get('group') is not None else ('student', entry.get('student'))
+        row, column = row_of.get(key), column_of.get(int(entry['supervisor_id']))
+        if row is None or column is None:
+            continue
+        if entry.get('score') is None:
+            allowed[row, column] = False
+        else:
+            score[row, column] = float(entry['score'])
+
+    best = score[allowed].max() if allowed.any() else 0.0
+    cost = np.where(allowed, best - score, np.inf)
+    assignment = solve(cost, capacity, load, balance) if units and supervisors else np.full(len(units), -1)
+
+    chosen = np.zeros(len(units))
+    placed = assignment >= 0
+    chosen[placed] = score[np.flatnonzero(placed), assignment[placed]]
+    return Allocation(units, supervisors, capacity, load, assignment, chosen)
+
+
+def assignment_message(student):
+    return f"You have been assigned a new student: {student.full_name} ({student.reg_number})"
+
+
+def assignment_email(supervisor, students):
+    """
+    The email (a send_mass_mail tuple) telling ``supervisor`` about the students just assigned
+    to them.
+    """
+    listing = '\n'.join(
+        f"- {student.full_name} ({student.reg_number}): {student.project_title or 'N/A'}" for student in students
+    )
+    return (
+        "New Student Assignment Notification",
+        f"Dear {supervisor.get_full_name() or supervisor.username},\n\n"
+        f"You have been assigned {len(students)} new student(s):\n\n{listing}\n\n"
+        f"Please log in to your dashboard to view more details.",
+        None,
+        [supervisor.email],
+    )
+
+
+def _assignment_notices(supervisor, students):
+    notifications = [Notification(recipient=supervisor, message=assignment_message(student)) for student in students]
+    return notifications, assignment_email(supervisor, students)
+
+
+def _audit_assignments(supervisor, students, groups):
+    """
+    Audit the (id, previous supervisor id) pairs of students and groups given ``supervisor``.
+    """
+    for target_type, changed in (('student', students), ('group', groups)):
+        audit.record_many('supervisor.assigned', target_type, {
+            target_id: {'supervisor': [previous, supervisor.id]} for target_id, previous in changed
+        })
+
+
+def assign_supervisor(supervisor, students=None, groups=None):
+    """
+    Give the students and groups of the querysets ``supervisor`` with one UPDATE each, and notify
+    the supervisor about the students that changed hands as apply_allocation does. Returns the
+    number of students and groups changed.
+    """
+    with transaction.atomic():
+        placed, changed_groups = [], []
+        if students is not None:
+            placed = list(students.exclude(supervisor=supervisor).select_for_update().order_by('reg_number'))
+            Student.objects.filter(id__in=[student.id for student in placed]).update(supervisor=supervisor)
+        if groups is not None:
+            changed_groups = list(groups.exclude(supervisor=supervisor).select_for_update().values_list('id', 'supervisor_id'))
+            ProjectGroup.objects.filter(id__in=[group_id for group_id, _ in changed_groups]).update(supervisor=supervisor)
+        _audit_assignments(supervisor, [(student.id, student.supervisor_id) for student in placed], changed_groups)
+        if placed:
+            notifications, email = _assignment_notices(supervisor, placed)
+            Notification.objects.bulk_create(notifications)
+            side_effects.send_emails(email)
+    return len(placed), len(changed_groups)
+
+
+def apply_allocation(allocation):
+    """
+    Save an allocation with one UPDATE per supervisor and notify the supervisors in bulk.
+    Units that got a supervisor in the meantime are left alone. Returns the number of
+    students and groups assigned.
+    """
+    students, groups = {}, {}
+    for unit, supervisor in allocation.pairs():
+        if supervisor is not None:
+            target = groups if isinstance(unit, ProjectGroup) else students
+            target.setdefault(supervisor, []).append(unit)
+
+    assigned_students = assigned_groups = 0
+    notifications, emails = [], []
+    with transaction.atomic():
+        for supervisor, units in students.items():
+            ids = [student.id for student in units]
+            # Only still-unsupervised students; fetch them first to notify about exactly those
+            placed = list(Student.objects.select_for_update().filter(id__in=ids, supervisor__isnull=True))
+            if not placed:
+                continue
+            Student.objects.filter(id__in=[student.id for student in placed]).update(supervisor=supervisor)
+            assigned_students += len(placed)
+            _audit_assignments(supervisor, [(student.id, None) for student in placed], [])
+            supervisor_notifications, email = _assignment_notices(supervisor, placed)
+            notifications += supervisor_notifications
+            emails.append(email)
+        for supervisor, units in groups.items():
+            placed_groups = list(
+                ProjectGroup.objects.select_for_update()
+                .filter(id__in=[group.id for group in units], supervisor__isnull=True).values_list('id', flat=True)
+            )
+            ProjectGroup.objects.filter(id__in=placed_groups).update(supervisor=supervisor)
+            assigned_groups += len(placed_groups)
+            _audit_assignments(supervisor, [], [(group_id, None) for group_id in placed_groups])
+
+        Notification.objects.bulk_create(notifications)
+        # One message per supervisor over a single connection, once the assignments are saved
+        side_effects.send_emails(*emails)
+
+    return assigned_students, assigned_groups
@@ -0,0 +1,119 @@
+"""
+On-the-fly ZIP archives of the file repository.
+
+The archive is produced by a generator: every file is copied into the zip in chunks and the
+compressed bytes are handed to the response as soon as they are written, so neither a temp
+file nor the whole archive is ever held by the worker.
+"""
+import csv
+import io
+import posixpath
+import zipfile
+
+from django.utils import timezone
+
+from .versions import open_version
+
+
+CHUNK_SIZE = 64 * 1024
+
+MANIFEST_HEADERS = ['id', 'path', 'owner', 'file_type', 'year', 'version', 'uploaded_at', 'size', 'description', 'status']
+
+
+class ZipStream:
+    """
+    Write-only, non-seekable sink for zipfile. zipfile then writes data descriptors after
+    each member instead of seeking back, which is what makes streaming possible.
+    """
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        """
+        Return what was written since the last call, as a list of zero or one chunk.
+        """
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return [data] if data else []
+
+
+def _safe(name):
+    return (name or 'unnamed').replace('/', '-').replace('\\', '-').strip() or 'unnamed'
+
+
+def archive_path(file_repo, used):
+    """
+    Folder per student or group: ``students/<reg number> - <name>/<file>`` or ``groups/<name>/<file>``.
+    """
+    if file_repo.student_id:
+        folder = f"students/{_safe(file_repo.student.reg_number)} - {_safe(file_repo.student.full_name)}"
+    else:
+        folder = f"groups/{_safe(file_repo.group.name if file_repo.group_id else None)}"
+
+    basename = _safe(file_repo.filename)
+    path = posixpath.join(folder, basename)
+    if path in used:
+        path = posixpath.join(folder, f"v{file_repo.version}-{file_repo.id}-{basename}")
+    used.add(path)
+    return path
+
+
+def _open_member(file_repo, storage):
+    """
+    Open the file for the archive, or return None and the reason it is left out.
+    """
+    if file_repo.scan_status in ('pending', 'quarantined'):
+        return None, file_repo.scan_status
+    try:
+        return open_version(file_repo, storage), 'ok'
+    except (OSError, ValueError):
+        return None, 'missing'
+
+
+def iter_repository_zip(files, storage=None):
+    """
+    Yield a ZIP of the given FileRepository queryset plus a ``manifest.csv`` describing every
+    entry. Members are stored uncompressed: the repository holds PDFs, Office files and source
+    archives that are already compressed. Files are read from whichever storage tier holds them,
+    delta-stored versions are rebuilt in full; files missing from storage, still being scanned or
+    quarantined are only listed in the manifest.
+    """
+    sink = ZipStream()
+    manifest = io.StringIO()
+    manifest_writer = csv.writer(manifest)
+    manifest_writer.writerow(MANIFEST_HEADERS)
+    used = set()
+
+    files = files.order_by('id').select_related('student', 'group', 'archive_entry__archive')
+
+    with zipfile.ZipFile(sink, mode='w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for file_repo in files.iterator(chunk_size=500):
+            path = archive_path(file_repo, used)
+            owner = file_repo.student.reg_number if file_repo.student_id else getattr(file_repo.group, 'name', None)
+            source, state = _open_member(file_repo, storage)
+            size = 0
+
+            if source is not None:
+                info = zipfile.ZipInfo(path, date_time=timezone.localtime(file_repo.uploaded_at).timetuple()[:6])
+                with source, archive.open(info, mode='w', force_zip64=True) as member:
+                    for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                        member.write(chunk)
+                        size += len(chunk)
+                        yield from sink.drain()
+                yield from sink.drain()
+
+            manifest_writer.writerow([
+                file_repo.id, path, owner, file_repo.file_type, file_repo.year, file_repo.version,
+                file_repo.uploaded_at.isoformat(), size, file_repo.description, state,
+            ])
+
+        archive.writestr('manifest.csv', manifest.getvalue(), compress_type=zipfile.ZIP_DEFLATED)
+
+    yield from sink.drain()
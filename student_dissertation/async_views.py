@@ -0,0 +1,193 @@
+"""
+Async counterparts of the I/O heavy list and upload endpoints.
+
+These are plain Django async views (DRF's APIView is sync only) and only pay off when the
+project is served through ``dissertation_project.asgi`` by uvicorn or gunicorn with
+uvicorn workers; under WSGI Django runs them in a thread like any sync view.
+"""
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework import serializers
+from rest_framework.authtoken.models import Token
+
+from .models import Student, ProjectGroup, FileRepository
+from .object_storage import repository_storage
+from . import quotas
+from .versions import add_version
+from .upload_validation import install_upload_validation, check_upload, UploadRejected
+
+
+_datetime_field = serializers.DateTimeField()
+
+
+async def _aget_user(request):
+    """
+    Resolve the user from an ``Authorization: Token <key>`` header, like TokenAuthentication.
+    """
+    header = request.headers.get('Authorization', '').split()
+    if len(header) != 2 or header[0].lower() != 'token':
+        return None
+    try:
+        token = await Token.objects.select_related('user').aget(key=header[1])
+    except Token.DoesNotExist:
+        return None
+    return token.user if token.user.is_active else None
+
+
+def _unauthorized():
+    return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+
+def _file_url(request, name, pk=None, archived=False):
+    if archived:
+        return request.build_absolute_uri(reverse('repository-download', args=[pk]))
+    return request.build_absolute_uri(repository_storage().url(name)) if name else None
+
+
+@require_GET
+async def student_list(request):
+    """
+    Async version of StudentListView with the same response shape as StudentSerializer.
+    """
+    user = await _aget_user(request)
+    if user is None:
+        return _unauthorized()
+    if not await user.groups.filter(name='Admin').aexists():
+        return JsonResponse({'error': 'Unauthorized access'}, status=403)
+
+    rows = Student.objects.order_by('id').values(
+        'id', 'reg_number', 'full_name', 'sex', 'project_title',
+        'supervisor__username', 'supervisor__email',
+        'course_id', 'course__name', 'year_of_study_id', 'year_of_study__year',
+    )
+
+    data = []
+    async for row in rows:
+        data.append({
+            'id': row['id'],
+            'reg_number': row['reg_number'],
+            'full_name': row['full_name'],
+            'sex': row['sex'],
+            'project_title': row['project_title'],
+            'supervisor': {
+                'username': row['supervisor__username'],
+                'email': row['supervisor__email'],
+            } if row['supervisor__username'] is not None else None,
+            'course': {'id': row['course_id'], 'name': row['course__name']} if row['course_id'] else None,
+            'year_of_study': {'id': row['year_of_study_id'], 'year': row['year_of_study__year']} if row['year_of_study_id'] else None,
+        })
+    return JsonResponse(data, safe=False)
+
+
+@require_GET
+async def repository_list(request):
+    """
+    Async version of AdminRepositoryView.get with the same response shape as FileRepositorySerializer.
+    """
+    user = await _aget_user(request)
+    if user is None:
+        return _unauthorized()
+
+    files = FileRepository.objects.order_by('id')
+    file_type = request.GET.get('file_type')
+    year = request.GET.get('year')
+    if file_type:
+        files = files.filter(file_type=file_type)
+    if year:
+        files = files.filter(year=year)
+
+    data = []
+    async for row in files.values(
+        'id', 'student_id', 'group_id', 'student__full_name', 'group__name',
+        'file', 'file_type', 'description', 'uploaded_at', 'version', 'name', 'year', 'scan_status', 'archive_entry__id', 'delta_base_id',
+    ):
+        served_by_api = row['archive_entry__id'] is not None or row['delta_base_id'] is not None
+        data.append({
+            'id': row['id'],
+            'student': row['student_id'],
+            'group': row['group_id'],
+            'student_name': row['student__full_name'],
+            'group_name': row['group__name'],
+            'file': _file_url(request, row['file'], row['id'], archived=served_by_api),
+            'file_type': row['file_type'],
+            'description': row['description'],
+            'uploaded_at': _datetime_field.to_representation(row['uploaded_at']),
+            'version': row['version'],
+            'name': row['name'],
+            'year': row['year'],
+            'scan_status': row['scan_status'],
+        })
+    return JsonResponse(data, safe=False)
+
+
+@csrf_exempt
+@require_POST
+async def file_upload(request):
+    """
+    Async version of FileUploadView. Multipart parsing and the storage write run in a
+    worker thread so the event loop keeps serving other requests meanwhile.
+    """
+    user = await _aget_user(request)
+    if user is None:
+        return _unauthorized()
+
+    try:
+        student = await Student.objects.aget(user=user)
+    except Student.DoesNotExist:
+        return JsonResponse({'error': 'Student not found.'}, status=404)
+
+    # Accessing request.FILES parses the (already spooled) multipart body
+    validator = install_upload_validation(request)
+    validator.quota = await sync_to_async(quotas.upload_allowance)(student)
+    post, files = await sync_to_async(lambda: (request.POST, request.FILES))()
+    try:
+        if validator.error:
+            raise validator.error
+        if files.get('file'):
+            check_upload(post.get('file_type'), validator.kind, files['file'].size)
+    except UploadRejected as e:
+        return JsonResponse({'error': e.message}, status=e.status_code)
+
+    group = None
+    group_id = post.get('group_id')
+    if group_id:
+        try:
+            group = await ProjectGroup.objects.aget(id=group_id)
+        except ProjectGroup.DoesNotExist:
+            return JsonResponse({'error': 'Group not found.'}, status=404)
+        if student.current_group_id != group.id and not await group.members.filter(id=student.id).aexists():
+            return JsonResponse({'error': 'You are not a member of this group.'}, status=403)
+
+    try:
+        if files.get('file'):
+            await sync_to_async(quotas.check_quota)(group or student, files['file'].size)
+    except UploadRejected as e:
+        return JsonResponse({'error': e.message}, status=e.status_code)
+
+    file_repo = await sync_to_async(add_version)(
+        student=student if not group else None,
+        group=group,
+        file=files.get('file'),
+        name=post.get('name'),
+        file_type=post.get('file_type'),
+        description=post.get('description') or '',
+    )
+
+    return JsonResponse({
+        'id': file_repo.id,
+        'student': file_repo.student_id,
+        'group': file_repo.group_id,
+        'student_name': student.full_name if not group else None,
+        'group_name': group.name if group else None,
+        'file': _file_url(request, file_repo.file.name),
+        'file_type': file_repo.file_type,
+        'description': file_repo.description,
+        'uploaded_at': _datetime_field.to_representation(file_repo.uploaded_at),
+        'version': file_repo.version,
+        'name': file_repo.name,
+        'year': file_repo.year,
+        'scan_status': file_repo.scan_status,
+    }, status=201)
@@ -0,0 +1,200 @@
+"""
+Audit log of supervisor assignments, consultation decisions and repository edits.
+
+record() only appends the event to an in-memory ring buffer, once the surrounding transaction
+commits; a daemon thread writes the buffer to AuditEvent with bulk inserts every
+FLUSH_INTERVAL seconds, or sooner when BATCH_SIZE events are waiting. Requests therefore never
+wait for an audit INSERT. Configured with the AUDIT_LOG setting::
+
+    AUDIT_LOG = {'BUFFER_SIZE': 10000, 'BATCH_SIZE': 500, 'FLUSH_INTERVAL': 2.0}
+
+When the buffer is full the oldest events are dropped and counted, and a flush that fails
+puts its batch back for the next attempt. With FLUSH_INTERVAL None no thread is started and
+events are written by flush() (and at interpreter exit). Each worker process has its own
+buffer and flusher.
+
+The actor is the user of the request being handled (middleware.AuditRequestMiddleware), unless
+given.
+"""
+import atexit
+import contextvars
+import logging
+import threading
+from collections import deque
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import DatabaseError, connection, transaction
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import AuditEvent, audit_month
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {'BUFFER_SIZE': 10000, 'BATCH_SIZE': 500, 'FLUSH_INTERVAL': 2.0}
+
+# The request being handled, set by middleware.AuditRequestMiddleware
+current_request = contextvars.ContextVar('audit_request', default=None)
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, 'AUDIT_LOG', {})}
+
+
+class AuditBuffer:
+    def __init__(self, size):
+        self.events = deque(maxlen=size)
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def extend(self, events, batch_size):
+        with self.lock:
+            self.dropped += max(len(self.events) + len(events) - self.events.maxlen, 0)
+            self.events.extend(events)
+            full = len(self.events) >= batch_size
+        if full:
+            self.wakeup.set()
+
+    def take(self, count):
+        with self.lock:
+            return [self.events.popleft() for _ in range(min(count, len(self.events)))]
+
+    def put_back(self, events):
+        with self.lock:
+            # Oldest first again; whatever no longer fits is lost
+            room = self.events.maxlen - len(self.events)
+            self.dropped += max(len(events) - room, 0)
+            self.events.extendleft(reversed(events[-room:] if room else []))
+
+    def __len__(self):
+        return len(self.events)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = AuditBuffer(config()['BUFFER_SIZE'])
+        if _buffer.thread is None and config()['FLUSH_INTERVAL']:
+            _buffer.thread = threading.Thread(target=_run_flusher, args=(_buffer,), name='audit-flush', daemon=True)
+            _buffer.thread.start()
+        return _buffer
+
+
+@receiver(setting_changed)
+def _reset_buffer(setting, **kwargs):
+    global _buffer
+    if setting == 'AUDIT_LOG':
+        with _buffer_lock:
+            if _buffer is not None:
+                # A running flusher finishes its current wait and exits
+                _buffer.wakeup.set()
+            _buffer = None
+
+
+def flush():
+    """
+    Write out every buffered event; returns the number written.
+    """
+    buffer = _buffer
+    if buffer is None:
+        return 0
+    batch_size = config()['BATCH_SIZE']
+    written = 0
+    while True:
+        batch = buffer.take(batch_size)
+        if not batch:
+            break
+        try:
+            AuditEvent.objects.bulk_create(batch)
+        except DatabaseError:
+            logger.exception("Writing %s audit events failed; retrying later", len(batch))
+            buffer.put_back(batch)
+            break
+        written += len(batch)
+    if buffer.dropped:
+        logger.warning("Audit buffer overflowed: %s events dropped", buffer.dropped)
+        buffer.dropped = 0
+    return written
+
+
+atexit.register(flush)
+
+
+def _run_flusher(buffer):
+    while _buffer is buffer:
+        buffer.wakeup.wait(config()['FLUSH_INTERVAL'])
+        buffer.wakeup.clear()
+        if _buffer is not buffer:
+            break
+        try:
+            flush()
+        except Exception:
+            logger.exception("Flushing the audit buffer failed")
+        finally:
+            connection.close()
+
+
+def _current_actor():
+    request = current_request.get()
+    user = getattr(request, 'user', None)
+    return user if user is not None and user.is_authenticated else None
+
+
+def _buffer_on_commit(events):
+    batch_size = config()['BATCH_SIZE']
+    transaction.on_commit(lambda: get_buffer().extend(events, batch_size))
+
+
+def _event(action, target_type, target_id, actor, changes):
+    now = timezone.now()
+    return AuditEvent(
+        month=audit_month(now), created_at=now, actor_id=actor.pk if actor else None,
+        action=action, target_type=target_type, target_id=target_id, changes=changes,
+    )
+
+
+def record(action, target_type, target_id, actor=None, **changes):
+    """
+    Buffer an audit event, if and when the current transaction commits.
+    """
+    _buffer_on_commit([_event(action, target_type, target_id, actor or _current_actor(), changes)])
+
+
+def record_many(action, target_type, changes_by_id, actor=None):
+    """
+    Buffer one event per target id, with that id's changes.
+    """
+    actor = actor or _current_actor()
+    _buffer_on_commit([
+        _event(action, target_type, target_id, actor, changes) for target_id, changes in changes_by_id.items()
+    ])
+
+
+def parse_moment(value, end_of_day=False):
+    """
+    Aware datetime from an ISO 8601 date or datetime (naive ones are in TIME_ZONE); None if
+    empty. A date is its midnight, or with ``end_of_day`` the next midnight, so that as an
+    exclusive upper bound it includes the whole day. Raises ValueError for anything else.
+    """
+    if not value:
+        return None
+    # parse_datetime() accepts a bare date too, as its midnight
+    day = parse_date(value)
+    if day is not None:
+        parsed = datetime.combine(day + timedelta(days=1) if end_of_day else day, time.min)
+    else:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise ValueError(f"{value!r} is not a date or a date and time.")
+    return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
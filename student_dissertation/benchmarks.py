@@ -0,0 +1,399 @@
+"""
+Synthetic cohort generation and an in-process benchmark harness for the REST API.
+
+Used by the ``seed_cohort`` and ``benchmark_api`` management commands. Both write to the
+configured database, so point them at a scratch database, never at production.
+"""
+import json
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User, Group
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+from django.db.models import Prefetch
+from django.test import Client
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from . import listings
+from .models import (
+    Course, YearOfStudy, Student, ProjectGroup, Stage, Milestone, Document, Notification,
+    Announcement, Consultation, Feedback, FileRepository,
+)
+
+
+API_PREFIX = '/api/'
+
+# (path relative to /api/, role, query string); every GET route of student_dissertation/urls.py
+# that can be exercised without side effects. {group_id} and friends are filled from the cohort.
+ENDPOINTS = [
+    ('courses/', 'anonymous', ''),
+    ('years/', 'anonymous', ''),
+    ('user-profile/', 'student', ''),
+    ('student-profile/', 'student', ''),
+    ('students/', 'admin', ''),
+    ('grouped-students/', 'admin', ''),
+    ('project-groups/', 'admin', ''),
+    ('project-groups/{group_id}/', 'admin', ''),
+    ('my-group/', 'student', ''),
+    ('students-without-groups/', 'admin', ''),
+    ('supervisors/', 'admin', ''),
+    ('assigned-students/', 'supervisor', ''),
+    ('assigned-groups/', 'supervisor', ''),
+    ('assigned-supervisor/', 'individual_student', ''),
+    ('assigned-group-supervisor/', 'student', ''),
+    ('supervisor-documents/', 'supervisor', ''),
+    ('manage-consultation/', 'supervisor', ''),
+    ('student-consultations/', 'individual_student', 'regNumber={reg_number}'),
+    ('announcements/', 'supervisor', ''),
+    ('student-announcements/', 'student', ''),
+    ('admin-announcements/', 'admin', ''),
+    ('view-feedback/', 'student', ''),
+    ('stages/', 'supervisor', ''),
+    ('milestones/', 'supervisor', ''),
+    ('student/milestones/', 'student', ''),
+    ('repository/', 'admin', ''),
+    ('notifications/', 'supervisor', ''),
+    ('notifications/unread_count/', 'supervisor', ''),
+    ('async/students/', 'admin', ''),
+    ('async/repository/', 'admin', ''),
+]
+
+
+class QueryCounter:
+    """
+    ``connection.execute_wrapper`` hook counting queries without the DEBUG query log,
+    which is capped at 9000 entries.
+    """
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def percentile(samples, pct):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not samples:
+        return 0.0
+    rank = max(0, min(len(samples) - 1, int(round(pct / 100 * len(samples))) - 1))
+    return samples[rank]
+
+
+@transaction.atomic
+def seed_cohort(prefix='bench', students=2000, supervisors=100, courses=4, group_ratio=0.5, group_size=4,
+                stages=4, notifications_per_supervisor=200, seed=0):
+    """
+    Bulk-create a reproducible synthetic cohort. Half of the students (``group_ratio``) are put in
+    project groups, the rest get an individual supervisor. Signals are not fired.
+    """
+    if User.objects.filter(username=f'{prefix}-admin').exists():
+        raise ValueError(f"A cohort with prefix '{prefix}' already exists.")
+
+    rng = random.Random(seed)
+    password = make_password('benchmark')
+    student_type = ContentType.objects.get_for_model(Student)
+    group_type = ContentType.objects.get_for_model(ProjectGroup)
+
+    admin_role, _ = Group.objects.get_or_create(name='Admin')
+    supervisor_role, _ = Group.objects.get_or_create(name='Supervisor')
+
+    admin = User.objects.create(username=f'{prefix}-admin', email=f'{prefix}-admin@example.com', password=password)
+    admin.groups.add(admin_role)
+
+    supervisor_users = User.objects.bulk_create([
+        User(username=f'{prefix}-sup-{i}', email=f'{prefix}-sup-{i}@example.com', password=password)
+        for i in range(supervisors)
+    ])
+    User.groups.through.objects.bulk_create([
+        User.groups.through(user_id=user.id, group_id=supervisor_role.id) for user in supervisor_users
+    ])
+
+    course_objs = Course.objects.bulk_create([Course(name=f'{prefix} Course {i}') for i in range(courses)])
+    year_objs = YearOfStudy.objects.bulk_create([YearOfStudy(year=f'{prefix} Year {i}') for i in range(1, 5)])
+    stage_objs = Stage.objects.bulk_create([Stage(name=f'{prefix} Stage {i}') for i in range(stages)])
+
+    student_users = User.objects.bulk_create([
+        User(username=f'{prefix}-stu-{i}', password=password) for i in range(students)
+    ])
+    grouped_count = int(students * group_ratio) // group_size * group_size
+    student_objs = Student.objects.bulk_create([
+        Student(
+            user=user,
+            reg_number=f'{prefix}-{i:06d}',
+            full_name=f'Student {i}',
+            password=password,
+            sex=rng.choice('MFO'),
+            course=course_objs[i % courses],
+            year_of_study=year_objs[(i // courses) % len(year_objs)],
+            supervisor=None if i < grouped_count else rng.choice(supervisor_users),
+        )
+        for i, user in enumerate(student_users)
+    ])
+
+    grouped, individual = student_objs[:grouped_count], student_objs[grouped_count:]
+    group_objs = ProjectGroup.objects.bulk_create([
+        ProjectGroup(
+            name=f'{prefix} Group {n}',
+            course=grouped[start].course,
+            year=grouped[start].year_of_study,
+            leader=grouped[start],
+            supervisor=rng.choice(supervisor_users),
+            project_title=f'Project {n}',
+        )
+        for n, start in enumerate(range(0, grouped_count, group_size))
+    ])
+    ProjectGroup.members.through.objects.bulk_create([
+        ProjectGroup.members.through(projectgroup_id=group.id, student_id=student.id)
+        for n, group in enumerate(group_objs)
+        for student in grouped[n * group_size:(n + 1) * group_size]
+    ])
+    for n, group in enumerate(group_objs):
+        for student in grouped[n * group_size:(n + 1) * group_size]:
+            student.current_group = group
+    Student.objects.bulk_update(grouped, ['current_group'], batch_size=2000)
+
+    Milestone.objects.bulk_create(
+        [
+            Milestone(student=student, supervisor_id=student.supervisor_id, stage=stage, milestone=stage.name,
+                      status=rng.choice(['Pending', 'In Progress', 'Completed']))
+            for student in individual for stage in stage_objs
+        ] + [
+            Milestone(group=group, supervisor_id=group.supervisor_id, stage=stage, milestone=stage.name,
+                      status=rng.choice(['Pending', 'In Progress', 'Completed']))
+            for group in group_objs for stage in stage_objs
+        ],
+        batch_size=2000,
+    )
+
+    Document.objects.bulk_create(
+        [
+            Document(content_type=student_type, object_id=student.id, supervisor_id=student.supervisor_id,
+                     title=f'Draft {student.reg_number}', file=f'documents/{prefix}-{student.id}.pdf')
+            for student in individual
+        ] + [
+            Document(content_type=group_type, object_id=group.id, supervisor_id=group.supervisor_id,
+                     title=f'Draft {group.name}', file=f'documents/{prefix}-group-{group.id}.pdf')
+            for group in group_objs
+        ],
+        batch_size=2000,
+    )
+
+    FileRepository.objects.bulk_create(
+        [
+            FileRepository(student=student, file=f'student_projects/{prefix}-{student.id}.pdf',
+                           file_type='document', description='Synthetic', year='2025')
+            for student in individual
+        ] + [
+            FileRepository(group=group, file=f'student_projects/{prefix}-group-{group.id}.zip',
+                           file_type='source_code', description='Synthetic', year='2025')
+            for group in group_objs
+        ],
+        batch_size=2000,
+    )
+
+    Consultation.objects.bulk_create([
+        Consultation(student=student, supervisor_id=student.supervisor_id, topic='Progress review',
+                     proposed_date=f'2025-0{1 + n % 9}-1{n % 10}T10:00:00Z')
+        for n, student in enumerate(individual)
+    ], batch_size=2000)
+
+    Feedback.objects.bulk_create([
+        Feedback(content_type=student_type, object_id=student.id, supervisor_id=student.supervisor_id,
+                 student=student, content='Keep going.')
+        for student in individual
+    ], batch_size=2000)
+
+    Announcement.objects.bulk_create(
+        [Announcement(supervisor=user, title='Weekly update', target_group='students', content='...')
+         for user in supervisor_users for _ in range(5)]
+        + [Announcement(admin=admin, title=f'Notice {i}', target_group=rng.choice(['students', 'supervisors']), content='...')
+           for i in range(200)],
+        batch_size=2000,
+    )
+
+    Notification.objects.bulk_create([
+        Notification(recipient=user, message=f'Notification {i}', is_read=rng.random() < 0.7)
+        for user in supervisor_users for i in range(notifications_per_supervisor)
+    ], batch_size=5000)
+
+    return {
+        'students': students,
+        'groups': len(group_objs),
+        'supervisors': supervisors,
+        'milestones': Milestone.objects.filter(stage__in=stage_objs).count(),
+    }
+
+
+def _cohort_context(prefix):
+    """
+    Pick one representative user per role from a seeded cohort and mint tokens for them.
+    """
+    admin = User.objects.get(username=f'{prefix}-admin')
+    group = ProjectGroup.objects.filter(name__startswith=f'{prefix} Group').order_by('id').first()
+    student = group.leader
+    individual_student = Student.objects.filter(
+        reg_number__startswith=f'{prefix}-', supervisor__isnull=False
+    ).order_by('id').first()
+    supervisor = group.supervisor
+
+    users = {
+        'admin': admin,
+        'supervisor': supervisor,
+        'student': student.user,
+        'individual_student': individual_student.user,
+    }
+    tokens = {role: Token.objects.get_or_create(user=user)[0].key for role, user in users.items()}
+    params = {
+        'group_id': group.id,
+        'reg_number': individual_student.reg_number,
+    }
+    return tokens, params
+
+
+def endpoint_requests(prefix='bench', endpoints=None):
+    """
+    Yield ``(path, role, client, url)`` for every endpoint, with a test client authenticated
+    as a representative user of the seeded cohort.
+    """
+    tokens, params = _cohort_context(prefix)
+
+    for path, role, query in endpoints or ENDPOINTS:
+        url = API_PREFIX + path.format(**params)
+        if query:
+            url += '?' + query.format(**params)
+
+        extra = {'HTTP_AUTHORIZATION': f'Token {tokens[role]}'} if role != 'anonymous' else {}
+        yield path, role, Client(SERVER_NAME='localhost', raise_request_exception=False, **extra), url
+
+
+def run_benchmarks(prefix='bench', iterations=20, endpoints=None):
+    """
+    Request every endpoint ``iterations`` times through the Django test client and return
+    latency percentiles (ms), queries per request and response size per endpoint.
+    """
+    results = {}
+
+    for path, role, client, url in endpoint_requests(prefix, endpoints):
+        latencies, queries = [], []
+        response_bytes, status_code = 0, None
+        for _ in range(iterations):
+            counter = QueryCounter()
+            with connection.execute_wrapper(counter):
+                started = time.perf_counter()
+                response = client.get(url)
+                body = b''.join(response.streaming_content) if response.streaming else response.content
+                latencies.append((time.perf_counter() - started) * 1000)
+            queries.append(counter.count)
+            response_bytes, status_code = len(body), response.status_code
+
+        latencies.sort()
+        results[path] = {
+            'role': role,
+            'status': status_code,
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'queries': max(queries),
+            'bytes': response_bytes,
+        }
+
+    return results
+
+
+# name -> (serializer, queryset factory, listings function) for compare_list_encoders
+LISTS = {
+    'students': (
+        'StudentSerializer', lambda: Student.objects.select_related('supervisor', 'course', 'year_of_study').order_by('id'),
+        lambda request: listings.student_list(request, Student.objects.all()),
+    ),
+    'project-groups': (
+        'ProjectGroupSerializer',
+        lambda: ProjectGroup.objects.select_related('course', 'year', 'supervisor').order_by('id').prefetch_related(
+            Prefetch('members', queryset=Student.objects.order_by('id')),
+        ),
+        lambda request: listings.group_list(request, ProjectGroup.objects.all()),
+    ),
+    'repository': (
+        'FileRepositorySerializer',
+        lambda: FileRepository.objects.select_related('student', 'group', 'archive_entry').order_by('id'),
+        lambda request: listings.file_list(request, FileRepository.objects.all()),
+    ),
+}
+
+
+def compare_list_encoders(iterations=5):
+    """
+    Render each large list ``iterations`` times through its DRF serializer and JSONRenderer and
+    through listings, and return rows per second for both and whether the bytes are identical.
+    """
+    from . import serializers
+
+    request = Request(APIRequestFactory().get('/', SERVER_NAME='localhost'))
+    request.accepted_renderer = JSONRenderer()
+    results = {}
+    for name, (serializer_name, build_queryset, fast) in LISTS.items():
+        serializer = getattr(serializers, serializer_name)
+        timings = {'serializer': [], 'listings': []}
+        for _ in range(iterations):
+            started = time.perf_counter()
+            old = JSONRenderer().render(serializer(build_queryset(), many=True, context={'request': request}).data)
+            timings['serializer'].append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            response = fast(request)
+            new = b''.join(response.streaming_content) if response.streaming else response.content
+            timings['listings'].append(time.perf_counter() - started)
+
+        rows = len(json.loads(new))
+        results[name] = {
+            'rows': rows,
+            'identical': old == new,
+            'encoder': 'orjson' if listings.orjson is not None else 'json',
+            **{f'{path}_rows_per_s': round(rows / min(samples)) if rows else 0 for path, samples in timings.items()},
+        }
+        results[name]['speedup'] = round(min(timings['serializer']) / min(timings['listings']), 1)
+    return results
+
+
+def uncovered_routes():
+    """
+    Routes of student_dissertation/urls.py that the harness does not request.
+    """
+    from .urls import urlpatterns
+
+    covered = {path.split('{')[0] for path, _, _ in ENDPOINTS}
+    routes = [str(pattern.pattern) for pattern in urlpatterns if str(pattern.pattern)]
+    return [route for route in routes if route.split('<')[0] not in covered]
+
+
+def compare_to_baseline(results, baseline, tolerance=0.25):
+    """
+    Return human readable regressions of ``results`` against a saved baseline. Query counts and
+    status codes must not change; latency (p95) and size may grow by at most ``tolerance``.
+    """
+    regressions = []
+    for path, old in baseline.get('endpoints', {}).items():
+        new = results.get(path)
+        if new is None:
+            continue
+        if new['status'] != old['status']:
+            regressions.append(f"{path}: status {old['status']} -> {new['status']}")
+        if new['queries'] > old['queries']:
+            regressions.append(f"{path}: queries {old['queries']} -> {new['queries']}")
+        if new['p95_ms'] > old['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{path}: p95 {old['p95_ms']} ms -> {new['p95_ms']} ms")
+        if new['bytes'] > old['bytes'] * (1 + tolerance):
+            regressions.append(f"{path}: bytes {old['bytes']} -> {new['bytes']}")
+    return regressions
+
+
+def dump_baseline(results, fp, **meta):
+    json.dump({'meta': meta, 'endpoints': results}, fp, indent=2, sort_keys=True)
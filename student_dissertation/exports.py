@@ -0,0 +1,86 @@
+"""
+Streaming roster exports. Rows are read with ``values_list().iterator()`` and written out as
+they are produced, so memory stays flat whatever the size of the cohort.
+"""
+import csv
+import tempfile
+
+from django.db.models import Count
+
+from .models import Student, ProjectGroup, Milestone, FileRepository
+
+
+CHUNK_SIZE = 2000
+
+# kind -> (column headers, queryset factory); the queryset yields tuples matching the headers
+EXPORTS = {
+    'students': (
+        ['reg_number', 'full_name', 'sex', 'course', 'year_of_study', 'project_title', 'supervisor'],
+        lambda params: Student.objects.order_by('reg_number').values_list(
+            'reg_number', 'full_name', 'sex', 'course__name', 'year_of_study__year', 'project_title', 'supervisor__username',
+        ),
+    ),
+    'groups': (
+        ['id', 'name', 'course', 'year', 'project_title', 'leader', 'supervisor', 'members'],
+        lambda params: ProjectGroup.objects.order_by('id').annotate(member_count=Count('members')).values_list(
+            'id', 'name', 'course__name', 'year__year', 'project_title', 'leader__reg_number', 'supervisor__username', 'member_count',
+        ),
+    ),
+    'milestones': (
+        ['id', 'student', 'group', 'supervisor', 'stage', 'milestone', 'status', 'completion_date', 'remarks'],
+        lambda params: Milestone.objects.order_by('id').values_list(
+            'id', 'student__reg_number', 'group__name', 'supervisor__username', 'stage__name',
+            'milestone', 'status', 'completion_date', 'remarks',
+        ),
+    ),
+    'files': (
+        ['id', 'student', 'group', 'file_type', 'file', 'description', 'uploaded_at', 'version', 'year'],
+        lambda params: _filter_files(FileRepository.objects.order_by('id'), params).values_list(
+            'id', 'student__reg_number', 'group__name', 'file_type', 'file', 'description', 'uploaded_at', 'version', 'year',
+        ),
+    ),
+}
+
+
+def _filter_files(files, params):
+    if params.get('file_type'):
+        files = files.filter(file_type=params['file_type'])
+    if params.get('year'):
+        files = files.filter(year=params['year'])
+    return files
+
+
+class Echo:
+    """
+    File-like object whose write() hands the line straight back, for csv.writer.
+    """
+    def write(self, value):
+        return value
+
+
+def iter_csv(kind, params):
+    headers, build_queryset = EXPORTS[kind]
+    writer = csv.writer(Echo())
+    yield writer.writerow(headers)
+    for row in build_queryset(params).iterator(chunk_size=CHUNK_SIZE):
+        yield writer.writerow(row)
+
+
+def write_xlsx(kind, params):
+    """
+    Write the export into a temporary file with openpyxl's write-only workbook, which keeps
+    only the current row in memory. Returns the open file positioned at the start.
+    """
+    from openpyxl import Workbook
+
+    headers, build_queryset = EXPORTS[kind]
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(kind)
+    sheet.append(headers)
+    for row in build_queryset(params).iterator(chunk_size=CHUNK_SIZE):
+        sheet.append([value.replace(tzinfo=None) if hasattr(value, 'tzinfo') and value.tzinfo else value for value in row])
+
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return output
@@ -0,0 +1,269 @@
+"""
+Serializer-free JSON for the large read-only lists (students, groups, repository files).
+
+Rendering thousands of rows through DRF serializers costs several Python calls per field per
+row. These lists instead read plain dicts with ``.values()``, shape them with the field maps
+declared below and encode them with orjson, which requirements.txt pins (the json module if it
+is missing anyway). The bytes are the ones JSONRenderer produces for the serializers: compact
+separators, non-ASCII as UTF-8, U+2028/U+2029 escaped and DateTimeField's ISO 8601 format.
+
+Rows are read CHUNK_SIZE at a time. A list that fits in one chunk is sent as an ordinary
+response; a longer one as a StreamingHttpResponse that encodes a chunk at a time, so the whole
+list is never held in memory. Requests for another format (the browsable API) get a normal
+Response built from the same rows.
+
+The grouped student list is ordered by course and year in SQL and cut into buckets with
+itertools.groupby as the rows stream past; window functions number the students within each
+bucket so a page of every bucket (?limit=&offset=) is selected by the database.
+"""
+import json
+from itertools import chain, groupby, islice
+from operator import itemgetter
+
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+from django.http import HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from .models import ProjectGroup, Student
+from .object_storage import repository_storage
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+CHUNK_SIZE = 2000
+CONTENT_TYPE = 'application/json'
+
+_datetime_field = serializers.DateTimeField()
+
+
+def dumps(data):
+    """
+    Encode ``data`` to the bytes JSONRenderer would produce with the default settings.
+    """
+    if orjson is not None:
+        encoded = orjson.dumps(data)
+    else:
+        encoded = json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode()
+    # Valid JSON but not valid JavaScript; JSONRenderer escapes them too
+    return encoded.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class Nested:
+    """
+    A nested object of several columns, None when the ``present`` column is NULL.
+    """
+    def __init__(self, present, **fields):
+        self.present = present
+        self.fields = list(fields.items())
+        self.columns = [present, *fields.values()]
+
+    def __call__(self, row, context):
+        if row[self.present] is None:
+            return None
+        return {key: row[column] for key, column in self.fields}
+
+
+class Computed:
+    """
+    A value computed by ``function(row, context)`` from the given columns.
+    """
+    def __init__(self, function, *columns):
+        self.function = function
+        self.columns = list(columns)
+
+    def __call__(self, row, context):
+        return self.function(row, context)
+
+
+class FieldMap:
+    """
+    Output key -> ``.values()`` column name, Nested or Computed, in output order.
+    """
+    def __init__(self, **fields):
+        self.fields = list(fields.items())
+        columns = []
+        for source in fields.values():
+            columns += [source] if isinstance(source, str) else source.columns
+        self.columns = list(dict.fromkeys(columns))
+
+    def shape(self, row, context=None):
+        return {
+            key: row[source] if isinstance(source, str) else source(row, context)
+            for key, source in self.fields
+        }
+
+
+def _file_url(row, context):
+    request = context['request']
+    # Archived and delta-stored versions are served by the download endpoint, as in FileRepositorySerializer
+    if row['archive_entry__id'] is not None or row['delta_base_id'] is not None:
+        url = reverse('repository-download', args=[row['id']])
+    else:
+        url = context['storage'].url(row['file'])
+    return request.build_absolute_uri(url)
+
+
+# StudentSerializer
+STUDENT_FIELDS = FieldMap(
+    id='id',
+    reg_number='reg_number',
+    full_name='full_name',
+    sex='sex',
+    project_title='project_title',
+    supervisor=Nested('supervisor_id', username='supervisor__username', email='supervisor__email'),
+    course=Nested('course_id', id='course_id', name='course__name'),
+    year_of_study=Nested('year_of_study_id', id='year_of_study_id', year='year_of_study__year'),
+)
+
+# StudentBasicSerializer
+STUDENT_BASIC_FIELDS = FieldMap(reg_number='reg_number', full_name='full_name')
+
+# ProjectGroupSerializer; members are loaded per chunk by group_members
+GROUP_FIELDS = FieldMap(
+    id='id',
+    name='name',
+    project_title='project_title',
+    course=Nested('course_id', id='course_id', name='course__name'),
+    year=Nested('year_id', id='year_id', year='year__year'),
+    members=Computed(lambda row, context: context['members'].get(row['id'], []), 'id'),
+    supervisor=Nested('supervisor_id', username='supervisor__username', email='supervisor__email'),
+)
+
+# FileRepositorySerializer
+FILE_FIELDS = FieldMap(
+    id='id',
+    student='student_id',
+    group='group_id',
+    student_name='student__full_name',
+    group_name='group__name',
+    file=Computed(_file_url, 'id', 'file', 'archive_entry__id', 'delta_base_id'),
+    file_type='file_type',
+    description='description',
+    uploaded_at=Computed(lambda row, context: _datetime_field.to_representation(row['uploaded_at']), 'uploaded_at'),
+    version='version',
+    name='name',
+    year='year',
+    scan_status='scan_status',
+)
+
+
+def group_members(group_ids):
+    """
+    group id -> members as SimpleStudentSerializer renders them, with one query.
+    """
+    members = {}
+    memberships = (
+        ProjectGroup.members.through.objects.filter(projectgroup_id__in=group_ids)
+        .order_by('projectgroup_id', 'student_id')
+        .values_list('projectgroup_id', 'student_id', 'student__reg_number', 'student__full_name')
+    )
+    for group_id, student_id, reg_number, full_name in memberships:
+        members.setdefault(group_id, []).append({'id': student_id, 'reg_number': reg_number, 'full_name': full_name})
+    return members
+
+
+def iter_chunks(queryset, fields, context=None, prepare=None):
+    """
+    Yield the shaped rows of ``queryset`` CHUNK_SIZE at a time. ``prepare(rows)``, if given,
+    returns extra context for a chunk, such as related rows loaded for it in one query.
+    """
+    rows = queryset.values(*fields.columns).iterator(chunk_size=CHUNK_SIZE)
+    while True:
+        chunk = list(islice(rows, CHUNK_SIZE))
+        if not chunk:
+            return
+        chunk_context = dict(context or {}, **prepare(chunk)) if prepare else context
+        yield [fields.shape(row, chunk_context) for row in chunk]
+
+
+def iter_student_buckets(students, limit=None, offset=0):
+    """
+    Yield lists of {'course', 'year', 'count', 'students'} buckets of ``students`` by course and
+    year, holding about CHUNK_SIZE students each. Each bucket lists its students ``offset`` to
+    ``offset + limit`` (all if ``limit`` is None) by id and ``count`` is its full size; buckets
+    with no students in that range are left out.
+    """
+    bucket = [F('course_id'), F('year_of_study_id')]
+    students = students.filter(course__isnull=False, year_of_study__isnull=False).annotate(
+        position=Window(RowNumber(), partition_by=bucket, order_by=F('id').asc()),
+        bucket_size=Window(Count('id'), partition_by=bucket),
+    )
+    if offset:
+        students = students.filter(position__gt=offset)
+    if limit is not None:
+        students = students.filter(position__lte=offset + limit)
+    rows = (
+        students.order_by('course__name', 'course_id', 'year_of_study__year', 'year_of_study_id', 'id')
+        .values(*STUDENT_BASIC_FIELDS.columns, 'course_id', 'year_of_study_id', 'course__name', 'year_of_study__year', 'bucket_size')
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+
+    chunk, size = [], 0
+    for _, members in groupby(rows, key=itemgetter('course_id', 'year_of_study_id')):
+        first = next(members)
+        listed = [STUDENT_BASIC_FIELDS.shape(row) for row in chain([first], members)]
+        chunk.append({
+            'course': first['course__name'],
+            'year': first['year_of_study__year'],
+            'count': first['bucket_size'],
+            'students': listed,
+        })
+        size += len(listed)
+        if size >= CHUNK_SIZE:
+            yield chunk
+            chunk, size = [], 0
+    if chunk:
+        yield chunk
+
+
+def _stream(first, chunks):
+    yield b'[' + dumps(first)[1:-1]
+    for chunk in chunks:
+        if chunk:
+            yield b',' + dumps(chunk)[1:-1]
+    yield b']'
+
+
+def list_response(request, chunks):
+    """
+    Respond with the concatenated chunks as one JSON array, streamed if there is more than one.
+    """
+    chunks = iter(chunks)
+    if request.accepted_renderer.format != 'json':
+        return Response([row for chunk in chunks for row in chunk])
+    first = next(chunks, [])
+    second = next(chunks, None)
+    if second is None:
+        return HttpResponse(dumps(first), content_type=CONTENT_TYPE)
+    return StreamingHttpResponse(_stream(first, chain([second], chunks)), content_type=CONTENT_TYPE)
+
+
+def student_list(request, students):
+    return list_response(request, iter_chunks(students.order_by('id'), STUDENT_FIELDS))
+
+
+def group_list(request, groups):
+    return list_response(request, iter_chunks(
+        groups.order_by('id'), GROUP_FIELDS,
+        prepare=lambda chunk: {'members': group_members([row['id'] for row in chunk])},
+    ))
+
+
+def grouped_students(request, course=None, year=None, limit=None, offset=0):
+    students = Student.objects.all()
+    if course is not None:
+        students = students.filter(course_id=course)
+    if year is not None:
+        students = students.filter(year_of_study_id=year)
+    return list_response(request, iter_student_buckets(students, limit, offset))
+
+
+def file_list(request, files):
+    context = {'request': request, 'storage': repository_storage()}
+    return list_response(request, iter_chunks(files.order_by('id'), FILE_FIELDS, context))
@@ -0,0 +1,47 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from student_dissertation.models import Notification, ArchivedNotification
+
+
+class Command(BaseCommand):
+    help = "Move read notifications older than --days out of the Notification table into ArchivedNotification."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90, help="Archive read notifications older than this many days.")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows moved per transaction.")
+        parser.add_argument('--dry-run', action='store_true', help="Only report how many notifications would be archived.")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        batch_size = options['batch_size']
+        candidates = Notification.objects.filter(is_read=True, created_at__lt=cutoff)
+
+        if options['dry_run']:
+            self.stdout.write(f"{candidates.count()} notifications would be archived.")
+            return
+
+        moved = 0
+        while True:
+            with transaction.atomic():
+                batch = list(
+                    candidates.order_by('id').values('id', 'recipient_id', 'message', 'created_at')[:batch_size]
+                )
+                if not batch:
+                    break
+
+                ArchivedNotification.objects.bulk_create([
+                    ArchivedNotification(
+                        recipient_id=row['recipient_id'],
+                        message=row['message'],
+                        created_at=row['created_at'],
+                    )
+                    for row in batch
+                ])
+                Notification.objects.filter(id__in=[row['id'] for row in batch]).delete()
+            moved += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} notifications."))
@@ -0,0 +1,72 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from student_dissertation.models import FileRepository, RepositoryArchive, ArchiveEntry
+from student_dissertation.object_storage import repository_storage
+from student_dissertation.storage_tiers import pack_path, compress_into, archive_root
+
+
+class Command(BaseCommand):
+    help = (
+        "Move the FileRepository files of a closed year from the hot storage into the xz-compressed "
+        "cold tier (one pack file per year). Archived files stay downloadable through the API."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('year', help="Repository year to archive, e.g. 2023.")
+        parser.add_argument('--keep-originals', action='store_true', help="Do not delete the hot copies after packing.")
+        parser.add_argument('--force', action='store_true', help="Allow archiving the current or a future year.")
+        parser.add_argument('--dry-run', action='store_true', help="Only report what would be archived.")
+
+    def handle(self, *args, **options):
+        year = options['year']
+        if not year.isdigit() or len(year) != 4:
+            raise CommandError("year must be a four digit year.")
+        if int(year) >= timezone.now().year and not options['force']:
+            raise CommandError(f"{year} is not a closed year; use --force to archive it anyway.")
+
+        files = FileRepository.objects.filter(year=year, archive_entry__isnull=True).order_by('id')
+        if options['dry_run']:
+            self.stdout.write(f"{files.count()} files of {year} would be archived into {pack_path(year)}.")
+            return
+        if not files.exists():
+            self.stdout.write(f"Nothing of {year} left to archive.")
+            return
+
+        os.makedirs(archive_root(), exist_ok=True)
+        archive, _ = RepositoryArchive.objects.get_or_create(year=year, defaults={'pack_name': os.path.basename(pack_path(year))})
+
+        storage = repository_storage()
+        entries, missing, original_bytes = [], 0, 0
+        with open(archive.path, 'ab') as pack:
+            for file_repo in files.iterator(chunk_size=500):
+                try:
+                    source = storage.open(file_repo.file.name, 'rb')
+                except (FileNotFoundError, OSError):
+                    missing += 1
+                    self.stderr.write(f"Missing from storage, skipped: {file_repo.file.name}")
+                    continue
+
+                with source:
+                    offset, length, size, sha256 = compress_into(source, pack)
+                original_bytes += size
+                entries.append(ArchiveEntry(archive=archive, file=file_repo, offset=offset, length=length, size=size, sha256=sha256))
+
+            pack.flush()
+            os.fsync(pack.fileno())
+
+        # Only record entries once their bytes are durably in the pack
+        with transaction.atomic():
+            ArchiveEntry.objects.bulk_create(entries, batch_size=1000)
+
+        if not options['keep_originals']:
+            for entry in entries:
+                storage.delete(entry.file.file.name)
+
+        packed_bytes = sum(entry.length for entry in entries)
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {len(entries)} files of {year} ({original_bytes} -> {packed_bytes} bytes), {missing} missing."
+        ))
@@ -0,0 +1,65 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from student_dissertation.benchmarks import (
+    run_benchmarks, uncovered_routes, compare_to_baseline, dump_baseline, compare_list_encoders,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every read endpoint against a cohort created by seed_cohort and report p50/p95/p99 latency, "
+        "queries per request and response bytes. Optionally save a JSON baseline or fail on regressions against one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default='bench', help="Prefix the cohort was seeded with.")
+        parser.add_argument('--iterations', type=int, default=20, help="Requests per endpoint.")
+        parser.add_argument('--output', help="Write the results as a JSON baseline to this path.")
+        parser.add_argument('--compare', help="Baseline JSON to check the results against.")
+        parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed relative growth of p95 latency and bytes.")
+        parser.add_argument(
+            '--encoders', action='store_true',
+            help="Instead, compare the throughput of the large lists rendered by their serializers and by listings.",
+        )
+
+    def handle(self, *args, **options):
+        if options['encoders']:
+            return self.compare_encoders(options['iterations'])
+
+        results = run_benchmarks(prefix=options['prefix'], iterations=options['iterations'])
+
+        self.stdout.write(f"{'endpoint':<32} {'status':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8} {'bytes':>10}")
+        for path, row in results.items():
+            self.stdout.write(
+                f"{path:<32} {row['status']:>6} {row['p50_ms']:>9} {row['p95_ms']:>9} {row['p99_ms']:>9} {row['queries']:>8} {row['bytes']:>10}"
+            )
+
+        skipped = uncovered_routes()
+        if skipped:
+            self.stdout.write("Not benchmarked: " + ', '.join(skipped))
+
+        if options['output']:
+            with open(options['output'], 'w') as fp:
+                dump_baseline(results, fp, prefix=options['prefix'], iterations=options['iterations'])
+            self.stdout.write(f"Baseline written to {options['output']}")
+
+        if options['compare']:
+            with open(options['compare']) as fp:
+                baseline = json.load(fp)
+            regressions = compare_to_baseline(results, baseline, tolerance=options['tolerance'])
+            if regressions:
+                raise CommandError("Performance regressions:\n  " + "\n  ".join(regressions))
+            self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
+
+    def compare_encoders(self, iterations):
+        results = compare_list_encoders(iterations=iterations)
+        self.stdout.write(f"{'list':<16} {'rows':>7} {'serializer rows/s':>18} {'listings rows/s':>16} {'speedup':>8}  identical")
+        for name, row in results.items():
+            self.stdout.write(
+                f"{name:<16} {row['rows']:>7} {row['serializer_rows_per_s']:>18} {row['listings_rows_per_s']:>16} "
+                f"{row['speedup']:>7}x  {row['identical']} ({row['encoder']})"
+            )
+        if not all(row['identical'] for row in results.values()):
+            raise CommandError("listings output differs from the serializers.")
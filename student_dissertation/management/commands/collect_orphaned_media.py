@@ -0,0 +1,144 @@
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from student_dissertation.models import FileRepository, Document
+from student_dissertation.object_storage import repository_storage
+
+
+BATCH_SIZE = 5000
+STATE_FILE = '.orphan-gc-state.json'
+
+
+def scan_directory(root, directory, recursive=True):
+    """
+    Files under ``root/directory`` as (name relative to root with '/' separators, size, mtime),
+    listed with os.scandir, which returns the file type without an extra stat per entry.
+    """
+    found = []
+    stack = [os.path.join(root, directory)]
+    while stack:
+        path = stack.pop()
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive:
+                            stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        stat = entry.stat(follow_symlinks=False)
+                        name = os.path.relpath(entry.path, root).replace(os.sep, '/')
+                        found.append((name, stat.st_size, stat.st_mtime))
+        except FileNotFoundError:
+            continue
+    return found
+
+
+class Command(BaseCommand):
+    help = (
+        "Find files in the repository storage that no FileRepository or Document references "
+        "(left by cascaded deletes or failed uploads) and quarantine or delete them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--prefix', action='append', dest='prefixes',
+            help="Top-level directory to scan (repeatable). Default: student_projects and documents.",
+        )
+        parser.add_argument('--min-age', type=float, default=24, help="Skip files modified in the last N hours (uploads in flight).")
+        parser.add_argument('--delete', action='store_true', help="Delete orphans instead of moving them to UPLOAD_QUARANTINE_ROOT/orphans.")
+        parser.add_argument('--dry-run', action='store_true', help="Only list the orphans.")
+        parser.add_argument('--incremental', action='store_true', help="Only consider files modified since the last completed run.")
+        parser.add_argument('--workers', type=int, default=8, help="Threads listing directories and removing files.")
+
+    def handle(self, *args, **options):
+        storage = repository_storage()
+        if not hasattr(storage, 'location'):
+            raise CommandError("Only filesystem storage can be scanned; use the object store's lifecycle rules instead.")
+        root = os.path.abspath(storage.location)
+        started = time.time()
+        cutoff = started - options['min_age'] * 3600
+
+        state_path = os.path.join(root, STATE_FILE)
+        newer_than = None
+        if options['incremental']:
+            try:
+                with open(state_path) as state:
+                    newer_than = json.load(state)['started'] - options['min_age'] * 3600
+            except (FileNotFoundError, KeyError, ValueError):
+                self.stdout.write("No completed run recorded; scanning everything.")
+
+        referenced = self.referenced_names()
+
+        orphans, scanned = [], 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            listings = pool.map(lambda unit: scan_directory(root, *unit), self.scan_units(root, options['prefixes']))
+            for files in listings:
+                for name, size, mtime in files:
+                    scanned += 1
+                    if name in referenced or mtime > cutoff or (newer_than is not None and mtime <= newer_than):
+                        continue
+                    orphans.append((name, size))
+
+            orphan_bytes = sum(size for _, size in orphans)
+            if options['dry_run']:
+                for name, size in orphans:
+                    self.stdout.write(f"{name}\t{size}")
+                self.stdout.write(f"Scanned {scanned} files: {len(orphans)} orphans ({orphan_bytes} bytes).")
+                return
+
+            quarantine_root = os.path.join(settings.UPLOAD_QUARANTINE_ROOT, 'orphans')
+
+            def remove(orphan):
+                name = orphan[0]
+                source = os.path.join(root, name)
+                try:
+                    if options['delete']:
+                        os.remove(source)
+                    else:
+                        target = os.path.join(quarantine_root, name)
+                        os.makedirs(os.path.dirname(target), exist_ok=True)
+                        shutil.move(source, target)
+                except OSError as e:
+                    self.stderr.write(f"Could not remove {name}: {e}")
+                    return False
+                return True
+
+            removed = sum(pool.map(remove, orphans))
+
+        with open(state_path, 'w') as state:
+            json.dump({'started': started}, state)
+
+        action = 'Deleted' if options['delete'] else f'Moved to {quarantine_root}'
+        self.stdout.write(self.style.SUCCESS(
+            f"Scanned {scanned} files in {time.time() - started:.1f}s. {action}: {removed} orphans "
+            f"({orphan_bytes} bytes), {len(orphans) - removed} failed."
+        ))
+
+    def referenced_names(self):
+        """
+        Every stored name in use, streamed from the database in batches into one set.
+        """
+        referenced = set()
+        for model in (FileRepository, Document):
+            referenced.update(model.objects.order_by().values_list('file', flat=True).iterator(chunk_size=BATCH_SIZE))
+        return referenced
+
+    def scan_units(self, root, prefixes):
+        """
+        (directory, recursive) pairs: every subdirectory of a prefix is listed on its own so the
+        shards are walked in parallel, plus the files directly inside the prefix.
+        """
+        for prefix in prefixes or ['student_projects', 'documents']:
+            if not os.path.isdir(os.path.join(root, prefix)):
+                continue
+            with os.scandir(os.path.join(root, prefix)) as entries:
+                subdirectories = [entry.name for entry in entries if entry.is_dir(follow_symlinks=False)]
+            for subdirectory in subdirectories:
+                yield (f'{prefix}/{subdirectory}', True)
+            yield (prefix, False)
@@ -0,0 +1,50 @@
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from student_dissertation.benchmarks import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive one or more running deployments with concurrent GET requests and report requests/sec "
+        "and latency percentiles, e.g. the sync WSGI /api/repository/ against the ASGI /api/async/repository/."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+', help="Absolute URLs to load, each measured separately.")
+        parser.add_argument('--token', help="DRF token sent as 'Authorization: Token <key>'.")
+        parser.add_argument('--requests', type=int, default=500, help="Requests per URL.")
+        parser.add_argument('--concurrency', type=int, default=20, help="Concurrent client threads.")
+        parser.add_argument('--timeout', type=float, default=30.0, help="Per-request timeout in seconds.")
+
+    def handle(self, *args, **options):
+        headers = {'Authorization': f"Token {options['token']}"} if options['token'] else {}
+
+        def fetch(url):
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=options['timeout']) as response:
+                    response.read()
+                    ok = response.status < 400
+            except (urllib.error.URLError, OSError):
+                ok = False
+            return time.perf_counter() - started, ok
+
+        for url in options['urls']:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+                results = list(pool.map(fetch, [url] * options['requests']))
+            elapsed = time.perf_counter() - started
+
+            latencies = sorted(latency * 1000 for latency, _ in results)
+            errors = sum(1 for _, ok in results if not ok)
+            self.stdout.write(
+                f"{url}\n"
+                f"  requests/sec: {len(results) / elapsed:.1f}  errors: {errors}\n"
+                f"  p50: {percentile(latencies, 50):.1f} ms  p95: {percentile(latencies, 95):.1f} ms  "
+                f"p99: {percentile(latencies, 99):.1f} ms  max: {latencies[-1]:.1f} ms"
+            )
@@ -0,0 +1,70 @@
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from student_dissertation.models import Student, ProjectGroup, FileRepository, Document, StorageUsage
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the StorageUsage counters from the recorded file sizes. --fill-sizes first records "
+        "the size of files uploaded before storage accounting (the only step that touches storage)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fill-sizes', action='store_true', help="Stat files whose size was never recorded.")
+
+    def handle(self, *args, **options):
+        if options['fill_sizes']:
+            self.fill_sizes()
+
+        totals = {}
+
+        def add(key, size, files):
+            current = totals.setdefault(key, [0, 0])
+            current[0] += size or 0
+            current[1] += files
+
+        for row in FileRepository.objects.filter(group__isnull=True, student__isnull=False).values('student').annotate(size=Sum('size'), files=Count('id')):
+            add(('student', row['student']), row['size'], row['files'])
+        for row in FileRepository.objects.filter(group__isnull=False).values('group').annotate(size=Sum('size'), files=Count('id')):
+            add(('group', row['group']), row['size'], row['files'])
+
+        owner_types = {
+            ContentType.objects.get_for_model(Student).pk: 'student',
+            ContentType.objects.get_for_model(ProjectGroup).pk: 'group',
+        }
+        documents = Document.objects.filter(content_type__in=owner_types).values('content_type', 'object_id')
+        for row in documents.annotate(size=Sum('size'), files=Count('id')):
+            add((owner_types[row['content_type']], row['object_id']), row['size'], row['files'])
+
+        # Documents may point at owners that no longer exist (generic relation)
+        existing = {
+            'student': set(Student.objects.values_list('id', flat=True)),
+            'group': set(ProjectGroup.objects.values_list('id', flat=True)),
+        }
+        rows = [
+            StorageUsage(**{f'{kind}_id': pk}, bytes=size, files=files)
+            for (kind, pk), (size, files) in totals.items() if pk in existing[kind]
+        ]
+
+        with transaction.atomic():
+            StorageUsage.objects.all().delete()
+            StorageUsage.objects.bulk_create(rows, batch_size=1000)
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt storage usage for {len(rows)} students and groups."))
+
+    def fill_sizes(self):
+        filled = 0
+        for model in (FileRepository, Document):
+            for instance in model.objects.filter(size__isnull=True).iterator(chunk_size=500):
+                entry = getattr(instance, 'archive_entry', None) if model is FileRepository else None
+                try:
+                    size = entry.size if entry is not None else instance.file.size
+                except (OSError, ValueError):
+                    self.stderr.write(f"Missing from storage, counted as 0 bytes: {instance.file.name}")
+                    continue
+                model.objects.filter(pk=instance.pk).update(size=size)
+                filled += 1
+        self.stdout.write(f"Recorded the size of {filled} files.")
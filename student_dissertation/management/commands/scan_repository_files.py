@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from student_dissertation.models import FileRepository
+from student_dissertation.scanners import get_scanner, scan_file
+from student_dissertation.versions import compact_previous
+
+
+class Command(BaseCommand):
+    help = "Scan repository files left pending (e.g. after a scanner outage) with the configured UPLOAD_SCANNER."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--unscanned', action='store_true', help="Also scan files uploaded before scanning was enabled.")
+
+    def handle(self, *args, **options):
+        if get_scanner() is None:
+            raise CommandError("UPLOAD_SCANNER is not configured.")
+
+        statuses = ['pending', 'unscanned'] if options['unscanned'] else ['pending']
+        # Delta-stored versions hold a diff rather than the file itself; their newest version is scanned instead
+        files = FileRepository.objects.filter(scan_status__in=statuses, delta_base__isnull=True, archive_entry__isnull=True)
+
+        for file_repo in files.order_by('id').iterator(chunk_size=500):
+            scan_file(file_repo.pk, on_clean=lambda file_repo=file_repo: compact_previous(file_repo))
+
+        counts = {status: FileRepository.objects.filter(scan_status=status).count() for status in ('pending', 'clean', 'quarantined')}
+        self.stdout.write(self.style.SUCCESS(
+            f"{counts['clean']} clean, {counts['quarantined']} quarantined, {counts['pending']} still pending."
+        ))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from student_dissertation.benchmarks import seed_cohort
+
+
+class Command(BaseCommand):
+    help = "Generate a synthetic cohort (students, groups, milestones, documents, notifications) for benchmarking."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default='bench', help="Prefix for every generated username, reg number and name.")
+        parser.add_argument('--students', type=int, default=2000)
+        parser.add_argument('--supervisors', type=int, default=100)
+        parser.add_argument('--courses', type=int, default=4)
+        parser.add_argument('--group-size', type=int, default=4)
+        parser.add_argument('--stages', type=int, default=4)
+        parser.add_argument('--notifications', type=int, default=200, help="Notifications per supervisor.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed; the same seed gives the same cohort.")
+
+    def handle(self, *args, **options):
+        try:
+            summary = seed_cohort(
+                prefix=options['prefix'],
+                students=options['students'],
+                supervisors=options['supervisors'],
+                courses=options['courses'],
+                group_size=options['group_size'],
+                stages=options['stages'],
+                notifications_per_supervisor=options['notifications'],
+                seed=options['seed'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            "Seeded {students} students, {groups} groups, {supervisors} supervisors and {milestones} milestones.".format(**summary)
+        ))
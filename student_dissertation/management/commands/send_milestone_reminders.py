@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from student_dissertation.milestones import send_reminders
+
+
+class Command(BaseCommand):
+    help = (
+        "Notify supervisors, students and group members about overdue milestones and those due "
+        "soon, one coalesced notification per person. Safe to run from cron as often as wanted: "
+        "repeats are suppressed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days-ahead', type=int, default=3, help="Remind about milestones due within this many days.")
+        parser.add_argument('--repeat-days', type=int, default=7, help="Repeat reminders for overdue milestones this often.")
+        parser.add_argument('--dry-run', action='store_true', help="Only count what would be sent.")
+
+    def handle(self, *args, **options):
+        milestones, notifications = send_reminders(
+            days_ahead=options['days_ahead'], repeat_days=options['repeat_days'], dry_run=options['dry_run'],
+        )
+        verb = 'Would send' if options['dry_run'] else 'Sent'
+        self.stdout.write(self.style.SUCCESS(f"{verb} {notifications} notifications about {milestones} milestones."))
@@ -0,0 +1,40 @@
+import posixpath
+
+from django.core.management.base import BaseCommand
+
+from student_dissertation.models import FileRepository
+from student_dissertation.object_storage import repository_storage
+from student_dissertation.storage_tiers import sharded_upload_to
+
+
+class Command(BaseCommand):
+    help = "Move hot-tier repository files still in the flat student_projects/ directory into hash-prefix shards."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report how many files would move.")
+
+    def handle(self, *args, **options):
+        # Flat layout is exactly student_projects/<filename>
+        files = FileRepository.objects.filter(
+            file__startswith='student_projects/', archive_entry__isnull=True
+        ).exclude(file__regex=r'^student_projects/.+/').order_by('id')
+
+        if options['dry_run']:
+            self.stdout.write(f"{files.count()} files would be moved into shards.")
+            return
+
+        storage = repository_storage()
+        moved = 0
+        for file_repo in files.iterator(chunk_size=500):
+            old_name = file_repo.file.name
+            if not storage.exists(old_name):
+                self.stderr.write(f"Missing from storage, skipped: {old_name}")
+                continue
+
+            with storage.open(old_name, 'rb') as source:
+                new_name = storage.save(sharded_upload_to(file_repo, posixpath.basename(old_name)), source)
+            FileRepository.objects.filter(pk=file_repo.pk).update(file=new_name)
+            storage.delete(old_name)
+            moved += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Moved {moved} files into shards."))
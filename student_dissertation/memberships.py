@@ -0,0 +1,30 @@
+"""
+Student.current_group: the group a student belongs to, stored on the student so "my group",
+its leader and its supervisor come with the student row instead of a query through the
+ProjectGroup.members table. Students are expected to be in one group; if they are in
+several, current_group is the oldest, as ``student.project_groups.first()`` would return.
+"""
+from django.db.models import Min
+
+from .models import ProjectGroup, Student
+
+
+def sync_current_groups(student_ids):
+    """
+    Recompute current_group for the given students from their memberships.
+    """
+    student_ids = list(student_ids)
+    if not student_ids:
+        return
+    first_group = dict(
+        ProjectGroup.members.through.objects.filter(student_id__in=student_ids)
+        .values('student_id').annotate(group_id=Min('projectgroup_id')).values_list('student_id', 'group_id')
+    )
+    students = list(Student.objects.filter(id__in=student_ids).only('id', 'current_group_id'))
+    changed = []
+    for student in students:
+        group_id = first_group.get(student.id)
+        if student.current_group_id != group_id:
+            student.current_group_id = group_id
+            changed.append(student)
+    Student.objects.bulk_update(changed, ['current_group'], batch_size=1000)
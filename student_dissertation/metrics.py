@@ -0,0 +1,86 @@
+"""
+In-process per-endpoint request metrics, rendered in the Prometheus text exposition format.
+
+Each worker process keeps its own registry; scrape every worker (or run a single worker)
+to get complete numbers.
+"""
+import threading
+from bisect import bisect_left
+
+
+# Upper bounds (seconds) of the request duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class EndpointStats:
+    __slots__ = ('bucket_counts', 'count', 'duration_sum', 'queries', 'sql_seconds', 'render_seconds', 'response_bytes')
+
+    def __init__(self):
+        self.bucket_counts = [0] * (len(DURATION_BUCKETS) + 1)
+        self.count = 0
+        self.duration_sum = 0.0
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.render_seconds = 0.0
+        self.response_bytes = 0
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def observe(self, endpoint, duration, queries, sql_seconds, render_seconds, response_bytes):
+        with self._lock:
+            stats = self._endpoints.get(endpoint)
+            if stats is None:
+                stats = self._endpoints[endpoint] = EndpointStats()
+            stats.bucket_counts[bisect_left(DURATION_BUCKETS, duration)] += 1
+            stats.count += 1
+            stats.duration_sum += duration
+            stats.queries += queries
+            stats.sql_seconds += sql_seconds
+            stats.render_seconds += render_seconds
+            stats.response_bytes += response_bytes
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+    def render_prometheus(self):
+        with self._lock:
+            snapshot = sorted(self._endpoints.items())
+            lines = [
+                '# HELP api_request_duration_seconds Request duration per endpoint.',
+                '# TYPE api_request_duration_seconds histogram',
+            ]
+            for endpoint, stats in snapshot:
+                label = _escape(endpoint)
+                cumulative = 0
+                for bound, bucket in zip(DURATION_BUCKETS, stats.bucket_counts):
+                    cumulative += bucket
+                    lines.append(f'api_request_duration_seconds_bucket{{endpoint="{label}",le="{bound}"}} {cumulative}')
+                lines.append(f'api_request_duration_seconds_bucket{{endpoint="{label}",le="+Inf"}} {stats.count}')
+                lines.append(f'api_request_duration_seconds_sum{{endpoint="{label}"}} {stats.duration_sum:.6f}')
+                lines.append(f'api_request_duration_seconds_count{{endpoint="{label}"}} {stats.count}')
+
+            counters = [
+                ('api_request_queries_total', 'Database queries executed per endpoint.', 'queries', '{}'),
+                ('api_request_sql_seconds_total', 'Time spent in SQL per endpoint.', 'sql_seconds', '{:.6f}'),
+                ('api_request_render_seconds_total', 'Time spent rendering responses per endpoint.', 'render_seconds', '{:.6f}'),
+                ('api_response_bytes_total', 'Response body bytes per endpoint.', 'response_bytes', '{}'),
+            ]
+            for name, help_text, attr, fmt in counters:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} counter')
+                for endpoint, stats in snapshot:
+                    lines.append(f'{name}{{endpoint="{_escape(endpoint)}"}} ' + fmt.format(getattr(stats, attr)))
+
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = MetricsRegistry()
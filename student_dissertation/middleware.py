@@ -0,0 +1,149 @@
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection
+
+from .metrics import registry
+from .audit import current_request
+
+
+slow_query_logger = logging.getLogger('student_dissertation.slow_queries')
+
+
+class QueryTimer:
+    """
+    ``connection.execute_wrapper`` hook that counts queries, sums their time and optionally
+    logs the ones slower than ``threshold_ms``.
+    """
+    def __init__(self, threshold_ms=None):
+        self.threshold_ms = threshold_ms
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.seconds += elapsed
+            if self.threshold_ms is not None and elapsed * 1000 >= self.threshold_ms:
+                slow_query_logger.warning("Slow query (%.1f ms): %s; params=%r", elapsed * 1000, sql, params)
+
+
+def _add_execute_wrapper(wrapper):
+    # Runs in the worker thread, so ``connection`` is that thread's connection
+    connection.execute_wrappers.append(wrapper)
+
+
+def _remove_execute_wrapper(wrapper):
+    connection.execute_wrappers.remove(wrapper)
+
+
+class RequestMetricsMiddleware:
+    """
+    Records query count, SQL time, render time and response size of every request, adds them
+    as a ``Server-Timing`` header and aggregates them per URL name into the metrics registry.
+
+    ``render`` is DRF's response rendering (JSON encoding); ``app`` is the remaining view time,
+    which for the list endpoints is mostly serializer work.
+
+    Under ASGI the ORM runs in the request's thread-sensitive worker thread, with that thread's
+    connection: sync views, and the async ORM and sync_to_async calls of async views. The timer
+    is installed there, so both kinds of view report their queries; only ORM work a view sends
+    to other threads (sync_to_async with thread_sensitive=False) goes uncounted.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_query_ms = getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', None)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        timer = QueryTimer(self.slow_query_ms)
+        request._render_seconds = 0.0
+
+        started = time.perf_counter()
+        with connection.execute_wrapper(timer):
+            response = self.get_response(request)
+        return self._finish(request, response, timer, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        timer = QueryTimer(self.slow_query_ms)
+        request._render_seconds = 0.0
+
+        started = time.perf_counter()
+        await sync_to_async(_add_execute_wrapper)(timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(_remove_execute_wrapper)(timer)
+        return self._finish(request, response, timer, time.perf_counter() - started)
+
+    def _finish(self, request, response, timer, total):
+        render = request._render_seconds
+        app = max(total - timer.seconds - render, 0.0)
+        response_bytes = 0 if response.streaming else len(response.content)
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={timer.seconds * 1000:.1f};desc="{timer.count} queries"',
+            f'render;dur={render * 1000:.1f}',
+            f'app;dur={app * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+        match = request.resolver_match
+        if match is not None:
+            endpoint = match.url_name or match.route
+            registry.observe(endpoint, total, timer.count, timer.seconds, render, response_bytes)
+
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; time that step
+        started = time.perf_counter()
+
+        def record_render_time(rendered):
+            request._render_seconds += time.perf_counter() - started
+
+        response.add_post_render_callback(record_render_time)
+        return response
+
+
+class AuditRequestMiddleware:
+    """
+    Makes the request available to audit.record() for the actor. DRF sets ``request.user`` on
+    the underlying request once it has authenticated, so token-authenticated users are seen too.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = current_request.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            current_request.reset(token)
+
+    async def __acall__(self, request):
+        token = current_request.set(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            current_request.reset(token)
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-19 02:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student_dissertation', '0015_archivednotification_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='announcement',
+            index=models.Index(fields=['supervisor', 'created_at'], name='announcement_supervisor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='announcement',
+            index=models.Index(fields=['target_group', 'created_at'], name='announcement_audience_idx'),
+        ),
+    ]
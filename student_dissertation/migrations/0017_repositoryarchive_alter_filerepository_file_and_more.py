@@ -0,0 +1,41 @@
+# Generated by Django 5.1.3 on 2026-10-19 02:35
+
+import django.db.models.deletion
+import student_dissertation.storage_tiers
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student_dissertation', '0016_announcement_announcement_supervisor_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RepositoryArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.CharField(max_length=4, unique=True)),
+                ('pack_name', models.CharField(max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='filerepository',
+            name='file',
+            field=models.FileField(max_length=255, upload_to=student_dissertation.storage_tiers.sharded_upload_to),
+        ),
+        migrations.CreateModel(
+            name='ArchiveEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('offset', models.BigIntegerField()),
+                ('length', models.BigIntegerField()),
+                ('size', models.BigIntegerField()),
+                ('sha256', models.CharField(max_length=64)),
+                ('file', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='archive_entry', to='student_dissertation.filerepository')),
+                ('archive', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='entries', to='student_dissertation.repositoryarchive')),
+            ],
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.3 on 2026-10-19 02:40
+
+import student_dissertation.object_storage
+import student_dissertation.storage_tiers
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student_dissertation', '0017_repositoryarchive_alter_filerepository_file_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='document',
+            name='file',
+            field=models.FileField(storage=student_dissertation.object_storage.repository_storage, upload_to='documents/'),
+        ),
+        migrations.AlterField(
+            model_name='filerepository',
+            name='file',
+            field=models.FileField(max_length=255, storage=student_dissertation.object_storage.repository_storage, upload_to=student_dissertation.storage_tiers.sharded_upload_to),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.3 on 2026-10-19 02:43
+
+import posixpath
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def set_names(apps, schema_editor):
+    # Existing uploads become version 1 of a chain named after their file
+    FileRepository = apps.get_model('student_dissertation', 'FileRepository')
+    batch = []
+    for file_repo in FileRepository.objects.only('id', 'file').iterator(chunk_size=2000):
+        file_repo.name = posixpath.basename(file_repo.file.name)
+        batch.append(file_repo)
+        if len(batch) >= 2000:
+            FileRepository.objects.bulk_update(batch, ['name'])
+            batch = []
+    FileRepository.objects.bulk_update(batch, ['name'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student_dissertation', '0018_alter_document_file_alter_filerepository_file'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='filerepository',
+            name='delta_base',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.RESTRICT, related_name='delta_versions', to='student_dissertation.filerepository'),
+        ),
+        migrations.AddField(
+            model_name='filerepository',
+            name='name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='filerepository',
+            name='size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(set_names, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='filerepository',
+            index=models.Index(fields=['student', 'name', 'version'], name='repository_student_chain_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='filerepository',
+            index=models.Index(fields=['group', 'name', 'version'], name='repository_group_chain_idx'),
+        ),
+    ]
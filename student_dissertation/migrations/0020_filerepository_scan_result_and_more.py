@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-19 02:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student_dissertation', '0019_filerepository_delta_base_filerepository_name_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='filerepository',
+            name='scan_result',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='filerepository',
+            name='scan_status',
+            field=models.CharField(choices=[('unscanned', 'Unscanned'), ('pending', 'Pending'), ('clean', 'Clean'), ('quarantined', 'Quarantined')], default='unscanned', max_length=20),
+        ),
+    ]
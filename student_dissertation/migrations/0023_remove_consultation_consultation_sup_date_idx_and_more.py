@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-19 03:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student_dissertation', '0022_availabilityslot_consultation_slot_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='consultation',
+            name='consultation_sup_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='consultation',
+            index=models.Index(fields=['supervisor', 'status', 'proposed_date'], name='consultation_sup_status_idx'),
+        ),
+    ]
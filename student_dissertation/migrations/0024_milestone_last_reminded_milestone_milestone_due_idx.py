@@ -0,0 +1,24 @@
+# Generated by Django 5.1.3 on 2026-10-19 03:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student_dissertation', '0023_remove_consultation_consultation_sup_date_idx_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='milestone',
+            name='last_reminded',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='milestone',
+            index=models.Index(fields=['status', 'completion_date'], name='milestone_due_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.3 on 2026-10-19 03:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def set_current_groups(apps, schema_editor):
+    Student = apps.get_model('student_dissertation', 'Student')
+    ProjectGroup = apps.get_model('student_dissertation', 'ProjectGroup')
+    first_group = (
+        ProjectGroup.members.through.objects.values('student_id')
+        .annotate(group_id=Min('projectgroup_id')).values_list('student_id', 'group_id')
+    )
+    batch = []
+    for student_id, group_id in first_group.iterator(chunk_size=2000):
+        batch.append(Student(id=student_id, current_group_id=group_id))
+        if len(batch) >= 2000:
+            Student.objects.bulk_update(batch, ['current_group'])
+            batch = []
+    Student.objects.bulk_update(batch, ['current_group'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student_dissertation', '0024_milestone_last_reminded_milestone_milestone_due_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='current_group',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='student_dissertation.projectgroup'),
+        ),
+        migrations.RunPython(set_current_groups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.3 on 2026-10-19 03:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student_dissertation', '0025_student_current_group'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField()),
+                ('action', models.CharField(max_length=50)),
+                ('target_type', models.CharField(max_length=50)),
+                ('target_id', models.BigIntegerField(blank=True, null=True)),
+                ('changes', models.JSONField(blank=True, default=dict)),
+                ('actor', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['month', 'created_at'], name='audit_month_idx'), models.Index(fields=['month', 'target_type', 'target_id'], name='audit_month_target_idx'), models.Index(fields=['month', 'actor', 'created_at'], name='audit_month_actor_idx'), models.Index(fields=['month', 'action', 'created_at'], name='audit_month_action_idx')],
+            },
+        ),
+    ]
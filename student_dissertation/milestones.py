@@ -0,0 +1,171 @@
+"""
+Milestones for a whole cohort at once.
+
+rollout_stage() creates one milestone of a Stage for every individual student and every group
+in scope with a single bulk_create. Targets are read with one query per kind and milestones
+already present for the stage with one more, so the number of queries does not depend on
+the size of the cohort, and re-running a roll-out only fills in the gaps.
+
+send_reminders() finds open milestones that are overdue or due within a few days with one
+range scan of the (status, completion_date) index and sends every supervisor, student and
+group member a single Notification listing all of theirs. Milestone.last_reminded records the
+day a reminder went out: a milestone is announced once when it comes due and then, while
+overdue, at most every ``repeat_days`` days, so running the job more often does not repeat
+reminders.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Milestone, Notification, ProjectGroup, Student
+
+
+BATCH_SIZE = 1000
+OPEN_STATUSES = ['Pending', 'In Progress']
+# Milestones named per section of a reminder; the rest are counted
+LISTED = 20
+
+
+def rollout_targets(supervisor=None, course=None, year=None):
+    """
+    Individual students (not in a group) and groups with a supervisor, limited to those of
+    ``supervisor`` and/or a course and year.
+    """
+    students = Student.objects.filter(project_groups__isnull=True, supervisor__isnull=False)
+    groups = ProjectGroup.objects.filter(supervisor__isnull=False)
+    if supervisor is not None:
+        students = students.filter(supervisor=supervisor)
+        groups = groups.filter(supervisor=supervisor)
+    if course is not None:
+        students = students.filter(course_id=course)
+        groups = groups.filter(course_id=course)
+    if year is not None:
+        students = students.filter(year_of_study_id=year)
+        groups = groups.filter(year_id=year)
+    return students.values_list('id', 'supervisor_id'), groups.values_list('id', 'supervisor_id')
+
+
+def rollout_stage(stage, milestone=None, completion_date=None, remarks=None, supervisor=None, course=None, year=None):
+    """
+    Create the ``stage`` milestone for every target that does not have one for it yet.
+    Returns (created, skipped) counts.
+    """
+    students, groups = rollout_targets(supervisor, course, year)
+
+    existing = Milestone.objects.filter(stage=stage).values_list('student_id', 'group_id')
+    have_student, have_group = set(), set()
+    for student_id, group_id in existing:
+        if student_id:
+            have_student.add(student_id)
+        if group_id:
+            have_group.add(group_id)
+
+    fields = {
+        'stage': stage,
+        'milestone': milestone or stage.name,
+        'completion_date': completion_date,
+        'remarks': remarks,
+    }
+    new, skipped = [], 0
+    for student_id, supervisor_id in students:
+        if student_id in have_student:
+            skipped += 1
+        else:
+            new.append(Milestone(student_id=student_id, supervisor_id=supervisor_id, **fields))
+    for group_id, supervisor_id in groups:
+        if group_id in have_group:
+            skipped += 1
+        else:
+            new.append(Milestone(group_id=group_id, supervisor_id=supervisor_id, **fields))
+
+    Milestone.objects.bulk_create(new, batch_size=BATCH_SIZE)
+    return len(new), skipped
+
+
+def needs_reminder(due, last_reminded, today, days_ahead, repeat_days):
+    if last_reminded is None:
+        return True
+    if due < today:
+        # First time overdue, or the previous overdue reminder is old enough
+        return last_reminded <= due or (today - last_reminded).days >= repeat_days
+    # Not yet reminded since it came within ``days_ahead`` of its deadline
+    return last_reminded < due - timedelta(days=days_ahead)
+
+
+def _batches(items, size=BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _reminder_message(sections, days_ahead):
+    counts = [f"{len(sections['overdue'])} overdue" if sections['overdue'] else '',
+              f"{len(sections['soon'])} due within {days_ahead} days" if sections['soon'] else '']
+    lines = [f"Milestone reminder: {', '.join(count for count in counts if count)}."]
+    for key, title in (('overdue', 'Overdue'), ('soon', 'Due soon')):
+        entries = sorted(sections[key])
+        if not entries:
+            continue
+        lines.append(f"\n{title}:")
+        lines += [f"- {text}" for _, text in entries[:LISTED]]
+        if len(entries) > LISTED:
+            lines.append(f"... and {len(entries) - LISTED} more")
+    return '\n'.join(lines)
+
+
+def send_reminders(today=None, days_ahead=3, repeat_days=7, dry_run=False):
+    """
+    Send the due and overdue reminders for ``today`` (default: the current date). Returns the
+    number of milestones reminded about and of notifications created.
+    """
+    today = today or timezone.localdate()
+    candidates = (
+        Milestone.objects
+        .filter(status__in=OPEN_STATUSES, completion_date__lte=today + timedelta(days=days_ahead))
+        .values_list(
+            'id', 'milestone', 'completion_date', 'last_reminded', 'supervisor_id',
+            'student__user_id', 'student__full_name', 'group_id', 'group__name',
+        )
+        .iterator(chunk_size=5000)
+    )
+
+    reminded, for_groups = [], []
+    # user id -> {'overdue': [(due, text)], 'soon': [...]}
+    inbox = {}
+
+    def add(user_id, key, due, text):
+        inbox.setdefault(user_id, {'overdue': [], 'soon': []})[key].append((due, text))
+
+    for pk, title, due, last_reminded, supervisor_id, student_user_id, student_name, group_id, group_name in candidates:
+        if not needs_reminder(due, last_reminded, today, days_ahead, repeat_days):
+            continue
+        reminded.append(pk)
+        key = 'overdue' if due < today else 'soon'
+        target = student_name or f"Group: {group_name}"
+        add(supervisor_id, key, due, f"{title} - {target} (due {due:%Y-%m-%d})")
+        if student_user_id:
+            add(student_user_id, key, due, f"{title} (due {due:%Y-%m-%d})")
+        elif group_id:
+            for_groups.append((group_id, key, due, f"{title} - {group_name} (due {due:%Y-%m-%d})"))
+
+    if for_groups:
+        members = {}
+        group_ids = list({group_id for group_id, *_ in for_groups})
+        for batch in _batches(group_ids):
+            memberships = ProjectGroup.members.through.objects.filter(projectgroup_id__in=batch)
+            for group_id, user_id in memberships.values_list('projectgroup_id', 'student__user_id'):
+                members.setdefault(group_id, []).append(user_id)
+        for group_id, key, due, text in for_groups:
+            for user_id in members.get(group_id, []):
+                add(user_id, key, due, text)
+
+    notifications = [
+        Notification(recipient_id=user_id, message=_reminder_message(sections, days_ahead))
+        for user_id, sections in inbox.items()
+    ]
+    if not dry_run:
+        with transaction.atomic():
+            Notification.objects.bulk_create(notifications, batch_size=BATCH_SIZE)
+            for batch in _batches(reminded):
+                Milestone.objects.filter(id__in=batch).update(last_reminded=today)
+    return len(reminded), len(notifications)
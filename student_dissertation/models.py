@@ -1,9 +1,16 @@
+import datetime
+import os
+
 from django.db import models
+from django.db.models import F, Q
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, User
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ValidationError
 
+from .storage_tiers import sharded_upload_to, archive_root
+from .object_storage import repository_storage
+
 
 class StudentManager(BaseUserManager):
     def create_user(self, reg_number, password=None):
@@ -44,6 +51,9 @@ class Student(AbstractBaseUser):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     course = models.ForeignKey(Course, on_delete=models.SET_NULL, null=True, blank=True)
     year_of_study = models.ForeignKey(YearOfStudy, on_delete=models.SET_NULL, null=True, blank=True)
+    # Denormalised "my group" (the first group the student is a member of), kept in step with
+    # ProjectGroup.members by the signals in signals.py (see memberships.py)
+    current_group = models.ForeignKey('ProjectGroup', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
 
     objects = StudentManager()
 
@@ -85,12 +95,34 @@ class Project(models.Model):
 class FileRepository(models.Model):
     student = models.ForeignKey(Student, null=True, blank=True, on_delete=models.CASCADE, related_name='files')
     group = models.ForeignKey(ProjectGroup, null=True, blank=True, on_delete=models.CASCADE, related_name='files')
-    file = models.FileField(upload_to='student_projects/')
+    file = models.FileField(upload_to=sharded_upload_to, storage=repository_storage, max_length=255)
     file_type = models.CharField(max_length=50, choices=[('document', 'Document'), ('source_code', 'Source Code')])
     description = models.TextField(blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     version = models.PositiveIntegerField(default=1)
     year = models.CharField(max_length=4, null=True, blank=True)
+    # Logical file name; uploads with the same name by the same owner form a version chain
+    name = models.CharField(max_length=255, blank=True)
+    # Set when this version is stored as a delta against the next one (see versions.py)
+    delta_base = models.ForeignKey('self', null=True, blank=True, on_delete=models.RESTRICT, related_name='delta_versions')
+    # Size of the file as uploaded, whatever form it is stored in
+    size = models.BigIntegerField(null=True, blank=True)
+    scan_status = models.CharField(
+        max_length=20,
+        choices=[('unscanned', 'Unscanned'), ('pending', 'Pending'), ('clean', 'Clean'), ('quarantined', 'Quarantined')],
+        default='unscanned',
+    )
+    scan_result = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', 'name', 'version'], name='repository_student_chain_idx'),
+            models.Index(fields=['group', 'name', 'version'], name='repository_group_chain_idx'),
+        ]
+
+    @property
+    def filename(self):
+        return self.name or os.path.basename(self.file.name)
 
     def clean(self):
         if not self.student and not self.group:
@@ -99,6 +131,37 @@ class FileRepository(models.Model):
             raise ValidationError("File cannot be linked to both a student and a group.")
 
 
+class RepositoryArchive(models.Model):
+    """
+    Cold-tier pack holding the FileRepository files of one closed year.
+    """
+    year = models.CharField(max_length=4, unique=True)
+    pack_name = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def path(self):
+        return os.path.join(archive_root(), self.pack_name)
+
+    def __str__(self):
+        return f"Repository archive {self.year}"
+
+
+class ArchiveEntry(models.Model):
+    """
+    Location of one archived FileRepository file inside its pack.
+    """
+    archive = models.ForeignKey(RepositoryArchive, on_delete=models.PROTECT, related_name='entries')
+    file = models.OneToOneField(FileRepository, on_delete=models.CASCADE, related_name='archive_entry')
+    offset = models.BigIntegerField()
+    length = models.BigIntegerField()
+    size = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64)
+
+    def __str__(self):
+        return f"{self.file.file.name} in {self.archive.pack_name}"
+
+
 class Document(models.Model):
     # Generic relation to Student or ProjectGroup
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
@@ -107,13 +170,60 @@ class Document(models.Model):
 
     supervisor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='supervised_documents')
     title = models.CharField(max_length=255)
-    file = models.FileField(upload_to='documents/')
+    file = models.FileField(upload_to='documents/', storage=repository_storage)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    size = models.BigIntegerField(null=True, blank=True)
 
     def __str__(self):
         return f"{self.title} by {self.owner}"
 
 
+class StorageUsage(models.Model):
+    """
+    Bytes and files uploaded by one student or group (FileRepository plus Document), kept up
+    to date by signals so quotas and reports never need to stat files.
+    """
+    student = models.OneToOneField(Student, null=True, blank=True, on_delete=models.CASCADE, related_name='storage_usage')
+    group = models.OneToOneField(ProjectGroup, null=True, blank=True, on_delete=models.CASCADE, related_name='storage_usage')
+    bytes = models.BigIntegerField(default=0)
+    files = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['-bytes'], name='storage_usage_bytes_idx')]
+        constraints = [
+            models.CheckConstraint(
+                condition=Q(student__isnull=False, group__isnull=True) | Q(student__isnull=True, group__isnull=False),
+                name='storage_usage_one_owner',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.student or self.group}: {self.bytes} bytes"
+
+
+class AvailabilitySlot(models.Model):
+    """
+    A time a supervisor has published for one consultation. A supervisor's slots never overlap
+    (checked in scheduling.create_slots).
+    """
+    supervisor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='availability_slots')
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+
+    class Meta:
+        ordering = ['start']
+        indexes = [
+            models.Index(fields=['supervisor', 'start'], name='slot_supervisor_start_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(condition=Q(end__gt=F('start')), name='slot_end_after_start'),
+        ]
+
+    def __str__(self):
+        return f"{self.supervisor.username}: {self.start:%Y-%m-%d %H:%M} - {self.end:%H:%M}"
+
+
 class Consultation(models.Model):
     student = models.ForeignKey('Student', on_delete=models.CASCADE, related_name='consultations')
     supervisor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='consultations')
@@ -125,11 +235,43 @@ class Consultation(models.Model):
         default='Pending'
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    # Set when booked into one of the supervisor's availability slots
+    slot = models.ForeignKey(AvailabilitySlot, null=True, blank=True, on_delete=models.SET_NULL, related_name='consultations')
+
+    class Meta:
+        indexes = [
+            # Serves the supervisor's filtered listing and the booking clash check
+            models.Index(fields=['supervisor', 'status', 'proposed_date'], name='consultation_sup_status_idx'),
+        ]
+        constraints = [
+            # A slot holds at most one pending or approved consultation
+            models.UniqueConstraint(
+                fields=['slot'], condition=Q(status__in=['Pending', 'Approved']), name='consultation_one_per_slot',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.topic} ({self.student.full_name} -> {self.supervisor.username})"
 
 
+class AnnouncementQuerySet(models.QuerySet):
+    def for_student(self, student):
+        """
+        Announcements visible to a student, newest first, as one query: those from the student's
+        own supervisor, from the supervisors of the student's groups, and admin announcements
+        addressed to students.
+        """
+        group_supervisors = ProjectGroup.objects.filter(
+            members=student, supervisor__isnull=False
+        ).values('supervisor')
+
+        audience = Q(supervisor__in=group_supervisors) | Q(admin__isnull=False, target_group=Announcement.STUDENTS)
+        if student.supervisor_id:
+            audience |= Q(supervisor_id=student.supervisor_id)
+
+        return self.filter(audience).order_by('-created_at', '-id')
+
+
 class Announcement(models.Model):
     SUPERVISORS = 'supervisors'
     STUDENTS = 'students'
@@ -144,6 +286,14 @@ class Announcement(models.Model):
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = AnnouncementQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['supervisor', 'created_at'], name='announcement_supervisor_idx'),
+            models.Index(fields=['target_group', 'created_at'], name='announcement_audience_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -190,6 +340,14 @@ class Milestone(models.Model):
     completion_date = models.DateField(null=True, blank=True)
     remarks = models.TextField(null=True, blank=True)
     stage = models.ForeignKey(Stage, on_delete=models.CASCADE, related_name='milestones')
+    # Day the last due/overdue reminder went out (see milestones.send_reminders)
+    last_reminded = models.DateField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Serves the due and overdue milestone scan
+            models.Index(fields=['status', 'completion_date'], name='milestone_due_idx'),
+        ]
 
     def __str__(self):
         target = self.student.full_name if self.student else f"Group: {self.group.name}"
@@ -202,5 +360,85 @@ class Notification(models.Model):
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Serves the unread badge count and the newest-first inbox listing
+            models.Index(fields=['recipient', 'is_read', 'created_at'], name='notification_inbox_idx'),
+        ]
+
     def __str__(self):
         return f"Notification for {self.recipient.username}"
+
+
+class ArchivedNotification(models.Model):
+    """
+    Cold storage for read notifications moved out of the Notification table
+    by the ``archive_notifications`` management command.
+    """
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name="archived_notifications")
+    message = models.TextField()
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Archived notification for {self.recipient.username}"
+
+
+class AuditEventQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        raise TypeError("Audit events are append-only.")
+
+    def delete(self):
+        raise TypeError("Audit events are append-only.")
+
+    def between(self, start, end):
+        """
+        Events from ``start`` up to ``end`` (datetimes), restricted to their months first so
+        only those partitions of the month-leading indexes are read.
+        """
+        return self.filter(month__gte=audit_month(start), month__lte=audit_month(end), created_at__gte=start, created_at__lt=end)
+
+
+def audit_month(moment):
+    """
+    YYYYMM of an aware datetime, in UTC.
+    """
+    moment = moment.astimezone(datetime.timezone.utc)
+    return moment.year * 100 + moment.month
+
+
+class AuditEvent(models.Model):
+    """
+    Append-only record of who changed what, written in batches by the background flusher in
+    audit.py. ``month`` (YYYYMM) is the partition key every index leads with, so queries over
+    a period only touch that period's months.
+    """
+    month = models.PositiveIntegerField()
+    created_at = models.DateTimeField()
+    # No database constraint: events outlive the users they name
+    actor = models.ForeignKey(User, null=True, blank=True, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    action = models.CharField(max_length=50)
+    target_type = models.CharField(max_length=50)
+    target_id = models.BigIntegerField(null=True, blank=True)
+    changes = models.JSONField(default=dict, blank=True)
+
+    objects = AuditEventQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['month', 'created_at'], name='audit_month_idx'),
+            models.Index(fields=['month', 'target_type', 'target_id'], name='audit_month_target_idx'),
+            models.Index(fields=['month', 'actor', 'created_at'], name='audit_month_actor_idx'),
+            models.Index(fields=['month', 'action', 'created_at'], name='audit_month_action_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise TypeError("Audit events are append-only.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise TypeError("Audit events are append-only.")
+
+    def __str__(self):
+        return f"{self.created_at:%Y-%m-%d %H:%M:%S} {self.action} {self.target_type} {self.target_id}"
@@ -0,0 +1,195 @@
+"""
+Object storage for Document and FileRepository bytes, with presigned upload/download URLs so
+clients move file bytes straight to and from the store and the API only records metadata.
+
+Configured with the OBJECT_STORAGE setting::
+
+    OBJECT_STORAGE = {
+        'BACKEND': 'student_dissertation.object_storage.S3ObjectStorage',
+        'OPTIONS': {'bucket': 'dissertations', 'endpoint_url': 'http://localhost:9000', ...},
+    }
+
+S3ObjectStorage talks to any S3-compatible service (AWS, MinIO) through boto3, which is only
+needed when it is configured. The default LocalObjectStorage is a stand-in that keeps objects
+under MEDIA_ROOT and issues signed URLs served by this app, so the same presigned flow works
+in development and tests without an object store.
+
+The Django side of the same bytes (FileField.storage) is the ``repository`` alias of the
+STORAGES setting when present, so with django-storages pointed at the same bucket the keys
+written here resolve through ``Document.file`` and ``FileRepository.file`` unchanged.
+"""
+import os
+import posixpath
+import time
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import default_storage, storages
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.urls import reverse
+from django.utils.module_loading import import_string
+
+from .storage_tiers import sharded_upload_to
+
+
+UPLOAD_SALT = 'student_dissertation.object_storage.upload'
+LOCAL_URL_SALT = 'student_dissertation.object_storage.local'
+DEFAULT_EXPIRY = 15 * 60
+
+
+def repository_storage():
+    """
+    Callable ``storage`` for the Document and FileRepository file fields.
+    """
+    if 'repository' in settings.STORAGES:
+        return storages['repository']
+    return default_storage
+
+
+def new_object_key(target, filename):
+    filename = posixpath.basename(filename.replace('\\', '/')) or 'upload'
+    if target == 'repository':
+        return sharded_upload_to(None, filename)
+    return posixpath.join('documents', uuid.uuid4().hex[:12], filename)
+
+
+class ObjectStorage:
+    # Whether downloads should redirect to presigned URLs instead of streaming through a worker
+    redirect_downloads = False
+
+    def presigned_put_url(self, key, content_type, expires=DEFAULT_EXPIRY, max_size=None):
+        raise NotImplementedError
+
+    def presigned_get_url(self, key, expires=DEFAULT_EXPIRY, filename=None):
+        raise NotImplementedError
+
+    def size(self, key):
+        """
+        Size in bytes of the stored object, or None if it does not exist.
+        """
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+
+class S3ObjectStorage(ObjectStorage):
+    redirect_downloads = True
+
+    def __init__(self, bucket, endpoint_url=None, access_key=None, secret_key=None, region=None):
+        import boto3
+
+        self.bucket = bucket
+        self.client = boto3.client(
+            's3',
+            endpoint_url=endpoint_url,
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+            region_name=region,
+        )
+
+    def presigned_put_url(self, key, content_type, expires=DEFAULT_EXPIRY, max_size=None):
+        return self.client.generate_presigned_url(
+            'put_object',
+            Params={'Bucket': self.bucket, 'Key': key, 'ContentType': content_type},
+            ExpiresIn=expires,
+        )
+
+    def presigned_get_url(self, key, expires=DEFAULT_EXPIRY, filename=None):
+        params = {'Bucket': self.bucket, 'Key': key}
+        if filename:
+            params['ResponseContentDisposition'] = f'attachment; filename="{filename}"'
+        return self.client.generate_presigned_url('get_object', Params=params, ExpiresIn=expires)
+
+    def size(self, key):
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=key)['ContentLength']
+        except ClientError:
+            return None
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+
+class LocalObjectStorage(ObjectStorage):
+    """
+    Local stand-in for an S3-compatible store: objects live under ``root`` (MEDIA_ROOT by
+    default) and presigned URLs point at the signed ``object-storage/<token>/`` endpoint.
+    Downloads keep streaming from the API unless ``redirect_downloads`` is set.
+    """
+
+    def __init__(self, root=None, redirect_downloads=False):
+        self.root = root or settings.MEDIA_ROOT
+        self.redirect_downloads = redirect_downloads
+
+    def path(self, key):
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(os.path.abspath(self.root) + os.sep):
+            raise ValueError("Object key escapes the storage root.")
+        return path
+
+    def _url(self, key, method, expires, **extra):
+        token = signing.dumps({'key': key, 'method': method, 'exp': int(time.time()) + expires, **extra}, salt=LOCAL_URL_SALT)
+        return reverse('object-storage', args=[token])
+
+    def presigned_put_url(self, key, content_type, expires=DEFAULT_EXPIRY, max_size=None):
+        return self._url(key, 'PUT', expires, max_size=max_size)
+
+    def presigned_get_url(self, key, expires=DEFAULT_EXPIRY, filename=None):
+        return self._url(key, 'GET', expires, filename=filename)
+
+    def size(self, key):
+        try:
+            return os.path.getsize(self.path(key))
+        except (OSError, ValueError):
+            return None
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def verify(token):
+        """
+        Decode a presigned local URL token; raises signing.BadSignature when invalid or expired.
+        """
+        payload = signing.loads(token, salt=LOCAL_URL_SALT)
+        if payload['exp'] < time.time():
+            raise signing.SignatureExpired("Presigned URL expired.")
+        return payload
+
+
+_object_storage = None
+
+
+def get_object_storage():
+    global _object_storage
+    if _object_storage is None:
+        config = getattr(settings, 'OBJECT_STORAGE', None) or {}
+        backend = import_string(config.get('BACKEND', 'student_dissertation.object_storage.LocalObjectStorage'))
+        _object_storage = backend(**config.get('OPTIONS', {}))
+    return _object_storage
+
+
+@receiver(setting_changed)
+def _reset_object_storage(setting, **kwargs):
+    global _object_storage
+    if setting in ('OBJECT_STORAGE', 'MEDIA_ROOT'):
+        _object_storage = None
+
+
+def sign_upload(key, target, user_id, max_size=None):
+    """
+    Token the client hands back to confirm an upload, binding the key to the user and target.
+    """
+    return signing.dumps({'key': key, 'target': target, 'user': user_id, 'max_size': max_size}, salt=UPLOAD_SALT)
+
+
+def load_upload(token, max_age=DEFAULT_EXPIRY * 4):
+    return signing.loads(token, salt=UPLOAD_SALT, max_age=max_age)
@@ -0,0 +1,102 @@
+"""
+Storage accounting and quotas per student and per group.
+
+StorageUsage rows are adjusted with single F() updates by the FileRepository and Document
+save/delete signals, so they commit or roll back together with the row they account for. Quotas are
+checked against these counters: up front from the request's Content-Length, while the
+upload streams in (ValidatingUploadHandler) and exactly once the file size is known.
+"""
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.template.defaultfilters import filesizeformat
+from django.utils import timezone
+
+from .models import Student, ProjectGroup, StorageUsage
+from .upload_validation import UploadRejected, MULTIPART_OVERHEAD
+
+
+def quota_for(owner):
+    if isinstance(owner, ProjectGroup):
+        return settings.GROUP_STORAGE_QUOTA
+    return settings.STUDENT_STORAGE_QUOTA
+
+
+def _owner_filter(owner):
+    return {'group': owner} if isinstance(owner, ProjectGroup) else {'student': owner}
+
+
+def used(owner):
+    return StorageUsage.objects.filter(**_owner_filter(owner)).values_list('bytes', flat=True).first() or 0
+
+
+def remaining(owner):
+    return quota_for(owner) - used(owner)
+
+
+def upload_allowance(student):
+    """
+    Most a student can upload before the target is known: their own remaining quota or that
+    of any of their groups, whichever is larger.
+    """
+    allowance = remaining(student)
+    group_usage = dict(
+        StorageUsage.objects.filter(group__members=student).values_list('group_id', 'bytes')
+    )
+    for group_id in student.project_groups.values_list('id', flat=True):
+        allowance = max(allowance, settings.GROUP_STORAGE_QUOTA - group_usage.get(group_id, 0))
+    return allowance
+
+
+def check_quota(owner, size):
+    """
+    Raise UploadRejected (413) if ``size`` more bytes would take the owner over quota.
+    """
+    quota = quota_for(owner)
+    current = used(owner)
+    if current + size > quota:
+        raise UploadRejected(
+            f"Storage quota exceeded: {filesizeformat(current)} of {filesizeformat(quota)} used.", 413,
+        )
+
+
+def check_content_length(owner, request):
+    """
+    Quota check from the Content-Length header alone, before the body is read.
+    """
+    content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+    check_quota(owner, max(content_length - MULTIPART_OVERHEAD, 0))
+
+
+def record(owner, size, files=1):
+    """
+    Add ``size`` bytes and ``files`` files (negative to release) to the owner's counter.
+    """
+    updated = StorageUsage.objects.filter(**_owner_filter(owner)).update(
+        bytes=F('bytes') + size, files=F('files') + files, updated_at=timezone.now(),
+    )
+    # Releases never create a row: the owner may be in the middle of being deleted
+    if not updated and files > 0:
+        try:
+            with transaction.atomic():
+                StorageUsage.objects.create(bytes=size, files=files, **_owner_filter(owner))
+        except IntegrityError:
+            # Created concurrently
+            record(owner, size, files)
+
+
+def file_owner(instance):
+    """
+    The Student or ProjectGroup a FileRepository or Document counts against.
+    """
+    if hasattr(instance, 'content_type_id') and hasattr(instance, 'object_id'):
+        model = ContentType.objects.get_for_id(instance.content_type_id).model_class()
+        if model in (Student, ProjectGroup):
+            return model(pk=instance.object_id)
+        return None
+    if instance.group_id:
+        return ProjectGroup(pk=instance.group_id)
+    if instance.student_id:
+        return Student(pk=instance.student_id)
+    return None
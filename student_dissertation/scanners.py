@@ -0,0 +1,169 @@
+"""
+Optional malware scanning of repository uploads.
+
+Configured with the UPLOAD_SCANNER setting, e.g.::
+
+    UPLOAD_SCANNER = {'BACKEND': 'student_dissertation.scanners.ClamdScanner', 'OPTIONS': {'host': 'localhost'}}
+
+With a scanner configured, new uploads are saved as ``pending`` and scanned in a background
+thread once the upload transaction commits, so the request does not wait for the scan.
+Clean files become ``clean``; infected ones are moved out of the repository storage into
+UPLOAD_QUARANTINE_ROOT and marked ``quarantined``. Pending and quarantined files cannot be
+downloaded.
+
+SignatureScanner is a local stand-in for ClamAV that only knows the EICAR test signature
+plus any extra byte signatures given to it, for development and tests.
+"""
+import logging
+import os
+import socket
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connection, transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .models import FileRepository
+from .storage_tiers import CHUNK_SIZE
+
+
+logger = logging.getLogger(__name__)
+
+EICAR = b'X5O!P%@AP[4\\PZX54(P^)7CC)7}$EICAR-STANDARD-ANTIVIRUS-TEST-FILE!$H+H*'
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='upload-scan')
+
+
+class Scanner:
+    def scan(self, source):
+        """
+        Scan the open binary file; return the name of the detected threat or None if clean.
+        """
+        raise NotImplementedError
+
+
+class SignatureScanner(Scanner):
+    def __init__(self, signatures=None):
+        self.signatures = {'Eicar-Test-Signature': EICAR}
+        self.signatures.update({name: signature.encode() if isinstance(signature, str) else signature
+                                for name, signature in (signatures or {}).items()})
+        self._overlap = max(len(signature) for signature in self.signatures.values())
+
+    def scan(self, source):
+        tail = b''
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+            window = tail + chunk
+            for name, signature in self.signatures.items():
+                if signature in window:
+                    return name
+            tail = window[-self._overlap:]
+        return None
+
+
+class ClamdScanner(Scanner):
+    """
+    Streams the file to a clamd daemon with the INSTREAM command.
+    """
+
+    def __init__(self, host='localhost', port=3310, timeout=60):
+        self.address = (host, port)
+        self.timeout = timeout
+
+    def scan(self, source):
+        with socket.create_connection(self.address, timeout=self.timeout) as sock:
+            sock.sendall(b'zINSTREAM\0')
+            for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                sock.sendall(struct.pack('>I', len(chunk)) + chunk)
+            sock.sendall(struct.pack('>I', 0))
+            reply = b''
+            while not reply.endswith(b'\0'):
+                data = sock.recv(4096)
+                if not data:
+                    break
+                reply += data
+
+        # "stream: OK" or "stream: <signature> FOUND"
+        reply = reply.rstrip(b'\0').decode()
+        if reply.endswith('FOUND'):
+            return reply.split(': ', 1)[1].rsplit(' ', 1)[0]
+        if not reply.endswith('OK'):
+            raise RuntimeError(f"clamd error: {reply}")
+        return None
+
+
+_scanner = None
+
+
+def get_scanner():
+    global _scanner
+    config = getattr(settings, 'UPLOAD_SCANNER', None)
+    if not config:
+        return None
+    if _scanner is None:
+        _scanner = import_string(config['BACKEND'])(**config.get('OPTIONS', {}))
+    return _scanner
+
+
+@receiver(setting_changed)
+def _reset_scanner(setting, **kwargs):
+    global _scanner
+    if setting == 'UPLOAD_SCANNER':
+        _scanner = None
+
+
+def quarantine_path(file_repo):
+    root = getattr(settings, 'UPLOAD_QUARANTINE_ROOT', os.path.join(settings.BASE_DIR, 'quarantine'))
+    return os.path.join(root, f"{file_repo.pk}-{os.path.basename(file_repo.file.name)}")
+
+
+def quarantine(file_repo, threat):
+    """
+    Move the file out of the repository storage so nothing can serve it.
+    """
+    storage = file_repo.file.storage
+    target = quarantine_path(file_repo)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with storage.open(file_repo.file.name, 'rb') as source, open(target, 'wb') as out:
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+            out.write(chunk)
+    storage.delete(file_repo.file.name)
+    FileRepository.objects.filter(pk=file_repo.pk).update(scan_status='quarantined', scan_result=threat[:255])
+
+
+def scan_file(pk, on_clean=None):
+    """
+    Scan one repository file and mark it clean or quarantine it. Uses the calling thread's
+    database connection and leaves it open.
+    """
+    try:
+        file_repo = FileRepository.objects.get(pk=pk)
+        with file_repo.file.storage.open(file_repo.file.name, 'rb') as source:
+            threat = get_scanner().scan(source)
+
+        if threat:
+            logger.warning("Quarantined repository file %s: %s", pk, threat)
+            quarantine(file_repo, threat)
+        else:
+            FileRepository.objects.filter(pk=pk).update(scan_status='clean', scan_result='')
+            if on_clean is not None:
+                on_clean()
+    except Exception:
+        # Left pending (and so not downloadable) until rescanned
+        logger.exception("Scanning repository file %s failed", pk)
+
+
+def _scan_in_worker(pk, on_clean):
+    try:
+        scan_file(pk, on_clean)
+    finally:
+        connection.close()
+
+
+def schedule_scan(file_repo, on_clean=None):
+    """
+    Scan the file in the background once the current transaction commits.
+    """
+    transaction.on_commit(lambda: _executor.submit(_scan_in_worker, file_repo.pk, on_clean))
@@ -0,0 +1,204 @@
+"""
+Consultation scheduling against supervisor availability.
+
+Supervisors publish AvailabilitySlots; a slot holds one pending or approved consultation,
+which the consultation_one_per_slot unique constraint enforces in the database, so two
+students racing for the same slot cannot both get it. A supervisor's slots never overlap,
+which keeps conflict checks to one index lookup: with slots sorted by start, a new interval
+can only collide with the last slot starting before it ends.
+
+Supervisors that have not published any slots keep the old free-form booking, where a
+consultation within CONSULTATION_LENGTH minutes of another active one is a conflict.
+
+Supervisors decide on requests in batches through set_status, which audits every change.
+"""
+from bisect import bisect_left
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import AvailabilitySlot, Consultation, Notification
+from . import audit
+
+
+ACTIVE_STATUSES = ['Pending', 'Approved']
+DECISIONS = ['Approved', 'Rejected']
+# Most slots one request may create
+MAX_SLOTS = 500
+
+
+class SchedulingConflict(Exception):
+    def __init__(self, message, status_code=409, suggestions=()):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        self.suggestions = list(suggestions)
+
+
+def parse_time(value):
+    """
+    Aware datetime from an ISO 8601 string (naive ones are in TIME_ZONE); None if empty.
+    """
+    if not value:
+        return None
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise SchedulingConflict(f"{value!r} is not a date and time.", 400)
+    return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+
+
+def consultation_length():
+    return timedelta(minutes=getattr(settings, 'CONSULTATION_LENGTH', 30))
+
+
+def split_interval(start, end, minutes=None):
+    """
+    Cut [start, end) into consecutive slots of ``minutes`` (the whole interval if None).
+    """
+    if end <= start:
+        raise SchedulingConflict("A slot must end after it starts.", 400)
+    if not minutes:
+        return [(start, end)]
+    length = timedelta(minutes=minutes)
+    if length <= timedelta(0):
+        raise SchedulingConflict("length must be positive.", 400)
+    slots = []
+    while start + length <= end:
+        slots.append((start, start + length))
+        start += length
+    return slots
+
+
+def create_slots(supervisor, intervals):
+    """
+    Create slots for the (start, end) intervals, refusing the whole batch if any overlaps
+    another interval or an existing slot. Existing slots are fetched with one range query
+    over the batch's span and matched by bisection.
+    """
+    intervals = sorted(intervals)
+    if not intervals:
+        return []
+    if len(intervals) > MAX_SLOTS:
+        raise SchedulingConflict(f"At most {MAX_SLOTS} slots can be created at once.", 400)
+    for (start, end), (next_start, _) in zip(intervals, intervals[1:]):
+        if next_start < end:
+            raise SchedulingConflict(f"Slots starting {start:%Y-%m-%d %H:%M} and {next_start:%Y-%m-%d %H:%M} overlap.", 400)
+
+    with transaction.atomic():
+        # Serialise slot changes per supervisor
+        User.objects.select_for_update().filter(pk=supervisor.pk).exists()
+        existing = list(
+            AvailabilitySlot.objects.filter(
+                supervisor=supervisor, start__lt=intervals[-1][1], end__gt=intervals[0][0],
+            ).order_by('start').values_list('start', 'end')
+        )
+        starts = [start for start, _ in existing]
+        for start, end in intervals:
+            # Last existing slot starting before this one ends
+            index = bisect_left(starts, end) - 1
+            if index >= 0 and existing[index][1] > start:
+                taken_start, taken_end = existing[index]
+                raise SchedulingConflict(
+                    f"{start:%Y-%m-%d %H:%M} - {end:%H:%M} overlaps the existing slot "
+                    f"{taken_start:%Y-%m-%d %H:%M} - {taken_end:%H:%M}."
+                )
+        return AvailabilitySlot.objects.bulk_create(
+            [AvailabilitySlot(supervisor=supervisor, start=start, end=end) for start, end in intervals]
+        )
+
+
+def free_slots(supervisor, after=None):
+    """
+    The supervisor's slots from ``after`` (default now) without an active consultation.
+    """
+    booked = Consultation.objects.filter(slot=OuterRef('pk'), status__in=ACTIVE_STATUSES)
+    return (
+        AvailabilitySlot.objects.filter(supervisor=supervisor, start__gte=after or timezone.now())
+        .filter(~Exists(booked))
+        .order_by('start')
+    )
+
+
+def next_free_slots(supervisor, count=5, after=None):
+    return list(free_slots(supervisor, after)[:count])
+
+
+def book(serializer, supervisor, slot=None):
+    """
+    Save a validated ConsultationSerializer for ``supervisor``, into ``slot`` or the slot
+    starting at the proposed date. Raises SchedulingConflict, with the next free slots as
+    suggestions, if the time is not available.
+    """
+    proposed = serializer.validated_data['proposed_date']
+    student = serializer.validated_data['student']
+
+    def conflict(message):
+        return SchedulingConflict(message, suggestions=next_free_slots(supervisor, after=max(proposed, timezone.now())))
+
+    if slot is None:
+        slot = AvailabilitySlot.objects.filter(supervisor=supervisor, start=proposed).first()
+        if slot is None and AvailabilitySlot.objects.filter(supervisor=supervisor).exists():
+            raise conflict("The supervisor is not available at that time.")
+    if slot is not None and slot.start < timezone.now():
+        raise conflict("That slot has already started.")
+
+    start = slot.start if slot else proposed
+    end = slot.end if slot else proposed + consultation_length()
+    length = consultation_length()
+    with transaction.atomic():
+        # Free-form bookings (and the student's own diary) are checked by a range query
+        clashes = Consultation.objects.filter(
+            status__in=ACTIVE_STATUSES, proposed_date__gt=start - length, proposed_date__lt=end,
+        )
+        if slot is None and clashes.filter(supervisor=supervisor).exists():
+            raise conflict("The supervisor already has a consultation at that time.")
+        if clashes.filter(student=student).exists():
+            raise conflict("You already have a consultation at that time.")
+        try:
+            with transaction.atomic():
+                return serializer.save(slot=slot, proposed_date=start)
+        except IntegrityError:
+            raise conflict("That slot has just been booked.")
+
+
+def set_status(consultations, status):
+    """
+    Move the consultations in the queryset that are not already ``status`` to it with one
+    UPDATE and, for approvals and rejections, notify each student with one bulk insert.
+    Returns the number changed.
+    """
+    with transaction.atomic():
+        changed = list(
+            consultations.exclude(status=status).select_for_update()
+            .select_related('student').only('id', 'topic', 'proposed_date', 'status', 'student__user_id')
+        )
+        if not changed:
+            return 0
+        try:
+            with transaction.atomic():
+                Consultation.objects.filter(id__in=[consultation.id for consultation in changed]).update(status=status)
+        except IntegrityError:
+            # Re-approving a rejected request whose slot has been booked since
+            raise SchedulingConflict("A consultation's slot has been booked by someone else.")
+        audit.record_many('consultation.status', 'consultation', {
+            consultation.id: {'status': [consultation.status, status]} for consultation in changed
+        })
+        if status not in DECISIONS:
+            return len(changed)
+        Notification.objects.bulk_create([
+            Notification(
+                recipient_id=consultation.student.user_id,
+                message=f"Your consultation \"{consultation.topic}\" on "
+                        f"{timezone.localtime(consultation.proposed_date):%Y-%m-%d %H:%M} was {status.lower()}.",
+            )
+            for consultation in changed
+        ])
+    return len(changed)
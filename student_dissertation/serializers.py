@@ -1,7 +1,10 @@
 from rest_framework import serializers
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.auth.models import User
+from django.urls import reverse
 from .models import Student, Document, Consultation, Announcement, Feedback, Milestone, Stage, Course, YearOfStudy, ProjectGroup, FileRepository, Notification
+from .models import AvailabilitySlot, AuditEvent
+from .storage_tiers import is_archived
 
 
 class CourseSerializer(serializers.ModelSerializer):
@@ -136,7 +139,8 @@ class ConsultationSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Consultation
-        fields = ['id','student', 'supervisor', 'student_name', 'supervisor_name', 'topic', 'proposed_date', 'status', 'created_at']
+        fields = ['id','student', 'supervisor', 'student_name', 'supervisor_name', 'topic', 'proposed_date', 'status', 'created_at', 'slot']
+        read_only_fields = ['slot']
 
         extra_kwargs = {
             'student': {'write_only': True},
@@ -144,6 +148,15 @@ class ConsultationSerializer(serializers.ModelSerializer):
         }
 
 
+class AvailabilitySlotSerializer(serializers.ModelSerializer):
+    # Annotated by the views; slots just created are free
+    booked = serializers.BooleanField(read_only=True, default=False)
+
+    class Meta:
+        model = AvailabilitySlot
+        fields = ['id', 'start', 'end', 'booked']
+
+
 class AnnouncementSerializer(serializers.ModelSerializer):
     supervisor_name = serializers.CharField(source='supervisor.username', read_only=True)
 
@@ -167,6 +180,17 @@ class StageSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'description']
 
 
+class StageRolloutSerializer(serializers.Serializer):
+    """
+    Input of a stage roll-out; validated once for the whole cohort.
+    """
+    milestone = serializers.CharField(max_length=255, required=False)
+    completion_date = serializers.DateField(required=False, allow_null=True)
+    remarks = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    course = serializers.PrimaryKeyRelatedField(queryset=Course.objects.all(), required=False)
+    year = serializers.PrimaryKeyRelatedField(queryset=YearOfStudy.objects.all(), required=False)
+
+
 class MilestoneSerializer(serializers.ModelSerializer):
     student_name = serializers.CharField(source='student.full_name', read_only=True)
     group_name = serializers.CharField(source='group.name', read_only=True, allow_null=True)
@@ -203,14 +227,30 @@ class FileRepositorySerializer(serializers.ModelSerializer):
 
     class Meta:
         model = FileRepository
-        fields = ['id', 'student', 'group', 'student_name', 'group_name', 'file', 'file_type', 'description', 'uploaded_at', 'version', 'year']
+        fields = [
+            'id', 'student', 'group', 'student_name', 'group_name', 'file', 'file_type', 'description',
+            'uploaded_at', 'version', 'name', 'year', 'scan_status',
+        ]
 
     def get_file(self, obj):
         request = self.context.get('request')
-        return request.build_absolute_uri(obj.file.url)
+        # Archived and delta-stored versions are not servable as stored; the download endpoint rebuilds them
+        if is_archived(obj) or obj.delta_base_id:
+            url = reverse('repository-download', args=[obj.pk])
+        else:
+            url = obj.file.url
+        return request.build_absolute_uri(url) if request else url
 
 
 class NotificationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Notification
         fields = '__all__'
+
+
+class AuditEventSerializer(serializers.ModelSerializer):
+    actor_name = serializers.CharField(source='actor.username', read_only=True, default=None)
+
+    class Meta:
+        model = AuditEvent
+        fields = ['id', 'created_at', 'actor', 'actor_name', 'action', 'target_type', 'target_id', 'changes']
@@ -0,0 +1,220 @@
+"""
+Side effects of saving models (notifications, emails), run once the transaction commits.
+
+on_change(model, *fields) registers a handler for saves that change any of ``fields``. The
+values of the fields are remembered when an instance is loaded (post_init) and after each
+save, so telling whether a save changed them takes no query. A field deferred when the
+instance was loaded has nothing to compare with and counts as changed from None once it is
+set; on a new instance every field that is not None has changed from None.
+
+defer(handler, *items) collects items until the surrounding transaction commits and then calls
+``handler(items)`` once with all of them, so saving a thousand rows in one transaction
+notifies with one bulk_create rather than a thousand INSERTs. Items deferred in a savepoint
+that rolls back are dropped with it (those deferred in a nested atomic block are handled
+in a batch of their own). Outside a transaction the handler is called at once.
+``background=True`` hands the call to a worker pool instead, for slow work such as sending
+email; handlers that run there must not need rows of the transaction that deferred them
+before it commits. Configured with the SIDE_EFFECTS setting::
+
+    SIDE_EFFECTS = {'WORKERS': 4}
+
+With WORKERS 0 background handlers run inline as well. Failing handlers are logged, not
+raised: by the time they run the data is saved.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.mail import send_mass_mail
+from django.core.signals import setting_changed
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models.signals import post_init, post_save
+from django.dispatch import receiver
+
+from .models import Notification
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {'WORKERS': 4}
+BATCH_SIZE = 1000
+
+# model -> {field name: attname} of the fields whose changes are watched
+_tracked = {}
+# model -> [(field names, handler)]
+_handlers = {}
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, 'SIDE_EFFECTS', {})}
+
+
+def _remember(sender, instance, **kwargs):
+    values = instance.__dict__
+    instance._side_effect_values = {
+        attname: values[attname] for attname in _tracked[sender].values() if attname in values
+    }
+
+
+def _saved(sender, instance, created, update_fields, **kwargs):
+    fields = _tracked[sender]
+    if update_fields is not None:
+        fields = {
+            name: attname for name, attname in fields.items() if name in update_fields or attname in update_fields
+        }
+    values = instance.__dict__
+    remembered = values.setdefault('_side_effect_values', {})
+    changes = {}
+    for name, attname in fields.items():
+        if attname not in values:
+            continue
+        previous = None if created else remembered.get(attname)
+        if values[attname] != previous:
+            changes[name] = (previous, values[attname])
+        remembered[attname] = values[attname]
+    if not changes:
+        return
+    for names, handler in _handlers[sender]:
+        if any(name in changes for name in names):
+            handler(instance, created, {name: changes[name] for name in names if name in changes})
+
+
+def on_change(model, *fields):
+    """
+    Decorator registering ``handler(instance, created, changes)`` to be called after a save of
+    ``model`` changes any of ``fields``; ``changes`` maps those that changed to (old, new)
+    values, foreign keys by id.
+    """
+    def decorator(handler):
+        tracked = _tracked.setdefault(model, {})
+        tracked.update((name, model._meta.get_field(name).attname) for name in fields)
+        _handlers.setdefault(model, []).append((fields, handler))
+        uid = model._meta.label_lower
+        post_init.connect(_remember, sender=model, weak=False, dispatch_uid=f'side_effects.remember.{uid}')
+        post_save.connect(_saved, sender=model, weak=False, dispatch_uid=f'side_effects.saved.{uid}')
+        return handler
+    return decorator
+
+
+_executor = None
+_futures = set()
+_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=config()['WORKERS'], thread_name_prefix='side-effects')
+        return _executor
+
+
+@receiver(setting_changed)
+def _reset_executor(setting, **kwargs):
+    global _executor
+    if setting == 'SIDE_EFFECTS':
+        with _lock:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = None
+
+
+def _call(handler, items):
+    try:
+        handler(items)
+    except Exception:
+        logger.exception("Side effect %s failed for %s item(s)", handler.__qualname__, len(items))
+
+
+def _call_in_worker(handler, items):
+    try:
+        _call(handler, items)
+    finally:
+        connection.close()
+
+
+def _run(handler, items, background):
+    if not (background and config()['WORKERS']):
+        _call(handler, items)
+        return
+    future = get_executor().submit(_call_in_worker, handler, items)
+    with _lock:
+        _futures.add(future)
+    future.add_done_callback(_futures.discard)
+
+
+def drain(timeout=None):
+    """
+    Wait for the background handlers submitted so far to finish.
+    """
+    with _lock:
+        futures = list(_futures)
+    wait(futures, timeout)
+
+
+class _Batch:
+    """
+    Items deferred at one savepoint level of a transaction, run by one on_commit callback.
+    """
+    def __init__(self, position):
+        self.position = position
+        self.items = {}
+        self.done = False
+
+    def registered(self, db):
+        # Gone if the transaction or savepoint rolled back, which drops the callback
+        callbacks = db.run_on_commit
+        return not self.done and self.position < len(callbacks) and callbacks[self.position][1] == self.run
+
+    def run(self):
+        self.done = True
+        for (handler, background), items in self.items.items():
+            _run(handler, items, background)
+
+
+def defer(handler, *items, background=False, using=None):
+    """
+    Call ``handler`` with ``items`` and the others deferred to it in this transaction, once it
+    commits.
+    """
+    if not items:
+        return
+    db = connections[using or DEFAULT_DB_ALIAS]
+    if not db.in_atomic_block:
+        _run(handler, list(items), background)
+        return
+    if not db.run_on_commit:
+        # Nothing pending: whatever batches are left belong to finished transactions
+        db._side_effect_batches = {}
+    batches = db.__dict__.setdefault('_side_effect_batches', {})
+    level = tuple(db.savepoint_ids)
+    batch = batches.get(level)
+    if batch is None or not batch.registered(db):
+        batch = batches[level] = _Batch(len(db.run_on_commit))
+        db.on_commit(batch.run)
+    batch.items.setdefault((handler, background), []).extend(items)
+
+
+def _create_notifications(notifications):
+    Notification.objects.bulk_create(notifications, batch_size=BATCH_SIZE)
+
+
+def notify(recipient_id, message, using=None):
+    """
+    Create a Notification once the transaction commits, with the transaction's others.
+    """
+    defer(_create_notifications, Notification(recipient_id=recipient_id, message=message), using=using)
+
+
+def _send_emails(emails):
+    # One SMTP connection for the lot
+    send_mass_mail(emails, fail_silently=False)
+
+
+def send_emails(*emails, using=None):
+    """
+    Send (subject, message, from_email, recipient_list) emails from the worker pool once the
+    transaction commits.
+    """
+    defer(_send_emails, *emails, background=True, using=using)
@@ -1,65 +1,109 @@
-from django.db.models.signals import pre_save, post_save
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
 from django.dispatch import receiver
-from django.core.mail import send_mail
-from .models import Student, Notification, Document
-
-
-@receiver(pre_save, sender=Student)
-def notify_supervisor_assignment(sender, instance, **kwargs):
-    try:
-        previous = Student.objects.get(pk=instance.pk)
-        changed = previous.supervisor != instance.supervisor
-    except Student.DoesNotExist:
-        changed = True  # New student
-
-    if changed and instance.supervisor:
-        # Save notification in DB
-        Notification.objects.create(
-            recipient=instance.supervisor,
-            message=f"You have been assigned a new student: {instance.full_name} ({instance.reg_number})"
-        )
+from .models import Student, Document, FileRepository, ProjectGroup
+from . import allocation, audit, quotas, memberships, side_effects
 
-        # Send email notification
-        send_mail(
-            subject="New Student Assignment Notification",
-            message=f"Dear {instance.supervisor.get_full_name() or instance.supervisor.username},\n\n"
-                    f"You have been assigned a new student:\n\n"
-                    f"Name: {instance.full_name}\n"
-                    f"Reg No: {instance.reg_number}\n"
-                    f"Project Title: {instance.project_title or 'N/A'}\n\n"
-                    f"Please log in to your dashboard to view more details.",
-            from_email=None,  # Uses DEFAULT_FROM_EMAIL
-            recipient_list=[instance.supervisor.email],
-            fail_silently=False,
-        )
+
+@side_effects.on_change(Student, 'supervisor')
+def notify_supervisor_assignment(instance, created, changes):
+    previous, supervisor_id = changes['supervisor']
+    if not created:
+        audit.record('supervisor.assigned', 'student', instance.pk, supervisor=[previous, supervisor_id])
+    if supervisor_id is not None:
+        side_effects.notify(supervisor_id, allocation.assignment_message(instance))
+        side_effects.defer(_mail_assignments, (supervisor_id, instance))
+
+
+def _mail_assignments(assignments):
+    # One email per supervisor listing all of their new students
+    students = {}
+    for supervisor_id, student in assignments:
+        students.setdefault(supervisor_id, []).append(student)
+    supervisors = User.objects.in_bulk(list(students))
+    side_effects.send_emails(*[
+        allocation.assignment_email(supervisors[supervisor_id], assigned)
+        for supervisor_id, assigned in students.items() if supervisor_id in supervisors
+    ])
 
 
 @receiver(post_save, sender=Document)
 def notify_supervisor_document_upload(sender, instance, created, **kwargs):
-    if not created:
+    if not created or instance.content_type_id != ContentType.objects.get_for_model(Student).id:
         return
 
-    owner = instance.owner
+    student = instance.owner
+    if student is not None:
+        side_effects.notify(instance.supervisor_id, f"{student.full_name} has uploaded a new document: {instance.title}")
+        side_effects.defer(_mail_document_uploads, (instance.supervisor_id, student, instance.title))
 
-    # Check if the owner is a Student
-    if isinstance(owner, Student) and instance.supervisor:
-        student = owner
-        supervisor = instance.supervisor
 
-        # Save notification in DB
-        Notification.objects.create(
-            recipient=supervisor,
-            message=f"{student.full_name} has uploaded a new document: {instance.title}"
+def _mail_document_uploads(uploads):
+    supervisors = User.objects.in_bulk([supervisor_id for supervisor_id, _, _ in uploads])
+    side_effects.send_emails(*[
+        (
+            "Student Document Upload Notification",
+            f"Dear {supervisors[supervisor_id].get_full_name() or supervisors[supervisor_id].username},\n\n"
+            f"Your student {student.full_name} ({student.reg_number}) has uploaded a new document:\n"
+            f"Title: {title}\n\n"
+            f"Please log in to your dashboard to review it.",
+            None,
+            [supervisors[supervisor_id].email],
         )
+        for supervisor_id, student, title in uploads if supervisor_id in supervisors
+    ])
 
-        # Send email
-        send_mail(
-            subject="Student Document Upload Notification",
-            message=f"Dear {supervisor.get_full_name() or supervisor.username},\n\n"
-                    f"Your student {student.full_name} ({student.reg_number}) has uploaded a new document:\n"
-                    f"Title: {instance.title}\n\n"
-                    f"Please log in to your dashboard to review it.",
-            from_email=None,
-            recipient_list=[supervisor.email],
-            fail_silently=False,
-        )
+
+@receiver(pre_save, sender=FileRepository)
+@receiver(pre_save, sender=Document)
+def record_upload_size(sender, instance, **kwargs):
+    if instance._state.adding and instance.size is None and instance.file:
+        try:
+            instance.size = instance.file.size
+        except (OSError, ValueError):
+            pass
+
+
+@receiver(post_save, sender=FileRepository)
+@receiver(post_save, sender=Document)
+def count_upload(sender, instance, created, **kwargs):
+    owner = quotas.file_owner(instance)
+    if created and owner is not None:
+        quotas.record(owner, instance.size or 0)
+
+
+@receiver(post_delete, sender=FileRepository)
+@receiver(post_delete, sender=Document)
+def release_upload(sender, instance, **kwargs):
+    owner = quotas.file_owner(instance)
+    if owner is not None:
+        quotas.record(owner, -(instance.size or 0), files=-1)
+
+
+@receiver(m2m_changed, sender=ProjectGroup.members.through)
+def sync_current_group(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and not reverse:
+        # The members are gone by post_clear
+        instance._cleared_member_ids = list(instance.members.values_list('id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        # student.project_groups.add(...) and friends
+        memberships.sync_current_groups([instance.pk])
+    elif action == 'post_clear':
+        memberships.sync_current_groups(getattr(instance, '_cleared_member_ids', []))
+    else:
+        memberships.sync_current_groups(pk_set or [])
+
+
+@receiver(pre_delete, sender=ProjectGroup)
+def remember_group_members(sender, instance, **kwargs):
+    instance._deleted_member_ids = list(instance.members.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=ProjectGroup)
+def regroup_members(sender, instance, **kwargs):
+    # current_group was set to NULL; members of another group fall back to it
+    memberships.sync_current_groups(getattr(instance, '_deleted_member_ids', []))
@@ -0,0 +1,115 @@
+"""
+Hot and cold tiers for FileRepository files.
+
+Hot tier: the repository storage (see object_storage), with new uploads sharded into ``student_projects/ab/cd/``
+directories by a random hash prefix so no single directory grows unbounded.
+
+Cold tier: closed years are packed by the ``archive_repository_year`` command into one
+``repository-<year>.pack`` file per year under REPOSITORY_ARCHIVE_ROOT. Every file is an
+independent xz stream inside the pack, located through an ArchiveEntry (offset, length), so a
+single file can be read back without touching the rest of the pack.
+"""
+import hashlib
+import lzma
+import os
+import posixpath
+import uuid
+
+from django.conf import settings
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+def sharded_upload_to(instance, filename):
+    """
+    ``upload_to`` for FileRepository.file: ``student_projects/<2 hex>/<2 hex>/<filename>``.
+    """
+    digest = hashlib.sha1(uuid.uuid4().bytes).hexdigest()
+    return posixpath.join('student_projects', digest[:2], digest[2:4], filename)
+
+
+def archive_root():
+    return getattr(settings, 'REPOSITORY_ARCHIVE_ROOT', os.path.join(settings.BASE_DIR, 'archive'))
+
+
+def pack_path(year):
+    return os.path.join(archive_root(), f'repository-{year}.pack')
+
+
+def compress_into(source, pack):
+    """
+    Append ``source`` to the open ``pack`` as one xz stream. Returns (offset, compressed length,
+    original size, sha256 of the original).
+    """
+    offset = pack.tell()
+    compressor = lzma.LZMACompressor(format=lzma.FORMAT_XZ, preset=6)
+    checksum = hashlib.sha256()
+    size = 0
+
+    for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+        checksum.update(chunk)
+        size += len(chunk)
+        pack.write(compressor.compress(chunk))
+    pack.write(compressor.flush())
+
+    return offset, pack.tell() - offset, size, checksum.hexdigest()
+
+
+class ArchivedFile:
+    """
+    Read-only file object that decompresses one ArchiveEntry out of its pack on demand.
+    """
+    def __init__(self, entry):
+        self.size = entry.size
+        self._pack = open(entry.archive.path, 'rb')
+        self._pack.seek(entry.offset)
+        self._remaining = entry.length
+        self._decompressor = lzma.LZMADecompressor(format=lzma.FORMAT_XZ)
+        self._buffer = b''
+
+    def read(self, size=-1):
+        while (size < 0 or len(self._buffer) < size) and not self._decompressor.eof:
+            if self._decompressor.needs_input:
+                if self._remaining <= 0:
+                    break
+                compressed = self._pack.read(min(CHUNK_SIZE, self._remaining))
+                if not compressed:
+                    break
+                self._remaining -= len(compressed)
+            else:
+                compressed = b''
+            self._buffer += self._decompressor.decompress(compressed, max_length=CHUNK_SIZE)
+
+        if size < 0:
+            data, self._buffer = self._buffer, b''
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def close(self):
+        self._pack.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __iter__(self):
+        return iter(lambda: self.read(CHUNK_SIZE), b'')
+
+
+def open_repository_file(file_repo, storage=None):
+    """
+    Open a FileRepository file for reading from whichever tier holds it. The hot tier defaults
+    to the field's own storage.
+    """
+    entry = getattr(file_repo, 'archive_entry', None)
+    if entry is not None:
+        return ArchivedFile(entry)
+    return (storage or file_repo.file.storage).open(file_repo.file.name, 'rb')
+
+
+def is_archived(file_repo):
+    return getattr(file_repo, 'archive_entry', None) is not None
@@ -0,0 +1,59 @@
+"""
+Query budget assertions for tests.
+"""
+from contextlib import contextmanager
+from functools import wraps
+
+from django.db import connections, DEFAULT_DB_ALIAS
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class _QueryRecorder:
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def capture_queries(using=DEFAULT_DB_ALIAS):
+    """
+    Record the SQL of every query run in the block, whatever the DEBUG setting.
+    """
+    recorder = _QueryRecorder()
+    with connections[using].execute_wrapper(recorder):
+        yield recorder
+
+
+@contextmanager
+def assert_max_queries(limit, using=DEFAULT_DB_ALIAS):
+    """
+    Fail if the block runs more than ``limit`` queries on the ``using`` database.
+
+        with assert_max_queries(3):
+            client.get('/api/students/')
+    """
+    with capture_queries(using) as recorder:
+        yield recorder
+
+    if len(recorder.queries) > limit:
+        listing = '\n'.join(f'{n}. {sql}' for n, sql in enumerate(recorder.queries, start=1))
+        raise QueryBudgetExceeded(f"{len(recorder.queries)} queries executed, budget is {limit}:\n{listing}")
+
+
+def query_budget(limit, using=DEFAULT_DB_ALIAS):
+    """
+    Decorator form of ``assert_max_queries`` for a whole test method.
+    """
+    def decorator(test_method):
+        @wraps(test_method)
+        def wrapper(*args, **kwargs):
+            with assert_max_queries(limit, using=using):
+                return test_method(*args, **kwargs)
+        return wrapper
+    return decorator
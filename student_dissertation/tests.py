@@ -1,3 +1,1464 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import zipfile
+from datetime import date, datetime, time as datetime_time, timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.models import Prefetch
+from django.test import Client, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+
+from .benchmarks import ENDPOINTS, seed_cohort, endpoint_requests
+from .models import Notification, Student, FileRepository, StorageUsage, ProjectGroup, Consultation, Stage, Milestone, AuditEvent
+from .models import Announcement, ArchivedNotification, ArchiveEntry, RepositoryArchive, audit_month
+from .testing import capture_queries, assert_max_queries, query_budget
+from .versions import encode_delta, apply_delta
+from .allocation import solve
+from .milestones import send_reminders
+from . import audit, exports, listings, metrics, object_storage, scanners, scheduling, side_effects, admin as dissertation_admin
+from .serializers import StudentSerializer, ProjectGroupSerializer, FileRepositorySerializer
+
+
+# Audit events are written by audit.flush() in the tests, not by the background thread
+_audit_settings = override_settings(AUDIT_LOG={'BUFFER_SIZE': 10000, 'BATCH_SIZE': 500, 'FLUSH_INTERVAL': None})
+
+
+def setUpModule():
+    _audit_settings.enable()
+
+
+def tearDownModule():
+    _audit_settings.disable()
+
+
+# Maximum queries per request for every read endpoint, at any number of rows
+QUERY_BUDGETS = {
+    'courses/': 1,
+    'years/': 1,
+    'user-profile/': 2,
+    'student-profile/': 2,
+    'students/': 3,
+    'grouped-students/': 2,
+    'project-groups/': 3,
+    'project-groups/{group_id}/': 3,
+    'my-group/': 4,
+    'students-without-groups/': 2,
+    'supervisors/': 2,
+    'assigned-students/': 2,
+    'assigned-groups/': 3,
+    'assigned-supervisor/': 3,
+    'assigned-group-supervisor/': 2,
+    'supervisor-documents/': 7,
+    'manage-consultation/': 2,
+    'student-consultations/': 2,
+    'announcements/': 3,
+    'student-announcements/': 3,
+    'admin-announcements/': 3,
+    'view-feedback/': 3,
+    'stages/': 2,
+    'milestones/': 3,
+    'student/milestones/': 3,
+    'repository/': 2,
+    'notifications/': 2,
+    'notifications/unread_count/': 2,
+    'async/students/': 3,
+    'async/repository/': 2,
+}
+
+
+class CohortTestCase(TestCase):
+    """
+    Tests against a synthetic cohort seeded once per class with seed_cohort(**cohort); its users
+    are named after the prefix (``<prefix>-admin``, ``<prefix>-sup-0``, ``<prefix>-stu-0``).
+    """
+    cohort = None
+
+    @classmethod
+    def setUpTestData(cls):
+        if cls.cohort is not None:
+            seed_cohort(**{'stages': 1, 'notifications_per_supervisor': 1, **cls.cohort})
+
+    def authenticate(self, user):
+        """
+        Send ``user``'s token with every following request of the test client.
+        """
+        token, _ = Token.objects.get_or_create(user=user)
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Token {token.key}'
+        return token
+
+    def use_temporary_media(self, **overrides):
+        media_root = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(MEDIA_ROOT=media_root, **overrides))
+        return media_root
+
+
+def measure_queries(prefix):
+    counts = {}
+    for path, role, client, url in endpoint_requests(prefix):
+        with capture_queries() as recorder:
+            response = client.get(url)
+            # Streamed lists run their later queries while the body is read
+            if response.streaming:
+                b''.join(response.streaming_content)
+        counts[path] = (response.status_code, len(recorder.queries))
+    return counts
+
+
+# Maximum queries per request for the write endpoints, at any number of rows. Not budgeted:
+# registration, login and password changes (one user each, dominated by password hashing),
+# auto-create-groups and the allocation apply (bulk jobs with their own tests), slot and
+# stage creation and deletes (constant single-row statements), the presigned-upload flow and
+# give-feedback, whose serializer does not accept the supervisor and student it is given.
+WRITE_BUDGETS = {
+    'register-title/': 3,
+    'assign-supervisor/': 6,
+    'assign-group-supervisor/': 6,
+    'book-consultation/': 14,
+    'manage-consultation/{consultation_id}/': 9,
+    'manage-consultation/bulk/': 8,
+    'milestones/{milestone_id}/': 6,
+    'upload/': 16,
+    'repository/{file_id}/': 5,
+    'notifications/mark_all_read/': 2,
+}
+
+
+def write_requests(prefix):
+    """
+    Yield ``(path, method, user, url, data)`` for every budgeted write endpoint, against the
+    representative users and rows of a seeded cohort.
+    """
+    admin = User.objects.get(username=f'{prefix}-admin')
+    group = ProjectGroup.objects.filter(name__startswith=f'{prefix} Group').order_by('id').first()
+    supervisor = group.supervisor
+    student = Student.objects.filter(reg_number__startswith=f'{prefix}-', supervisor__isnull=False).order_by('id').first()
+    consultations = list(Consultation.objects.filter(student__reg_number__startswith=f'{prefix}-').order_by('id'))
+    milestone = Milestone.objects.filter(supervisor=student.supervisor, student=student).first()
+    file = FileRepository.objects.filter(student=student).first()
+    tomorrow = (timezone.now() + timedelta(days=1)).replace(microsecond=0)
+
+    yield 'register-title/', 'post', student.user, 'register-title/', {'project_title': 'Budgets'}
+    yield 'assign-supervisor/', 'post', admin, 'assign-supervisor/', {
+        'reg_number': student.reg_number, 'supervisor_id': supervisor.id, 'force': True,
+    }
+    yield 'assign-group-supervisor/', 'post', admin, 'assign-group-supervisor/', {
+        'group_id': group.id, 'supervisor_id': student.supervisor_id, 'force': True,
+    }
+    yield 'book-consultation/', 'post', student.user, f'book-consultation/?reg_number={student.reg_number}', {
+        'topic': 'Budgets', 'proposed_date': tomorrow.isoformat(),
+    }
+    yield ('manage-consultation/{consultation_id}/', 'patch', consultations[0].supervisor,
+           f'manage-consultation/{consultations[0].id}/', {'status': 'Approved'})
+    yield 'manage-consultation/bulk/', 'post', consultations[-1].supervisor, 'manage-consultation/bulk/', {
+        # One page of ids: past a few hundred SQLite splits the bulk inserts into batches
+        'ids': [consultation.id for consultation in consultations if consultation.supervisor_id == consultations[-1].supervisor_id][:100],
+        'status': 'Rejected',
+    }
+    yield 'milestones/{milestone_id}/', 'put', milestone.supervisor, f'milestones/{milestone.id}/', {
+        'student': student.id, 'status': 'Completed',
+    }
+    yield 'upload/', 'post', student.user, 'upload/', {
+        'file': SimpleUploadedFile('budget.pdf', b'%PDF-1.7' + b'x' * 1000), 'file_type': 'document', 'description': '',
+    }
+    yield 'repository/{file_id}/', 'patch', admin, f'repository/{file.id}/', {'description': 'Budgeted', 'year': file.year}
+    yield 'notifications/mark_all_read/', 'post', supervisor, 'notifications/mark_all_read/', {}
+
+
+def measure_write_queries(prefix):
+    counts = {}
+    with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+        for path, method, user, url, data in write_requests(prefix):
+            client = Client(headers={'Authorization': f'Token {Token.objects.get_or_create(user=user)[0].key}'})
+            send = getattr(client, method)
+            with capture_queries() as recorder:
+                if path == 'upload/':
+                    response = send('/api/' + url, data)
+                else:
+                    response = send('/api/' + url, data, content_type='application/json')
+            counts[path] = (response.status_code, len(recorder.queries))
+    return counts
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Every read endpoint, and the write endpoints of WRITE_BUDGETS, are requested against a
+    cohort with one row per user (N=1) and one with about 500 rows per user (N=500); the query
+    count must stay within budget and must not grow.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_cohort(prefix='small', students=2, supervisors=1, group_size=1, stages=1, notifications_per_supervisor=1)
+        cls.small = measure_queries('small')
+        cls.small_writes = measure_write_queries('small')
+
+        seed_cohort(prefix='large', students=2000, supervisors=2, stages=2, notifications_per_supervisor=500)
+        cls.large = measure_queries('large')
+        cls.large_writes = measure_write_queries('large')
+
+    def test_writes_within_budget_and_constant(self):
+        self.assertEqual(set(self.small_writes), set(WRITE_BUDGETS))
+        for path, (status_code, queries) in self.large_writes.items():
+            with self.subTest(path=path):
+                self.assertIn(status_code, (200, 201))
+                self.assertEqual(self.small_writes[path][0], status_code)
+                self.assertLessEqual(queries, WRITE_BUDGETS[path])
+                self.assertEqual(queries, self.small_writes[path][1])
+
+    def test_every_endpoint_has_a_budget(self):
+        self.assertEqual(set(QUERY_BUDGETS), {path for path, _, _ in ENDPOINTS})
+
+    def test_within_budget_at_one_row(self):
+        for path, (status_code, queries) in self.small.items():
+            with self.subTest(path=path):
+                self.assertEqual(status_code, 200)
+                self.assertLessEqual(queries, QUERY_BUDGETS[path])
+
+    def test_within_budget_at_500_rows(self):
+        for path, (status_code, queries) in self.large.items():
+            with self.subTest(path=path):
+                self.assertEqual(status_code, 200)
+                self.assertLessEqual(queries, QUERY_BUDGETS[path])
+
+    def test_query_count_does_not_grow_with_rows(self):
+        for path, (_, queries) in self.large.items():
+            with self.subTest(path=path):
+                self.assertEqual(queries, self.small[path][1])
+
+
+class NotificationQueryBudgetTests(CohortTestCase):
+    cohort = {'prefix': 'n', 'students': 2, 'supervisors': 1, 'group_size': 1, 'notifications_per_supervisor': 500}
+
+    def setUp(self):
+        self.token = self.authenticate(Notification.objects.first().recipient)
+
+    @query_budget(2)
+    def test_mark_all_read_is_a_single_update(self):
+        response = self.client.post('/api/notifications/mark_all_read/', {}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_mark_listed_as_read(self):
+        Notification.objects.update(is_read=False)
+        ids = list(Notification.objects.filter(recipient=self.token.user).values_list('id', flat=True)[:3])
+        response = self.client.post('/api/notifications/mark_all_read/', {'ids': ids}, content_type='application/json')
+        self.assertEqual(response.json()['updated'], 3)
+        response = self.client.post('/api/notifications/mark_all_read/', {'ids': ['x']}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_archive_moves_old_read_notifications(self):
+        user = self.token.user
+        old = timezone.now() - timedelta(days=120)
+        Notification.objects.filter(recipient=user).update(created_at=old, is_read=False)
+        read = list(Notification.objects.filter(recipient=user).order_by('id').values_list('id', flat=True)[:250])
+        Notification.objects.filter(id__in=read).update(is_read=True)
+        unread = Notification.objects.filter(recipient=user, is_read=False).count()
+
+        call_command('archive_notifications', '--batch-size', '100', stdout=io.StringIO())
+        self.assertFalse(Notification.objects.filter(id__in=read).exists())
+        self.assertEqual(Notification.objects.filter(recipient=user, is_read=False).count(), unread)
+        self.assertEqual(ArchivedNotification.objects.filter(recipient=user, created_at=old).count(), 250)
+
+    def test_unread_count(self):
+        with assert_max_queries(2):
+            response = self.client.get('/api/notifications/unread_count/')
+        self.assertEqual(
+            response.json()['unread_count'],
+            Notification.objects.filter(recipient=self.token.user, is_read=False).count(),
+        )
+
+
+class StudentAnnouncementTests(CohortTestCase):
+    cohort = {'prefix': 'an', 'students': 4, 'supervisors': 3, 'group_size': 2}
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        group_supervisor, own, other = User.objects.filter(username__startswith='an-sup-').order_by('id')
+        group = ProjectGroup.objects.get(name__startswith='an ')
+        group.supervisor = group_supervisor
+        group.save()
+        cls.student = group.members.first()
+        Student.objects.filter(pk=cls.student.pk).update(supervisor=own)
+        admin = User.objects.get(username='an-admin')
+
+        Announcement.objects.all().delete()
+        for title, fields in [
+            ('For students', {'admin': admin, 'target_group': Announcement.STUDENTS}),
+            ('For supervisors', {'admin': admin, 'target_group': Announcement.SUPERVISORS}),
+            ('From my supervisor', {'supervisor': own, 'target_group': Announcement.STUDENTS}),
+            ('From my group supervisor', {'supervisor': group_supervisor, 'target_group': Announcement.STUDENTS}),
+            ('From another supervisor', {'supervisor': other, 'target_group': Announcement.STUDENTS}),
+        ]:
+            Announcement.objects.create(title=title, content='...', **fields)
+
+    def setUp(self):
+        self.authenticate(self.student.user)
+
+    def test_student_sees_their_audience_newest_first(self):
+        response = self.client.get('/api/student-announcements/')
+        self.assertEqual(
+            [announcement['title'] for announcement in response.data],
+            ['From my group supervisor', 'From my supervisor', 'For students'],
+        )
+
+        page = self.client.get('/api/student-announcements/?limit=2&offset=1').data
+        self.assertEqual(page['count'], 3)
+        self.assertEqual([announcement['title'] for announcement in page['results']], ['From my supervisor', 'For students'])
+
+
+class AsyncViewTests(CohortTestCase):
+    cohort = {'prefix': 'as', 'students': 4, 'supervisors': 1, 'group_size': 2}
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.admin = User.objects.get(username='as-admin')
+        cls.group = ProjectGroup.objects.get(name__startswith='as ')
+        cls.member = cls.group.members.first()
+        cls.outsider = Student.objects.filter(project_groups__isnull=True).first()
+        cls.headers = {
+            user.username: {'Authorization': f'Token {Token.objects.create(user=user).key}'}
+            for user in (cls.admin, cls.member.user, cls.outsider.user)
+        }
+
+    def setUp(self):
+        self.use_temporary_media()
+
+    async def test_token_authentication(self):
+        self.assertEqual((await self.async_client.get('/api/async/repository/')).status_code, 401)
+        response = await self.async_client.get('/api/async/repository/', headers={'Authorization': 'Token not-a-key'})
+        self.assertEqual(response.status_code, 401)
+        response = await self.async_client.get('/api/async/repository/', headers=self.headers['as-admin'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), await FileRepository.objects.acount())
+
+    async def test_student_list_is_for_admins(self):
+        response = await self.async_client.get('/api/async/students/', headers=self.headers['as-admin'])
+        self.assertEqual([row['reg_number'] for row in response.json()], [
+            reg_number async for reg_number in Student.objects.order_by('id').values_list('reg_number', flat=True)
+        ])
+        response = await self.async_client.get('/api/async/students/', headers=self.headers[self.outsider.user.username])
+        self.assertEqual(response.status_code, 403)
+
+    async def upload(self, student, **data):
+        return await self.async_client.post('/api/async/upload/', {
+            'file': SimpleUploadedFile('chapter.pdf', b'%PDF-1.7' + b'x' * 1000), 'file_type': 'document', 'description': '', **data,
+        }, headers=self.headers[student.user.username])
+
+    async def test_upload(self):
+        response = await self.upload(self.outsider)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.json()['student'], response.json()['name']), (self.outsider.id, 'chapter.pdf'))
+        self.assertTrue(await FileRepository.objects.filter(pk=response.json()['id'], student=self.outsider).aexists())
+
+        response = await self.upload(self.member, group_id=self.group.id)
+        self.assertEqual((response.status_code, response.json()['group']), (201, self.group.id))
+
+    async def test_upload_to_another_group_is_refused(self):
+        response = await self.upload(self.outsider, group_id=self.group.id)
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(await FileRepository.objects.filter(group=self.group, name='chapter.pdf').aexists())
+
+
+class RequestMetricsTests(CohortTestCase):
+    cohort = {'prefix': 'm', 'students': 4, 'supervisors': 1, 'group_size': 2}
+    SAMPLE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{([a-zA-Z_]+="(\\.|[^"\\])*",?)*\})? [-+]?(\d+(\.\d*)?|\+Inf)$')
+
+    def setUp(self):
+        metrics.registry.reset()
+        self.authenticate(User.objects.get(username='m-admin'))
+
+    def test_server_timing_and_registry(self):
+        with capture_queries() as recorder:
+            response = self.client.get('/api/courses/')
+        self.assertIn(f'desc="{len(recorder.queries)} queries"', response['Server-Timing'])
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", render;dur=[\d.]+, app;dur=[\d.]+, total;dur=[\d.]+$')
+
+        exposition = metrics.registry.render_prometheus().splitlines()
+        self.assertIn('api_request_duration_seconds_count{endpoint="course-list"} 1', exposition)
+        self.assertIn(f'api_request_queries_total{{endpoint="course-list"}} {len(recorder.queries)}', exposition)
+        self.assertIn(f'api_response_bytes_total{{endpoint="course-list"}} {len(response.content)}', exposition)
+
+    async def test_asgi_requests_count_queries(self):
+        headers = {'Authorization': self.client.defaults['HTTP_AUTHORIZATION']}
+        # A sync view run through sync_to_async and an async view using the async ORM
+        for url, endpoint in (('/api/courses/', 'course-list'), ('/api/async/repository/', 'async-admin-repository')):
+            with self.subTest(url=url):
+                response = await self.async_client.get(url, headers=headers)
+                self.assertEqual(response.status_code, 200)
+                queries = int(re.search(r'desc="(\d+) queries"', response['Server-Timing']).group(1))
+                self.assertGreater(queries, 0)
+                exposition = metrics.registry.render_prometheus().splitlines()
+                self.assertIn(f'api_request_queries_total{{endpoint="{endpoint}"}} {queries}', exposition)
+
+    def test_slow_query_log(self):
+        with override_settings(SLOW_QUERY_THRESHOLD_MS=0), self.assertLogs('student_dissertation.slow_queries', 'WARNING') as logs:
+            client = Client(headers={'Authorization': self.client.defaults['HTTP_AUTHORIZATION']})
+            client.get('/api/courses/')
+        self.assertTrue(any('course' in line for line in logs.output))
+
+        with self.assertNoLogs('student_dissertation.slow_queries'):
+            self.client.get('/api/courses/')
+
+    def test_prometheus_text_for_admins_only(self):
+        self.client.get('/api/courses/')
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        lines = response.content.decode().splitlines()
+        for line in lines:
+            if not line.startswith('#'):
+                self.assertRegex(line, self.SAMPLE)
+        self.assertIn('api_request_duration_seconds_bucket{endpoint="course-list",le="+Inf"} 1', lines)
+        self.assertIn('# TYPE api_request_queries_total counter', lines)
+
+        self.authenticate(User.objects.get(username='m-sup-0'))
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+
+
+class ExportTests(CohortTestCase):
+    cohort = {'prefix': 'e', 'students': 4, 'supervisors': 1, 'group_size': 2}
+
+    def setUp(self):
+        self.authenticate(User.objects.get(username='e-admin'))
+
+    def export(self, kind, **params):
+        response = self.client.get(f'/api/export/{kind}/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+
+    def test_every_kind_as_csv(self):
+        for kind, (headers, build_queryset) in exports.EXPORTS.items():
+            with self.subTest(kind=kind):
+                rows = self.export(kind)
+                self.assertEqual(rows[0], headers)
+                expected = [['' if value is None else str(value) for value in row] for row in build_queryset({})]
+                self.assertTrue(expected)
+                self.assertEqual(rows[1:], expected)
+                self.assertEqual(len(expected), build_queryset({}).model.objects.count())
+
+        student = Student.objects.filter(supervisor__isnull=False).select_related('supervisor').first()
+        row = next(row for row in self.export('students') if row[0] == student.reg_number)
+        self.assertEqual((row[1], row[6]), (student.full_name, student.supervisor.username))
+
+    def test_files_filtered_by_year(self):
+        FileRepository.objects.filter(pk=FileRepository.objects.order_by('id').first().pk).update(year='2020')
+        rows = self.export('files', year='2020')
+        self.assertEqual([row[-1] for row in rows[1:]], ['2020'])
+
+    def test_xlsx(self):
+        from openpyxl import load_workbook
+
+        response = self.client.get('/api/export/groups/', {'output': 'xlsx'})
+        self.assertEqual(response.status_code, 200)
+        sheet = load_workbook(io.BytesIO(b''.join(response.streaming_content)), read_only=True)['groups']
+        rows = list(sheet.values)
+        self.assertEqual(list(rows[0]), exports.EXPORTS['groups'][0])
+        self.assertEqual(len(rows) - 1, ProjectGroup.objects.count())
+
+    def test_refused(self):
+        self.assertEqual(self.client.get('/api/export/nope/').status_code, 404)
+        self.assertEqual(self.client.get('/api/export/students/', {'output': 'pdf'}).status_code, 400)
+
+        self.authenticate(User.objects.get(username='e-sup-0'))
+        self.assertEqual(self.client.get('/api/export/students/').status_code, 403)
+
+
+class RepositoryArchiveTests(CohortTestCase):
+    cohort = {'prefix': 'z', 'students': 3, 'supervisors': 1, 'group_size': 2}
+
+    def setUp(self):
+        self.authenticate(User.objects.get(username='z-admin'))
+        media_root = self.use_temporary_media()
+        self.files = list(FileRepository.objects.order_by('id'))
+        # The first file is missing from storage, the ones after it must still be archived
+        self.missing = self.files.pop(0)
+        for file_repo in self.files:
+            path = os.path.join(media_root, file_repo.file.name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as destination:
+                destination.write(f'file {file_repo.id}'.encode())
+
+    def test_zip_members_and_manifest(self):
+        response = self.client.get('/api/repository/archive/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertIsNone(archive.testzip())
+
+        manifest = list(csv.DictReader(io.StringIO(archive.read('manifest.csv').decode())))
+        self.assertEqual([int(row['id']) for row in manifest], [file_repo.id for file_repo in [self.missing] + self.files])
+        rows = {int(row['id']): row for row in manifest}
+        self.assertEqual(set(archive.namelist()), {rows[file_repo.id]['path'] for file_repo in self.files} | {'manifest.csv'})
+        for file_repo in self.files:
+            row = rows[file_repo.id]
+            self.assertEqual(archive.read(row['path']), f'file {file_repo.id}'.encode())
+            self.assertEqual((row['status'], row['size']), ('ok', str(len(f'file {file_repo.id}'))))
+
+        self.assertEqual((rows[self.missing.id]['status'], rows[self.missing.id]['size']), ('missing', '0'))
+        self.assertNotIn(rows[self.missing.id]['path'], archive.namelist())
+
+    def test_admin_only(self):
+        self.authenticate(User.objects.get(username='z-sup-0'))
+        self.assertEqual(self.client.get('/api/repository/archive/').status_code, 403)
+
+
+class StorageTierTests(CohortTestCase):
+    cohort = {'prefix': 't', 'students': 3, 'supervisors': 1, 'group_size': 2}
+
+    def setUp(self):
+        self.archive_root = self.enterContext(tempfile.TemporaryDirectory())
+        self.media_root = self.use_temporary_media(REPOSITORY_ARCHIVE_ROOT=self.archive_root)
+        FileRepository.objects.update(year='2020')
+        self.contents = {}
+        for file_repo in FileRepository.objects.order_by('id'):
+            self.contents[file_repo.id] = os.urandom(512) + f'file {file_repo.id}'.encode() * 100
+            path = os.path.join(self.media_root, file_repo.file.name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as destination:
+                destination.write(self.contents[file_repo.id])
+
+    def test_archive_year_then_download(self):
+        call_command('archive_repository_year', '2020', stdout=io.StringIO())
+        self.assertEqual(ArchiveEntry.objects.filter(archive__year='2020').count(), len(self.contents))
+        for file_repo in FileRepository.objects.all():
+            self.assertFalse(os.path.exists(os.path.join(self.media_root, file_repo.file.name)))
+
+        self.authenticate(User.objects.get(username='t-admin'))
+        for pk, content in self.contents.items():
+            response = self.client.get(f'/api/repository/{pk}/download/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(b''.join(response.streaming_content), content)
+
+    def test_nothing_to_archive(self):
+        out = io.StringIO()
+        call_command('archive_repository_year', '2019', stdout=out)
+        self.assertIn('Nothing', out.getvalue())
+        self.assertFalse(RepositoryArchive.objects.filter(year='2019').exists())
+        self.assertFalse(os.path.exists(os.path.join(self.archive_root, 'repository-2019.pack')))
+
+    def test_shard_flat_files(self):
+        missing = FileRepository.objects.order_by('id').first()
+        os.remove(os.path.join(self.media_root, missing.file.name))
+
+        call_command('shard_repository_files', stdout=io.StringIO(), stderr=io.StringIO())
+        for file_repo in FileRepository.objects.exclude(pk=missing.pk):
+            old_name = f"student_projects/{os.path.basename(file_repo.file.name)}"
+            self.assertRegex(file_repo.file.name, r'^student_projects/[0-9a-f]{2}/[0-9a-f]{2}/[^/]+$')
+            self.assertFalse(os.path.exists(os.path.join(self.media_root, old_name)))
+            with file_repo.file.open('rb') as source:
+                self.assertEqual(source.read(), self.contents[file_repo.id])
+        self.assertEqual(FileRepository.objects.get(pk=missing.pk).file.name, missing.file.name)
+
+
+class DirectUploadTests(CohortTestCase):
+    """
+    Presigned upload against the local object-storage stand-in: the bytes go to the signed
+    URL and the API only records metadata.
+    """
+    cohort = {'prefix': 'u', 'students': 1, 'supervisors': 1, 'group_size': 1}
+
+    def setUp(self):
+        self.student_user = Student.objects.filter(supervisor__isnull=False).first().user
+        self.authenticate(self.student_user)
+        self.use_temporary_media()
+
+    def test_presign_put_confirm_download(self):
+        upload = self.client.post(
+            '/api/uploads/presign/', {'filename': 'thesis.pdf', 'content_type': 'application/pdf'}, content_type='application/json',
+        ).json()
+        self.client.generic('PUT', upload['upload_url'], b'%PDF-1.4', content_type='application/pdf')
+
+        response = self.client.post(
+            '/api/uploads/confirm/', {'upload_token': upload['upload_token'], 'file_type': 'document'}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 201)
+        file_repo = FileRepository.objects.get(pk=response.json()['id'])
+        self.assertEqual(file_repo.file.name, upload['key'])
+
+        download = self.client.get(f'/api/repository/{file_repo.pk}/download/')
+        self.assertEqual(b''.join(download.streaming_content), b'%PDF-1.4')
+
+    def test_presign_size(self):
+        for size, status_code in (('big', 400), (-1, 400), ([], 400), (10 ** 12, 400), ('1024', 201)):
+            with self.subTest(size=size):
+                response = self.client.post(
+                    '/api/uploads/presign/', {'filename': 'thesis.pdf', 'size': size}, content_type='application/json',
+                )
+                self.assertEqual(response.status_code, status_code)
+
+    def test_confirm_requires_the_object(self):
+        upload = self.client.post('/api/uploads/presign/', {'filename': 'thesis.pdf'}, content_type='application/json').json()
+        response = self.client.post('/api/uploads/confirm/', {'upload_token': upload['upload_token']}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(FileRepository.objects.filter(file=upload['key']).exists())
+
+    def test_upload_token_is_single_use(self):
+        upload = self.client.post('/api/uploads/presign/', {'filename': 'thesis.pdf'}, content_type='application/json').json()
+        self.client.generic('PUT', upload['upload_url'], b'%PDF-1.4', content_type='application/pdf')
+        confirm = {'upload_token': upload['upload_token'], 'file_type': 'document'}
+
+        self.assertEqual(self.client.post('/api/uploads/confirm/', confirm, content_type='application/json').status_code, 201)
+        usage = StorageUsage.objects.get(student__user=self.student_user)
+        for _ in range(2):
+            self.assertEqual(self.client.post('/api/uploads/confirm/', confirm, content_type='application/json').status_code, 409)
+        self.assertEqual(FileRepository.objects.filter(file=upload['key']).count(), 1)
+        self.assertEqual(StorageUsage.objects.get(pk=usage.pk).files, usage.files)
+        # The confirmed object is left in place
+        self.assertEqual(object_storage.get_object_storage().size(upload['key']), len(b'%PDF-1.4'))
+
+
+class S3ObjectStorageTests(CohortTestCase):
+    """
+    S3ObjectStorage against a stubbed boto3 client (boto3 is only installed where S3 is used).
+    """
+    cohort = {'prefix': 's3', 'students': 1, 'supervisors': 1, 'group_size': 1}
+
+    def setUp(self):
+        self.client_error = type('ClientError', (Exception,), {})
+        boto3, botocore = mock.Mock(), mock.Mock()
+        botocore.exceptions.ClientError = self.client_error
+        self.enterContext(mock.patch.dict(sys.modules, {'boto3': boto3, 'botocore': botocore, 'botocore.exceptions': botocore.exceptions}))
+        self.s3 = boto3.client.return_value
+        self.s3.generate_presigned_url.side_effect = lambda operation, Params, ExpiresIn: f"https://s3.test/{operation}/{Params['Key']}"
+        self.options = {'bucket': 'theses', 'endpoint_url': 'http://minio:9000', 'access_key': 'a', 'secret_key': 's', 'region': 'eu'}
+        self.store = object_storage.S3ObjectStorage(**self.options)
+        boto3.client.assert_called_once_with(
+            's3', endpoint_url='http://minio:9000', aws_access_key_id='a', aws_secret_access_key='s', region_name='eu',
+        )
+
+    def test_presigned_urls(self):
+        self.assertEqual(self.store.presigned_put_url('k/thesis.pdf', 'application/pdf'), 'https://s3.test/put_object/k/thesis.pdf')
+        self.s3.generate_presigned_url.assert_called_with(
+            'put_object', Params={'Bucket': 'theses', 'Key': 'k/thesis.pdf', 'ContentType': 'application/pdf'},
+            ExpiresIn=object_storage.DEFAULT_EXPIRY,
+        )
+        self.store.presigned_get_url('k/thesis.pdf', expires=60, filename='thesis.pdf')
+        self.s3.generate_presigned_url.assert_called_with('get_object', Params={
+            'Bucket': 'theses', 'Key': 'k/thesis.pdf', 'ResponseContentDisposition': 'attachment; filename="thesis.pdf"',
+        }, ExpiresIn=60)
+
+    def test_size_and_delete(self):
+        self.s3.head_object.return_value = {'ContentLength': 12}
+        self.assertEqual(self.store.size('k/thesis.pdf'), 12)
+        self.s3.head_object.assert_called_with(Bucket='theses', Key='k/thesis.pdf')
+        self.s3.head_object.side_effect = self.client_error('404')
+        self.assertIsNone(self.store.size('k/missing.pdf'))
+
+        self.store.delete('k/thesis.pdf')
+        self.s3.delete_object.assert_called_once_with(Bucket='theses', Key='k/thesis.pdf')
+
+    def test_presigned_flow_redirects_downloads(self):
+        self.authenticate(Student.objects.first().user)
+        media_root = self.use_temporary_media(OBJECT_STORAGE={
+            'BACKEND': 'student_dissertation.object_storage.S3ObjectStorage', 'OPTIONS': self.options,
+        })
+        upload = self.client.post('/api/uploads/presign/', {'filename': 'thesis.pdf'}, content_type='application/json').json()
+        self.assertEqual(upload['upload_url'], f"https://s3.test/put_object/{upload['key']}")
+
+        # What the client's PUT to the bucket leaves behind, seen through the repository storage
+        os.makedirs(os.path.dirname(os.path.join(media_root, upload['key'])))
+        with open(os.path.join(media_root, upload['key']), 'wb') as stored:
+            stored.write(b'%PDF-1.4')
+        self.s3.head_object.return_value = {'ContentLength': 8}
+        response = self.client.post(
+            '/api/uploads/confirm/', {'upload_token': upload['upload_token'], 'file_type': 'document'}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 201)
+
+        download = self.client.get(f"/api/repository/{response.json()['id']}/download/")
+        self.assertEqual(download.status_code, 302)
+        self.assertEqual(download['Location'], f"https://s3.test/get_object/{upload['key']}")
+
+
+class VersionHistoryTests(CohortTestCase):
+    cohort = {'prefix': 'v', 'students': 1, 'supervisors': 1, 'group_size': 1}
+
+    def setUp(self):
+        self.authenticate(Student.objects.first().user)
+        self.use_temporary_media()
+
+    def test_delta_round_trip(self):
+        rng = random.Random(0)
+        base = rng.randbytes(200_000)
+        target = base[:5000] + rng.randbytes(300) + base[5000:150_000]
+        delta = encode_delta(target, base)
+        self.assertLess(len(delta), 5000)
+        self.assertEqual(apply_delta(base, delta), target)
+
+    def test_reupload_creates_next_version_stored_as_delta(self):
+        rng = random.Random(1)
+        contents = [b'%PDF-1.7\n' + rng.randbytes(100_000)]
+        contents.append(contents[0][:40_000] + b'revised' + contents[0][40_000:])
+        for content in contents:
+            response = self.client.post('/api/upload/', {
+                'file': SimpleUploadedFile('chapter_one.pdf', content), 'file_type': 'document', 'description': '',
+            })
+        self.assertEqual(response.json()['version'], 2)
+
+        versions = self.client.get(f"/api/repository/{response.json()['id']}/versions/").json()
+        self.assertEqual([(v['version'], v['stored_as']) for v in versions], [(2, 'full'), (1, 'delta')])
+        for version, content in enumerate(contents, start=1):
+            download = self.client.get(f"/api/repository/{response.json()['id']}/versions/{version}/")
+            self.assertEqual(b''.join(download.streaming_content), content)
+
+
+class UploadValidationTests(CohortTestCase):
+    cohort = {'prefix': 'uv', 'students': 1, 'supervisors': 1, 'group_size': 1}
+
+    def setUp(self):
+        self.authenticate(Student.objects.first().user)
+        self.use_temporary_media(REPOSITORY_UPLOAD_RULES={
+            'document': {'max_size': 64 * 1024, 'kinds': {'pdf', 'text'}},
+            'source_code': {'max_size': 64 * 1024, 'kinds': {'zip', 'text'}},
+        })
+
+    def upload(self, content, file_type):
+        return self.client.post('/api/upload/', {
+            'file': SimpleUploadedFile('upload.bin', content), 'file_type': file_type, 'description': '',
+        })
+
+    def test_rejects_disallowed_content_by_magic_bytes(self):
+        response = self.upload(b'MZ' + bytes(10_000), 'document')
+        self.assertEqual(response.status_code, 415)
+        response = self.upload(b'%PDF-1.7' + bytes(100), 'source_code')
+        self.assertEqual(response.status_code, 415)
+        self.assertFalse(FileRepository.objects.filter(name='upload.bin').exists())
+
+    def test_rejects_oversized_upload(self):
+        response = self.upload(b'%PDF-1.7' + b'x' * 100_000, 'document')
+        self.assertEqual(response.status_code, 413)
+
+    def test_accepts_allowed_upload(self):
+        response = self.upload(b'%PDF-1.7' + b'x' * 1000, 'document')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['scan_status'], 'unscanned')
+
+
+class UploadScanTests(CohortTestCase):
+    cohort = {'prefix': 'sc', 'students': 1, 'supervisors': 1, 'group_size': 1}
+
+    def setUp(self):
+        self.student = Student.objects.first()
+        self.authenticate(self.student.user)
+        self.quarantine_root = self.enterContext(tempfile.TemporaryDirectory())
+        self.use_temporary_media(
+            UPLOAD_SCANNER={'BACKEND': 'student_dissertation.scanners.SignatureScanner', 'OPTIONS': {'signatures': {'Test': 'NOPE'}}},
+            UPLOAD_QUARANTINE_ROOT=self.quarantine_root,
+        )
+        # Run the background scans inline, as the worker pool would once the upload commits
+        self.enterContext(mock.patch.object(scanners._executor, 'submit', lambda fn, *args: fn(*args)))
+
+    def upload(self, content, name='upload.pdf'):
+        response = self.client.post('/api/upload/', {
+            'file': SimpleUploadedFile(name, b'%PDF-1.7\n' + content), 'file_type': 'document', 'description': '',
+        })
+        self.assertEqual(response.status_code, 201)
+        return FileRepository.objects.get(pk=response.json()['id'])
+
+    def test_signature_scanner(self):
+        scanner = scanners.SignatureScanner({'Custom': 'NOPE'})
+        self.assertIsNone(scanner.scan(io.BytesIO(b'x' * 100_000)))
+        self.assertEqual(scanner.scan(io.BytesIO(b'x' * 50 + scanners.EICAR)), 'Eicar-Test-Signature')
+        self.assertEqual(scanner.scan(io.BytesIO(b'NOPE')), 'Custom')
+        # A signature split across two reads is still found
+        split = b'x' * (scanners.CHUNK_SIZE - 10) + scanners.EICAR + b'x' * 100
+        self.assertEqual(scanner.scan(io.BytesIO(split)), 'Eicar-Test-Signature')
+
+    def test_pending_until_scanned_then_clean(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            file_repo = self.upload(b'notes')
+        self.assertEqual(file_repo.scan_status, 'pending')
+        self.assertEqual(self.client.get(f'/api/repository/{file_repo.pk}/download/').status_code, 409)
+
+        with mock.patch.object(scanners.connection, 'close') as close:
+            for callback in callbacks:
+                callback()
+        close.assert_called_once_with()
+        file_repo.refresh_from_db()
+        self.assertEqual(file_repo.scan_status, 'clean')
+        download = self.client.get(f'/api/repository/{file_repo.pk}/download/')
+        self.assertEqual(b''.join(download.streaming_content), b'%PDF-1.7\nnotes')
+
+    def test_infected_upload_is_quarantined(self):
+        with self.assertLogs('student_dissertation.scanners', 'WARNING'), self.captureOnCommitCallbacks(execute=True):
+            file_repo = self.upload(scanners.EICAR)
+        file_repo.refresh_from_db()
+        self.assertEqual((file_repo.scan_status, file_repo.scan_result), ('quarantined', 'Eicar-Test-Signature'))
+        self.assertFalse(file_repo.file.storage.exists(file_repo.file.name))
+        with open(scanners.quarantine_path(file_repo), 'rb') as quarantined:
+            self.assertEqual(quarantined.read(), b'%PDF-1.7\n' + scanners.EICAR)
+        self.assertEqual(self.client.get(f'/api/repository/{file_repo.pk}/download/').status_code, 403)
+
+    def test_command_scans_every_pending_file(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            clean = [self.upload(b'notes', name=f'notes-{i}.pdf') for i in range(3)]
+            infected = self.upload(b'NOPE', name='infected.pdf')
+
+        # The command's cursor stays open across scans, so they must not close its connection
+        out = io.StringIO()
+        with mock.patch.object(scanners.connection, 'close') as close, self.assertLogs('student_dissertation.scanners', 'WARNING'):
+            call_command('scan_repository_files', stdout=out)
+        close.assert_not_called()
+        self.assertEqual(
+            dict(FileRepository.objects.filter(pk__in=[file_repo.pk for file_repo in clean + [infected]]).values_list('name', 'scan_status')),
+            {'notes-0.pdf': 'clean', 'notes-1.pdf': 'clean', 'notes-2.pdf': 'clean', 'infected.pdf': 'quarantined'},
+        )
+        self.assertIn('3 clean, 1 quarantined, 0 still pending.', out.getvalue())
+
+    def test_command_needs_a_scanner(self):
+        with override_settings(UPLOAD_SCANNER=None), self.assertRaises(CommandError):
+            call_command('scan_repository_files')
+
+
+class StorageQuotaTests(CohortTestCase):
+    cohort = {'prefix': 'q', 'students': 1, 'supervisors': 1, 'group_size': 1}
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.student = Student.objects.filter(project_groups__isnull=True).first() or Student.objects.first()
+
+    def setUp(self):
+        self.authenticate(self.student.user)
+        self.use_temporary_media(STUDENT_STORAGE_QUOTA=100_000, GROUP_STORAGE_QUOTA=100_000)
+
+    def upload(self, size, name='notes.txt'):
+        return self.client.post('/api/upload/', {
+            'file': SimpleUploadedFile(name, b'x' * size), 'file_type': 'document', 'description': '',
+        })
+
+    def test_counters_follow_creates_and_deletes(self):
+        self.assertEqual(self.upload(40_000).status_code, 201)
+        self.assertEqual(self.upload(30_000, name='draft.txt').status_code, 201)
+        usage = StorageUsage.objects.get(student=self.student)
+        self.assertEqual((usage.bytes, usage.files), (70_000, 2))
+
+        FileRepository.objects.filter(student=self.student, name='draft.txt').delete()
+        usage.refresh_from_db()
+        self.assertEqual((usage.bytes, usage.files), (40_000, 1))
+
+    def test_rejects_upload_over_quota(self):
+        self.assertEqual(self.upload(80_000).status_code, 201)
+        self.assertEqual(self.upload(30_000).status_code, 413)
+        self.assertEqual(StorageUsage.objects.get(student=self.student).bytes, 80_000)
+
+    def test_usage_report_limit(self):
+        self.assertEqual(self.upload(40_000).status_code, 201)
+        self.authenticate(User.objects.get(username='q-admin'))
+        for limit, status_code, rows in (('big', 400, None), ('-5', 200, 1), ('0', 200, 1), ('1000', 200, 1)):
+            with self.subTest(limit=limit):
+                response = self.client.get('/api/storage-usage/', {'limit': limit})
+                self.assertEqual(response.status_code, status_code)
+                if rows is not None:
+                    self.assertEqual(len(response.json()), rows)
+
+
+class OrphanedMediaTests(TestCase):
+
+    def setUp(self):
+        self.media_root = self.enterContext(tempfile.TemporaryDirectory())
+        self.quarantine_root = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(MEDIA_ROOT=self.media_root, UPLOAD_QUARANTINE_ROOT=self.quarantine_root))
+
+    def write(self, name, age_hours):
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as out:
+            out.write(b'orphan')
+        mtime = time.time() - age_hours * 3600
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_quarantines_only_old_unreferenced_files(self):
+        kept = FileRepository.objects.create(
+            file=ContentFile(b'kept', name='kept.txt'), name='kept.txt', description='', file_type='document',
+        )
+        os.utime(kept.file.path, (0, 0))
+        orphan = self.write('student_projects/ab/cd/orphan.txt', age_hours=48)
+        in_flight = self.write('documents/0123456789ab/draft.pdf', age_hours=1)
+
+        call_command('collect_orphaned_media', '--dry-run', stdout=io.StringIO())
+        self.assertTrue(os.path.exists(orphan))
+
+        call_command('collect_orphaned_media', stdout=io.StringIO())
+        self.assertFalse(os.path.exists(orphan))
+        self.assertTrue(os.path.exists(os.path.join(self.quarantine_root, 'orphans', 'student_projects/ab/cd/orphan.txt')))
+        self.assertTrue(os.path.exists(kept.file.path))
+        self.assertTrue(os.path.exists(in_flight))
+
+
+class SupervisorAllocationTests(CohortTestCase):
+    cohort = {'prefix': 'a', 'students': 24, 'supervisors': 3, 'group_size': 4}
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Student.objects.update(supervisor=None)
+        ProjectGroup.objects.update(supervisor=None)
+
+    def setUp(self):
+        self.authenticate(User.objects.get(username='a-admin'))
+
+    def test_solver_places_the_cheapest_units_within_capacity(self):
+        cost = np.array([[3.0, 4.0], [0.0, 0.0], [4.0, np.inf]])
+        # One free slot: it goes to the unit that fits it best
+        self.assertEqual(solve(cost, [3, 3], [3, 2], balance=3.0).tolist(), [-1, 1, -1])
+        # Equal preferences are spread evenly
+        self.assertEqual(np.bincount(solve(np.zeros((6, 3)), [5, 5, 5], [0, 0, 0])).tolist(), [2, 2, 2])
+
+    def test_preview_then_apply(self):
+        supervisor = User.objects.filter(groups__name='Supervisor').order_by('id').first()
+        student = Student.objects.filter(project_groups__isnull=True).order_by('id').first()
+        body = {
+            'capacities': {str(supervisor.id): 4},
+            'scores': [{'student': student.reg_number, 'supervisor_id': supervisor.id, 'score': 5}],
+        }
+
+        preview = self.client.post('/api/supervisor-allocation/preview/', body, content_type='application/json')
+        self.assertEqual(preview.status_code, 200)
+        self.assertFalse(Student.objects.filter(supervisor__isnull=False).exists())
+        # 12 individual students and 3 groups over capacities 4, 10 and 10
+        self.assertEqual(sorted(row['after'] for row in preview.data['loads']), [4, 5, 6])
+        chosen = next(row for row in preview.data['students'] if row['reg_number'] == student.reg_number)
+        self.assertEqual(chosen['supervisor_id'], supervisor.id)
+
+        applied = self.client.post('/api/supervisor-allocation/apply/', body, content_type='application/json')
+        self.assertEqual(applied.data['applied'], {'students': 12, 'groups': 3})
+        self.assertEqual(Notification.objects.filter(message__startswith='You have been assigned').count(), 12)
+        self.assertEqual(self.client.post('/api/supervisor-allocation/apply/', body, content_type='application/json').data['applied'],
+                         {'students': 0, 'groups': 0})
+
+
+class ConsultationSchedulingTests(CohortTestCase):
+    cohort = {'prefix': 'c', 'students': 3, 'supervisors': 1, 'group_ratio': 0}
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.supervisor = User.objects.get(groups__name='Supervisor', username__startswith='c-')
+        cls.students = list(Student.objects.filter(supervisor=cls.supervisor).order_by('id'))
+        cls.morning = (timezone.now() + timedelta(days=7)).replace(hour=9, minute=0, second=0, microsecond=0)
+
+    def book(self, student, **data):
+        self.authenticate(self.students[0].user)
+        return self.client.post(f'/api/book-consultation/?reg_number={student.reg_number}', {'topic': 'Draft', **data})
+
+    def test_slots_cannot_overlap_or_be_double_booked(self):
+        self.authenticate(self.supervisor)
+        created = self.client.post('/api/consultation-slots/', {
+            'start': self.morning.isoformat(), 'end': (self.morning + timedelta(hours=2)).isoformat(), 'length': 30,
+        }, content_type='application/json')
+        self.assertEqual(created.status_code, 201)
+        self.assertEqual(len(created.data), 4)
+        overlapping = self.client.post('/api/consultation-slots/', {
+            'start': (self.morning + timedelta(minutes=75)).isoformat(), 'end': (self.morning + timedelta(hours=3)).isoformat(),
+        }, content_type='application/json')
+        self.assertEqual(overlapping.status_code, 409)
+
+        first_slot = created.data[0]['id']
+        self.assertEqual(self.book(self.students[0], slot=first_slot).status_code, 201)
+        taken = self.book(self.students[1], slot=first_slot)
+        self.assertEqual(taken.status_code, 409)
+        self.assertEqual([slot['id'] for slot in taken.data['suggestions']], [slot['id'] for slot in created.data[1:]])
+        # Outside the published availability
+        self.assertEqual(self.book(self.students[1], proposed_date=(self.morning - timedelta(hours=1)).isoformat()).status_code, 409)
+        self.assertEqual(self.book(self.students[1], proposed_date=created.data[2]['start']).status_code, 201)
+
+        free = self.client.get(f'/api/consultation-slots/free/?reg_number={self.students[2].reg_number}&count=5')
+        self.assertEqual(len(free.data), 2)
+
+    def test_invalid_slot_and_count(self):
+        self.assertEqual(self.book(self.students[0], slot='abc').status_code, 400)
+        self.assertEqual(self.book(self.students[0], slot=10 ** 6).status_code, 404)
+
+        self.authenticate(self.supervisor)
+        self.client.post('/api/consultation-slots/', {
+            'start': self.morning.isoformat(), 'end': (self.morning + timedelta(hours=1)).isoformat(), 'length': 30,
+        }, content_type='application/json')
+        url = f'/api/consultation-slots/free/?reg_number={self.students[0].reg_number}'
+        self.assertEqual(len(self.client.get(url + '&count=-1').data), 1)
+        self.assertEqual(self.client.get(url + '&count=many').status_code, 400)
+
+    def test_bulk_status_and_filters(self):
+        for offset, student in enumerate(self.students):
+            self.assertEqual(self.book(student, proposed_date=(self.morning + timedelta(hours=offset)).isoformat()).status_code, 201)
+        # Free-form bookings still may not collide
+        self.assertEqual(self.book(self.students[1], proposed_date=(self.morning + timedelta(minutes=10)).isoformat()).status_code, 409)
+
+        ids = list(Consultation.objects.filter(topic='Draft').order_by('id').values_list('id', flat=True))
+        self.authenticate(self.supervisor)
+        # Token, select, one UPDATE, one INSERT for the notifications and savepoints
+        with assert_max_queries(8):
+            approved = self.client.post('/api/manage-consultation/bulk/', {'ids': ids[:2]}, content_type='application/json')
+        self.assertEqual(approved.data, {'updated': 2})
+        rejected = self.client.post('/api/manage-consultation/bulk/', {'ids': ids, 'status': 'Rejected'}, content_type='application/json')
+        self.assertEqual(rejected.data, {'updated': 3})
+        self.assertEqual(Notification.objects.filter(recipient=self.students[0].user).count(), 2)
+
+        listed = self.client.get(f'/api/manage-consultation/?status=Rejected'
+                                 f'&from={self.morning.isoformat()}&to={(self.morning + timedelta(hours=2)).isoformat()}'.replace('+', '%2B'))
+        self.assertEqual(len(listed.data), 2)
+
+    def test_manage_is_limited_to_the_supervisor(self):
+        self.assertEqual(self.book(self.students[0], proposed_date=self.morning.isoformat()).status_code, 201)
+        consultation = Consultation.objects.get(topic='Draft')
+
+        # The student may not approve their own request
+        self.authenticate(self.students[0].user)
+        self.assertEqual(self.client.patch(
+            f'/api/manage-consultation/{consultation.id}/', {'status': 'Approved'}, content_type='application/json',
+        ).status_code, 404)
+        self.assertEqual(self.client.get('/api/manage-consultation/').data, [])
+        self.assertEqual(Consultation.objects.get(pk=consultation.pk).status, 'Pending')
+
+        self.authenticate(self.supervisor)
+        listed = self.client.get('/api/manage-consultation/?status=Pending')
+        self.assertEqual(
+            sorted(row['id'] for row in listed.data),
+            list(Consultation.objects.filter(supervisor=self.supervisor, status='Pending').order_by('id').values_list('id', flat=True)),
+        )
+        self.assertIn(consultation.id, [row['id'] for row in listed.data])
+        self.assertEqual(self.client.patch(
+            f'/api/manage-consultation/{consultation.id}/', {'status': 'Approved'}, content_type='application/json',
+        ).status_code, 200)
+        self.assertEqual(Consultation.objects.get(pk=consultation.pk).status, 'Approved')
+
+
+class StageRolloutTests(CohortTestCase):
+    cohort = {'prefix': 'r', 'students': 40, 'supervisors': 3, 'group_size': 4}
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.stage = Stage.objects.create(name='Literature review')
+        cls.supervisor = User.objects.filter(groups__name='Supervisor').order_by('id').first()
+
+    def rollout(self, **data):
+        return self.client.post(f'/api/stages/{self.stage.id}/milestones/', data, content_type='application/json')
+
+    def test_supervisor_then_whole_cohort(self):
+        self.authenticate(self.supervisor)
+        own = self.rollout(completion_date='2026-12-01')
+        expected = (
+            Student.objects.filter(supervisor=self.supervisor, project_groups__isnull=True).count()
+            + ProjectGroup.objects.filter(supervisor=self.supervisor).count()
+        )
+        self.assertEqual(own.data, {'created': expected, 'skipped': 0})
+
+        # 20 individual students and 5 groups; the query count does not grow with them
+        self.authenticate(User.objects.get(username='r-admin'))
+        with assert_max_queries(8):
+            everyone = self.rollout(milestone='Submit the literature review')
+        self.assertEqual(everyone.data, {'created': 25 - expected, 'skipped': expected})
+        self.assertEqual(Milestone.objects.filter(stage=self.stage).count(), 25)
+        self.assertFalse(Milestone.objects.filter(stage=self.stage, group__isnull=False, student__isnull=False).exists())
+
+    def test_students_cannot_roll_out(self):
+        student = Student.objects.first()
+        self.authenticate(student.user)
+        self.assertEqual(self.rollout().status_code, 403)
+
+
+class MilestoneReminderTests(CohortTestCase):
+    cohort = {'prefix': 'd', 'students': 2, 'supervisors': 1, 'group_ratio': 0}
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.today = date(2026, 3, 2)
+        cls.supervisor = User.objects.get(groups__name='Supervisor', username__startswith='d-')
+        stage = Stage.objects.first()
+        cls.students = list(Student.objects.filter(supervisor=cls.supervisor).order_by('id'))
+        Milestone.objects.all().delete()
+        for student, days in zip(cls.students, (-5, 2)):
+            Milestone.objects.create(student=student, supervisor=cls.supervisor, stage=stage, milestone='Draft',
+                                     completion_date=cls.today + timedelta(days=days))
+        Milestone.objects.create(student=cls.students[0], supervisor=cls.supervisor, stage=stage, milestone='Done',
+                                 status='Completed', completion_date=cls.today - timedelta(days=5))
+
+    def test_coalesced_and_not_repeated(self):
+        Notification.objects.all().delete()
+        # Two milestones: one notification for the supervisor and one per student
+        self.assertEqual(send_reminders(today=self.today), (2, 3))
+        message = Notification.objects.get(recipient=self.supervisor).message
+        self.assertTrue(message.startswith('Milestone reminder: 1 overdue, 1 due within 3 days.'))
+
+        self.assertEqual(send_reminders(today=self.today), (0, 0))
+        self.assertEqual(send_reminders(today=self.today + timedelta(days=3)), (1, 2))
+        # The first overdue reminder was a week earlier
+        self.assertEqual(send_reminders(today=self.today + timedelta(days=7)), (1, 2))
+
+
+class CurrentGroupTests(CohortTestCase):
+    cohort = {'prefix': 'g', 'students': 4, 'supervisors': 1, 'group_ratio': 0}
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.students = list(Student.objects.order_by('id'))
+        course, year = cls.students[0].course, cls.students[0].year_of_study
+        cls.first = ProjectGroup.objects.create(name='First', course=course, year=year)
+        cls.second = ProjectGroup.objects.create(name='Second', course=course, year=year)
+
+    def current(self, student):
+        return Student.objects.values_list('current_group_id', flat=True).get(pk=student.pk)
+
+    def test_follows_membership_changes(self):
+        a, b, c, _ = self.students
+        self.first.members.set([a, b])
+        self.assertEqual((self.current(a), self.current(b), self.current(c)), (self.first.id, self.first.id, None))
+
+        c.project_groups.add(self.second)
+        self.second.members.add(a)
+        self.assertEqual((self.current(a), self.current(c)), (self.first.id, self.second.id))
+
+        self.first.members.remove(b)
+        self.assertIsNone(self.current(b))
+        self.first.members.clear()
+        self.assertEqual(self.current(a), self.second.id)
+
+        self.second.delete()
+        self.assertEqual((self.current(a), self.current(c)), (None, None))
+
+
+class ListingTests(CohortTestCase):
+    """
+    The serializer-free lists must produce exactly the bytes of the serializers they replace,
+    with orjson or the json module and whether or not they are streamed.
+    """
+
+    cohort = {'prefix': 'l', 'students': 8, 'supervisors': 2, 'courses': 1, 'group_size': 2}
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Student.objects.filter(pk=Student.objects.order_by('id').first().pk).update(full_name='Zoë \u2028 "Ñ"\n')
+
+    def setUp(self):
+        self.authenticate(User.objects.get(username='l-admin'))
+
+    def expected(self, response, serializer, queryset):
+        return JSONRenderer().render(serializer(queryset, many=True, context={'request': response.wsgi_request}).data)
+
+    def body(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        return response, b''.join(response.streaming_content) if response.streaming else response.content
+
+    def check_lists(self):
+        members = Prefetch('members', queryset=Student.objects.order_by('id'))
+        cases = [
+            ('/api/students/', StudentSerializer, Student.objects.order_by('id')),
+            ('/api/project-groups/', ProjectGroupSerializer, ProjectGroup.objects.order_by('id').prefetch_related(members)),
+            ('/api/repository/', FileRepositorySerializer, FileRepository.objects.order_by('id')),
+        ]
+        for url, serializer, queryset in cases:
+            with self.subTest(url=url):
+                response, body = self.body(url)
+                self.assertEqual(body, self.expected(response, serializer, queryset))
+
+    def test_matches_serializers(self):
+        self.check_lists()
+
+    def test_matches_serializers_without_orjson(self):
+        with mock.patch.object(listings, 'orjson', None):
+            self.check_lists()
+
+    def test_streams_long_lists(self):
+        with mock.patch.object(listings, 'CHUNK_SIZE', 3):
+            response, _ = self.body('/api/students/')
+            self.assertTrue(response.streaming)
+            self.check_lists()
+
+    def test_grouped_students(self):
+        _, body = self.body('/api/grouped-students/')
+        buckets = json.loads(body)
+        keys = [(bucket['course'], bucket['year']) for bucket in buckets]
+        self.assertEqual(keys, sorted(keys))
+        grouped = dict(zip(keys, buckets))
+        students = Student.objects.filter(course__isnull=False, year_of_study__isnull=False)
+        self.assertEqual(sum(bucket['count'] for bucket in buckets), students.count())
+        for student in students.select_related('course', 'year_of_study'):
+            self.assertIn(
+                {'reg_number': student.reg_number, 'full_name': student.full_name},
+                grouped[(student.course.name, student.year_of_study.year)]['students'],
+            )
+
+    def test_grouped_students_filtered_and_paginated(self):
+        student = Student.objects.filter(reg_number__startswith='l-').order_by('id').first()
+        in_bucket = Student.objects.filter(course=student.course, year_of_study=student.year_of_study).order_by('id')
+        url = f'/api/grouped-students/?course={student.course_id}&year={student.year_of_study_id}'
+
+        with assert_max_queries(2):
+            _, body = self.body(url + '&limit=2&offset=1')
+        [bucket] = json.loads(body)
+        self.assertEqual(bucket['count'], in_bucket.count())
+        self.assertEqual(
+            [row['reg_number'] for row in bucket['students']],
+            list(in_bucket.values_list('reg_number', flat=True)[1:3]),
+        )
+
+        _, whole = self.body('/api/grouped-students/')
+        with mock.patch.object(listings, 'CHUNK_SIZE', 1):
+            response, body = self.body('/api/grouped-students/')
+        self.assertTrue(response.streaming)
+        self.assertEqual(body, whole)
+
+        response = self.client.get('/api/grouped-students/?limit=0')
+        self.assertEqual(response.status_code, 400)
+
+
+class AdminTests(TestCase):
+    CHANGELISTS = ['student', 'projectgroup', 'milestone', 'document', 'notification', 'consultation', 'filerepository']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = User.objects.create_superuser('root', 'root@example.com', 'pw')
+
+    def setUp(self):
+        self.client.force_login(self.superuser, backend='django.contrib.auth.backends.ModelBackend')
+
+    def changelist_queries(self):
+        counts = {}
+        for model in self.CHANGELISTS:
+            with capture_queries() as recorder:
+                response = self.client.get(f'/admin/student_dissertation/{model}/')
+            self.assertEqual(response.status_code, 200, model)
+            counts[model] = len(recorder.queries)
+        return counts
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        seed_cohort(prefix='a1', students=4, supervisors=1, group_size=2, stages=1, notifications_per_supervisor=2)
+        small = self.changelist_queries()
+        seed_cohort(prefix='a2', students=60, supervisors=3, group_size=2, stages=2, notifications_per_supervisor=40)
+        self.assertEqual(self.changelist_queries(), small)
+
+    def test_estimated_count_for_unfiltered_changelist(self):
+        seed_cohort(prefix='e', students=4, supervisors=1, group_size=2, stages=1, notifications_per_supervisor=30)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        with mock.patch.object(dissertation_admin, 'ESTIMATE_THRESHOLD', 10), capture_queries() as recorder:
+            response = self.client.get('/admin/student_dissertation/notification/')
+        self.assertEqual(response.context['cl'].result_count, Notification.objects.count())
+        self.assertFalse(any('COUNT(*)' in sql for sql in recorder.queries))
+
+    def test_bulk_actions_are_single_updates(self):
+        seed_cohort(prefix='b', students=6, supervisors=2, group_size=2, stages=1, notifications_per_supervisor=5)
+        url = '/admin/student_dissertation/{}/'
+
+        notifications = list(Notification.objects.values_list('id', flat=True))
+        self.client.post(url.format('notification'), {'action': 'mark_read', '_selected_action': notifications})
+        self.assertFalse(Notification.objects.filter(id__in=notifications, is_read=False).exists())
+
+        milestones = list(Milestone.objects.values_list('id', flat=True))
+        with capture_queries() as recorder:
+            self.client.post(url.format('milestone'), {'action': 'mark_completed', '_selected_action': milestones})
+        self.assertEqual(Milestone.objects.filter(status='Completed').count(), len(milestones))
+        self.assertEqual(sum(sql.startswith('UPDATE') for sql in recorder.queries), 1)
+
+        supervisor = User.objects.get(username='b-sup-1')
+        students = list(Student.objects.filter(reg_number__startswith='b-').exclude(supervisor=supervisor).values_list('id', flat=True))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url.format('student'), {
+                'action': 'assign_supervisor', '_selected_action': students, 'supervisor': supervisor.id,
+            })
+        self.assertEqual(Student.objects.filter(id__in=students, supervisor=supervisor).count(), len(students))
+        self.assertEqual(Notification.objects.filter(recipient=supervisor, message__contains='new student').count(), len(students))
+
+    def test_current_group_is_read_only(self):
+        seed_cohort(prefix='cg', students=2, supervisors=1, group_ratio=0, stages=1, notifications_per_supervisor=1)
+        student = Student.objects.filter(reg_number__startswith='cg-').first()
+        ProjectGroup.objects.create(name='Read only', course=student.course, year=student.year_of_study).members.add(student)
+        student.refresh_from_db()
+        response = self.client.get(f'/admin/student_dissertation/student/{student.pk}/change/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('current_group', response.context['adminform'].form.fields)
+        self.assertContains(response, str(student.current_group))
+
+
+class AuditLogTests(CohortTestCase):
+    cohort = {'prefix': 'au', 'students': 4, 'supervisors': 2, 'group_size': 2}
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.admin = User.objects.get(username='au-admin')
+
+    def setUp(self):
+        self.authenticate(self.admin)
+        audit.flush()
+
+    def test_events_are_written_by_the_flush_not_the_request(self):
+        group = ProjectGroup.objects.filter(name__startswith='au').first()
+        supervisor = User.objects.get(username='au-sup-1')
+        previous = group.supervisor_id
+        with self.captureOnCommitCallbacks(execute=True), capture_queries() as recorder:
+            response = self.client.post('/api/assign-group-supervisor/', {
+                'group_id': group.id, 'supervisor_id': supervisor.id, 'force': True,
+            }, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any('audit' in sql.lower() for sql in recorder.queries))
+        self.assertFalse(AuditEvent.objects.exists())
+
+        self.assertEqual(audit.flush(), 1)
+        event = AuditEvent.objects.get()
+        self.assertEqual((event.actor, event.action, event.target_type, event.target_id), (self.admin, 'supervisor.assigned', 'group', group.id))
+        self.assertEqual(event.changes, {'supervisor': [previous, supervisor.id]})
+
+    def test_captures_consultation_decisions_and_repository_edits(self):
+        student = Student.objects.filter(reg_number__startswith='au-', supervisor__isnull=False).first()
+        consultation = Consultation.objects.create(
+            student=student, supervisor=student.supervisor, topic='Plan', proposed_date=timezone.now() + timedelta(days=1),
+        )
+        file = FileRepository.objects.filter(student__reg_number__startswith='au-').first()
+        with self.captureOnCommitCallbacks(execute=True):
+            scheduling.set_status(Consultation.objects.filter(pk=consultation.pk), 'Approved')
+            self.client.patch(f'/api/repository/{file.pk}/', {'description': 'Final', 'year': file.year}, content_type='application/json')
+        audit.flush()
+
+        decision = AuditEvent.objects.get(action='consultation.status')
+        self.assertEqual((decision.target_id, decision.changes), (consultation.id, {'status': ['Pending', 'Approved']}))
+        edit = AuditEvent.objects.get(action='repository.updated')
+        self.assertEqual((edit.actor, edit.target_id), (self.admin, file.id))
+        self.assertEqual(edit.changes, {'description': [file.description, 'Final']})
+
+    def test_rolled_back_changes_are_not_audited(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    audit.record('supervisor.assigned', 'student', 1, supervisor=[None, 1])
+                    raise ValueError
+            except ValueError:
+                pass
+        self.assertEqual(audit.flush(), 0)
+
+    @override_settings(AUDIT_LOG={'BUFFER_SIZE': 2, 'BATCH_SIZE': 500, 'FLUSH_INTERVAL': None})
+    def test_full_buffer_drops_the_oldest_events(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            audit.record_many('consultation.status', 'consultation', {pk: {} for pk in (1, 2, 3)})
+        self.assertEqual(audit.flush(), 2)
+        self.assertEqual(sorted(AuditEvent.objects.values_list('target_id', flat=True)), [2, 3])
+
+    def test_append_only(self):
+        AuditEvent.objects.create(month=202601, created_at=timezone.now(), action='x', target_type='student')
+        with self.assertRaises(TypeError):
+            AuditEvent.objects.update(action='y')
+        with self.assertRaises(TypeError):
+            AuditEvent.objects.all().delete()
+
+    def test_query_by_period_target_and_page(self):
+        now = timezone.now()
+        AuditEvent.objects.bulk_create([
+            AuditEvent(
+                month=audit_month(now - timedelta(days=days)), created_at=now - timedelta(days=days), actor=self.admin,
+                action='supervisor.assigned', target_type='student', target_id=days % 2,
+            )
+            for days in range(0, 90, 3)
+        ])
+
+        def within(**filters):
+            events = AuditEvent.objects.filter(created_at__gte=now - timedelta(days=60), **filters)
+            return list(events.order_by('-id').values_list('id', flat=True))
+
+        start = (now - timedelta(days=60)).isoformat()
+        response = self.client.get('/api/audit-log/', {'from': start, 'target_type': 'student', 'target_id': 1, 'limit': 4})
+        self.assertEqual([event['id'] for event in response.data['results']], within(target_id=1)[:4])
+        self.assertEqual(response.data['results'][0]['actor_name'], 'au-admin')
+
+        response = self.client.get('/api/audit-log/', {'from': start, 'before': response.data['next_before'], 'target_id': 1})
+        self.assertEqual([event['id'] for event in response.data['results']], within(target_id=1)[4:])
+        self.assertIsNone(response.data['next_before'])
+
+        self.assertEqual(self.client.get('/api/audit-log/', {'from': 'yesterday'}).status_code, 400)
+
+    def test_date_only_to_includes_the_day(self):
+        day = timezone.localdate() - timedelta(days=3)
+        events = AuditEvent.objects.bulk_create([
+            AuditEvent(
+                month=audit_month(moment), created_at=moment, actor=self.admin, action='x', target_type='student', target_id=1,
+            )
+            for moment in (
+                timezone.make_aware(datetime.combine(day, datetime_time(0, 0))),
+                timezone.make_aware(datetime.combine(day, datetime_time(23, 59))),
+                timezone.make_aware(datetime.combine(day + timedelta(days=1), datetime_time(0, 0))),
+            )
+        ])
+        response = self.client.get('/api/audit-log/', {'from': day.isoformat(), 'to': day.isoformat(), 'action': 'x'})
+        self.assertEqual([event['id'] for event in response.data['results']], [events[1].id, events[0].id])
+
+
+class SideEffectTests(CohortTestCase):
+    cohort = {'prefix': 'se', 'students': 6, 'supervisors': 2, 'group_size': 2}
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.supervisor = User.objects.get(username='se-sup-1')
+
+    def setUp(self):
+        mail.outbox = []
+        audit.flush()
+
+    def test_unrelated_save_does_not_reread_the_student(self):
+        student = Student.objects.filter(reg_number__startswith='se-').first()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks, capture_queries() as recorder:
+            student.project_title = 'A new title'
+            student.save()
+        self.assertEqual(len(recorder.queries), 1)
+        self.assertTrue(recorder.queries[0].startswith('UPDATE'))
+        self.assertEqual(callbacks, [])
+
+    def test_assignments_in_one_transaction_are_batched(self):
+        students = list(Student.objects.filter(reg_number__startswith='se-').exclude(supervisor=self.supervisor).order_by('id'))
+        with capture_queries() as recorder, self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                for student in students:
+                    student.supervisor = self.supervisor
+                    student.save()
+                    student.save()
+        side_effects.drain()
+
+        inserts = [sql for sql in recorder.queries if sql.startswith('INSERT') and 'notification' in sql]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(Notification.objects.filter(recipient=self.supervisor, message__contains='new student').count(), len(students))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertTrue(all(student.reg_number in mail.outbox[0].body for student in students))
+        self.assertEqual(audit.flush(), len(students))
+
+    def test_rolled_back_savepoint_drops_its_side_effects(self):
+        kept, dropped = Student.objects.filter(reg_number__startswith='se-').exclude(supervisor=self.supervisor)[:2]
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                kept.supervisor = self.supervisor
+                kept.save()
+                try:
+                    with transaction.atomic():
+                        dropped.supervisor = self.supervisor
+                        dropped.save()
+                        raise ValueError
+                except ValueError:
+                    pass
+        side_effects.drain()
+        messages = Notification.objects.filter(recipient=self.supervisor, message__contains='new student').values_list('message', flat=True)
+        self.assertEqual([kept.reg_number in message for message in messages], [True])
+        self.assertNotIn(dropped.reg_number, mail.outbox[0].body)
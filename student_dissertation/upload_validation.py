@@ -0,0 +1,184 @@
+"""
+Streaming validation of repository uploads.
+
+ValidatingUploadHandler runs in front of Django's own upload handlers: it refuses a request
+whose Content-Length is already over quota without reading the body, sniffs the file type
+from the magic bytes of the first chunk and stops the upload as soon as the type is not
+allowed or the running size passes the quota. Rejected uploads therefore never reach the
+repository storage and are not read to the end.
+
+Quotas and allowed types are per FileRepository.file_type (REPOSITORY_UPLOAD_RULES setting).
+The form's ``file_type`` field is only known once parsing is done, so while streaming the
+handler uses the ``file_type`` query parameter or ``X-File-Type`` header when the client sends
+one, and otherwise the most generous rule that accepts the sniffed type; the exact rule is
+checked again once the form is parsed.
+"""
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.http import QueryDict
+from django.utils.datastructures import MultiValueDict
+
+
+MB = 1024 * 1024
+SNIFF_SIZE = 4096
+# Room for multipart boundaries and the small form fields next to the file
+MULTIPART_OVERHEAD = 64 * 1024
+
+DEFAULT_UPLOAD_RULES = {
+    # zip covers docx/odt, ole covers legacy .doc
+    'document': {'max_size': 50 * MB, 'kinds': {'pdf', 'zip', 'ole', 'rtf', 'text'}},
+    'source_code': {'max_size': 200 * MB, 'kinds': {'zip', 'gzip', 'bzip2', 'xz', '7z', 'rar', 'tar', 'text'}},
+}
+
+# (kind, offset, magic bytes), checked in order
+SIGNATURES = [
+    ('pdf', 0, b'%PDF-'),
+    ('zip', 0, b'PK\x03\x04'),
+    ('zip', 0, b'PK\x05\x06'),
+    ('ole', 0, b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'),
+    ('rtf', 0, b'{\\rtf'),
+    ('gzip', 0, b'\x1f\x8b'),
+    ('bzip2', 0, b'BZh'),
+    ('xz', 0, b'\xfd7zXZ\x00'),
+    ('7z', 0, b"7z\xbc\xaf'\x1c"),
+    ('rar', 0, b'Rar!\x1a\x07'),
+    ('tar', 257, b'ustar'),
+    ('executable', 0, b'MZ'),
+    ('executable', 0, b'\x7fELF'),
+    ('executable', 0, b'\xcf\xfa\xed\xfe'),
+]
+
+
+class UploadRejected(Exception):
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def upload_rules():
+    return getattr(settings, 'REPOSITORY_UPLOAD_RULES', DEFAULT_UPLOAD_RULES)
+
+
+def sniff(head):
+    """
+    Classify a file from its first bytes; 'text' for NUL-free UTF-8, None if unrecognised.
+    """
+    for kind, offset, magic in SIGNATURES:
+        if head[offset:offset + len(magic)] == magic:
+            return kind
+    if b'\x00' not in head:
+        try:
+            head.decode('utf-8')
+        except UnicodeDecodeError as e:
+            # A multi-byte character cut off at the end of the sample is still text
+            if e.start < len(head) - 3:
+                return None
+        return 'text'
+    return None
+
+
+def max_size_for(file_type=None, kind=None):
+    rules = upload_rules()
+    if file_type in rules:
+        return rules[file_type]['max_size']
+    sizes = [rule['max_size'] for rule in rules.values() if kind is None or kind in rule['kinds']]
+    return max(sizes, default=0)
+
+
+def check_upload(file_type, kind, size):
+    """
+    Raise UploadRejected unless a file of this sniffed kind and size is allowed; a None
+    ``file_type`` accepts anything some rule allows.
+    """
+    rules = upload_rules()
+    if file_type is not None and file_type not in rules:
+        raise UploadRejected(f"file_type must be one of {', '.join(rules)}.")
+
+    candidates = [rules[file_type]] if file_type is not None else list(rules.values())
+    if not any(kind in rule['kinds'] for rule in candidates):
+        raise UploadRejected(f"File content ({kind or 'unknown binary'}) is not allowed for this upload.", 415)
+
+    limit = max_size_for(file_type, kind)
+    if size > limit:
+        raise UploadRejected(f"File exceeds the {limit // MB} MB limit for this upload.", 413)
+
+
+class ValidatingUploadHandler(FileUploadHandler):
+    """
+    Pass-through upload handler that rejects bad uploads while they stream in. After parsing,
+    ``error`` holds the UploadRejected that stopped the upload, if any, and ``kind`` the
+    sniffed type of the last file.
+    """
+
+    def __init__(self, request=None, file_type=None):
+        super().__init__(request)
+        self.file_type = file_type
+        # Bytes the uploader may still store (see quotas.upload_allowance); None for no quota
+        self.quota = None
+        self.error = None
+        self.kind = None
+
+    def _reject(self, error):
+        self.error = error
+        # Stop reading the body; nothing more of the file is written anywhere
+        raise StopUpload(connection_reset=True)
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        limit = max_size_for(self.file_type)
+        if content_length > limit + MULTIPART_OVERHEAD:
+            self.error = UploadRejected(f"Upload exceeds the {limit // MB} MB limit.", 413)
+            # Report the body as parsed (and empty) so it is never read
+            return QueryDict(encoding=encoding), MultiValueDict()
+        if self.quota is not None and content_length - MULTIPART_OVERHEAD > self.quota:
+            self.error = UploadRejected("Storage quota exceeded.", 413)
+            return QueryDict(encoding=encoding), MultiValueDict()
+        return None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.kind = None
+        self._head = b''
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.kind is None and len(self._head) < SNIFF_SIZE:
+            self._head += raw_data[:SNIFF_SIZE - len(self._head)]
+            if len(self._head) >= SNIFF_SIZE:
+                self._check_kind()
+
+        received = start + len(raw_data)
+        limit = max_size_for(self.file_type, self.kind)
+        if received > limit:
+            self._reject(UploadRejected(f"File exceeds the {limit // MB} MB limit.", 413))
+        if self.quota is not None and received > self.quota:
+            self._reject(UploadRejected("Storage quota exceeded.", 413))
+        return raw_data
+
+    def _check_kind(self):
+        self.kind = sniff(self._head)
+        try:
+            check_upload(self.file_type, self.kind, 0)
+        except UploadRejected as error:
+            self._reject(error)
+
+    def file_complete(self, file_size):
+        # Files shorter than the sniff window are classified here; the parser may already be
+        # past the point where StopUpload is handled, so only record the rejection
+        if self.kind is None:
+            self.kind = sniff(self._head)
+            try:
+                check_upload(self.file_type, self.kind, 0)
+            except UploadRejected as error:
+                self.error = error
+        return None
+
+
+def install_upload_validation(request):
+    """
+    Put a ValidatingUploadHandler in front of the request's upload handlers; must run before
+    the body is parsed.
+    """
+    file_type = request.GET.get('file_type') or request.headers.get('X-File-Type')
+    handler = ValidatingUploadHandler(request, file_type)
+    request.upload_handlers.insert(0, handler)
+    return handler
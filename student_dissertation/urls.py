@@ -2,7 +2,11 @@ from django.urls import path, include
 from rest_framework.authtoken.views import obtain_auth_token
 from .views import GroupedStudentView, AutoCreateGroupsView, ProjectGroupListView, ProjectGroupDeleteView, ProjectGroupDetailView, MyGroupView, CourseListView, YearListView, RegisterView, LoginView, AdminLoginView, StudentListView, RegisterProjectTitleView, RegisterGroupProjectTitleView, StudentsWithoutGroupsView, AssignSupervisorView, AssignGroupSupervisorView, SupervisorListView, AssignedStudentsView, AssignedGroupsView, AssignedSupervisorView, AssignedGroupSupervisorView, UploadStudentDocumentView, UploadGroupDocumentView, SupervisorDocumentListView, BookConsultationView, ManageConsultationView, StudentConsultationView, AnnouncementView, StudentAnnouncementView, AdminAnnouncementView, GiveFeedbackView, ViewFeedbackView, ChangePasswordView, CreateSupervisorView, UserProfileView, StudentProfileView, ProgressTrackingView, CreateStageView, StudentMilestoneView, FileUploadView, AdminRepositoryView
 from rest_framework.routers import DefaultRouter
-from .views import NotificationViewSet
+from .views import NotificationViewSet, MetricsView, ExportView, RepositoryArchiveView, RepositoryFileDownloadView
+from .views import PresignedUploadView, ConfirmUploadView, LocalObjectStorageView, RepositoryVersionListView, RepositoryVersionDownloadView
+from .views import StorageUsageReportView, SupervisorAllocationView, AuditLogView
+from .views import AvailabilitySlotView, FreeSlotView, BulkConsultationStatusView, StageRolloutView
+from . import async_views
 
 
 router = DefaultRouter()
@@ -32,6 +36,8 @@ urlpatterns = [
     path('students-without-groups/', StudentsWithoutGroupsView.as_view(), name='students-without-groups'),
     path('assign-supervisor/', AssignSupervisorView.as_view(), name='assign-supervisor'),
     path('assign-group-supervisor/', AssignGroupSupervisorView.as_view(), name='assign-group-supervisor'),
+    path('supervisor-allocation/preview/', SupervisorAllocationView.as_view(), name='supervisor-allocation-preview'),
+    path('supervisor-allocation/apply/', SupervisorAllocationView.as_view(apply=True), name='supervisor-allocation-apply'),
     path('supervisors/', SupervisorListView.as_view(), name='supervisor-list'),
     path('assigned-students/', AssignedStudentsView.as_view(), name='assigned-students'),
     path('assigned-groups/', AssignedGroupsView.as_view(), name='assigned-students'),
@@ -43,7 +49,11 @@ urlpatterns = [
     path('book-consultation/', BookConsultationView.as_view(), name='book-consultation'),
     path('manage-consultation/', ManageConsultationView.as_view(), name='manage-consultation'),
     path('manage-consultation/<int:pk>/', ManageConsultationView.as_view(), name='manage-consultation'),
+    path('manage-consultation/bulk/', BulkConsultationStatusView.as_view(), name='bulk-consultation-status'),
     path('student-consultations/', StudentConsultationView.as_view(), name='student-consultations'),
+    path('consultation-slots/', AvailabilitySlotView.as_view(), name='consultation-slots'),
+    path('consultation-slots/<int:pk>/', AvailabilitySlotView.as_view(), name='consultation-slot'),
+    path('consultation-slots/free/', FreeSlotView.as_view(), name='free-consultation-slots'),
     path('announcements/', AnnouncementView.as_view(), name='announcements'),
     path('student-announcements/', StudentAnnouncementView.as_view(), name='student-announcements'),
     path('admin-announcements/', AdminAnnouncementView.as_view(), name='admin-announcements'),
@@ -51,6 +61,7 @@ urlpatterns = [
     path('view-feedback/', ViewFeedbackView.as_view(), name='view-feedback'),
     path('stages/', CreateStageView.as_view(), name='create-stage'),
     path('stages/<int:stage_id>/', CreateStageView.as_view(), name='delete-stage'),
+    path('stages/<int:stage_id>/milestones/', StageRolloutView.as_view(), name='stage-rollout'),
     path('milestones/', ProgressTrackingView.as_view(), name='milestone-list'),
     path('milestones/student/<int:reg_number>/', ProgressTrackingView.as_view(), name='milestone-by-student'),
     path('milestones/<int:milestone_id>/', ProgressTrackingView.as_view(), name='milestone-update'),
@@ -58,4 +69,20 @@ urlpatterns = [
     path('upload/', FileUploadView.as_view(), name='student-file-upload'),
     path('repository/', AdminRepositoryView.as_view(), name='admin-repository'),
     path('repository/<int:pk>/', AdminRepositoryView.as_view()),
+    path('repository/<int:pk>/download/', RepositoryFileDownloadView.as_view(), name='repository-download'),
+    path('repository/<int:pk>/versions/', RepositoryVersionListView.as_view(), name='repository-versions'),
+    path('repository/<int:pk>/versions/<int:version>/', RepositoryVersionDownloadView.as_view(), name='repository-version-download'),
+    path('repository/archive/', RepositoryArchiveView.as_view(), name='repository-archive'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+    path('export/<str:kind>/', ExportView.as_view(), name='export'),
+    path('storage-usage/', StorageUsageReportView.as_view(), name='storage-usage'),
+    path('audit-log/', AuditLogView.as_view(), name='audit-log'),
+    path('uploads/presign/', PresignedUploadView.as_view(), name='upload-presign'),
+    path('uploads/confirm/', ConfirmUploadView.as_view(), name='upload-confirm'),
+    path('object-storage/<str:token>/', LocalObjectStorageView.as_view(), name='object-storage'),
+
+    # Async variants, effective when served through ASGI (see dissertation_project/asgi.py)
+    path('async/students/', async_views.student_list, name='async-student-list'),
+    path('async/repository/', async_views.repository_list, name='async-admin-repository'),
+    path('async/upload/', async_views.file_upload, name='async-student-file-upload'),
 ]
@@ -0,0 +1,233 @@
+"""
+Version chains for FileRepository files.
+
+Every upload of the same logical file (``name``) by the same student or group becomes the next
+version of that chain. Storage uses reverse deltas: the newest version is always stored in full,
+and when a new version arrives the previous one is rewritten as a delta against it, so
+reading the latest version never pays for reconstruction. A full snapshot is kept every
+FULL_SNAPSHOT_EVERY versions to bound the chain walked when an old version is fetched.
+
+Deltas are computed over content-defined chunks (cut at newlines for text, at a marker byte
+for binaries), so an insertion early in a file only changes the chunks around it and the
+rest is encoded as copies out of the newer version.
+"""
+import hashlib
+import io
+import logging
+import lzma
+import posixpath
+import struct
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+
+from . import scanners
+from .models import FileRepository
+from .storage_tiers import open_repository_file, is_archived
+
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'FRDELTA1'
+FULL_SNAPSHOT_EVERY = 8
+# Files larger than this are always stored in full (both versions are held in memory to diff)
+DELTA_MAX_SIZE = 64 * 1024 * 1024
+# A delta is only kept when it saves at least this fraction of the full size
+MIN_SAVING = 0.1
+
+_COPY = struct.Struct('>BQQ')
+_INSERT = struct.Struct('>BQ')
+_HEADER = struct.Struct('>8sQ32s')
+
+
+def _is_text(data):
+    return b'\x00' not in data[:8192]
+
+
+def _chunks(data, text):
+    if text:
+        marker, min_size, max_size = b'\n', 32, 16 * 1024
+    else:
+        marker, min_size, max_size = b'\x00', 256, 8 * 1024
+
+    start, length = 0, len(data)
+    while start < length:
+        cut = data.find(marker, start + min_size - 1)
+        if cut != -1 and cut + 1 - start <= max_size:
+            end = cut + 1
+        else:
+            end = min(start + max_size, length)
+        yield start, end
+        start = end
+
+
+def _digest(chunk):
+    return hashlib.blake2b(chunk, digest_size=16).digest()
+
+
+def encode_delta(target, base):
+    """
+    Encode ``target`` as copies from ``base`` plus inserted bytes, xz-compressed.
+    """
+    text = _is_text(target) and _is_text(base)
+    index = {}
+    for start, end in _chunks(base, text):
+        index.setdefault(_digest(base[start:end]), (start, end - start))
+
+    ops = []
+    for start, end in _chunks(target, text):
+        match = index.get(_digest(target[start:end]))
+        last = ops[-1] if ops else None
+        if match:
+            offset, length = match
+            if last and last[0] == 'copy' and last[1] + last[2] == offset:
+                last[2] += length
+            else:
+                ops.append(['copy', offset, length])
+        elif last and last[0] == 'insert':
+            last[2] = end
+        else:
+            ops.append(['insert', start, end])
+
+    body = [_HEADER.pack(MAGIC, len(target), hashlib.sha256(target).digest())]
+    for op, a, b in ops:
+        if op == 'copy':
+            body.append(_COPY.pack(0, a, b))
+        else:
+            body.append(_INSERT.pack(1, b - a))
+            body.append(target[a:b])
+    return lzma.compress(b''.join(body), preset=6)
+
+
+def apply_delta(base, delta):
+    body = lzma.decompress(delta)
+    magic, size, checksum = _HEADER.unpack_from(body)
+    if magic != MAGIC:
+        raise ValueError("Not a repository delta.")
+
+    out = bytearray()
+    position = _HEADER.size
+    while position < len(body):
+        if body[position] == 0:
+            _, offset, length = _COPY.unpack_from(body, position)
+            out += base[offset:offset + length]
+            position += _COPY.size
+        else:
+            _, length = _INSERT.unpack_from(body, position)
+            position += _INSERT.size
+            out += body[position:position + length]
+            position += length
+
+    if len(out) != size or hashlib.sha256(out).digest() != checksum:
+        raise ValueError("Delta does not reproduce the stored version.")
+    return bytes(out)
+
+
+def read_version(file_repo):
+    """
+    Full contents of any version, applying deltas back from the nearest full version.
+    """
+    deltas = []
+    while file_repo.delta_base_id:
+        deltas.append(file_repo)
+        file_repo = FileRepository.objects.select_related('archive_entry__archive').get(pk=file_repo.delta_base_id)
+
+    with open_repository_file(file_repo) as source:
+        content = source.read()
+    for delta_repo in reversed(deltas):
+        with open_repository_file(delta_repo) as source:
+            content = apply_delta(content, source.read())
+    return content
+
+
+def open_version(file_repo, storage=None):
+    """
+    Open any version for reading; full versions are opened from their tier directly.
+    """
+    if file_repo.delta_base_id:
+        return io.BytesIO(read_version(file_repo))
+    return open_repository_file(file_repo, storage)
+
+
+def version_chain(file_repo):
+    return FileRepository.objects.filter(
+        student_id=file_repo.student_id, group_id=file_repo.group_id, name=file_repo.name,
+    )
+
+
+def add_version(*, student, group, file, name=None, **fields):
+    """
+    Create the next version of ``name`` for the student or group and store the previous
+    version as a delta against it.
+    """
+    name = name or posixpath.basename(file if isinstance(file, str) else file.name)
+
+    scanning = scanners.get_scanner() is not None
+
+    with transaction.atomic():
+        previous = (
+            FileRepository.objects.select_for_update()
+            .filter(student=student, group=group, name=name)
+            .order_by('-version')
+            .first()
+        )
+        file_repo = FileRepository.objects.create(
+            student=student, group=group, file=file, name=name,
+            version=previous.version + 1 if previous else 1,
+            scan_status='pending' if scanning else 'unscanned', **fields,
+        )
+        if scanning:
+            # Only base the previous version on this one once it is known to be clean
+            scanners.schedule_scan(file_repo, on_clean=lambda: compact_previous(file_repo))
+
+    if not scanning:
+        compact_previous(file_repo)
+    return file_repo
+
+
+def compact_previous(file_repo):
+    """
+    Store the version before ``file_repo`` as a delta against it, if there is one. Versions
+    still being scanned or quarantined are left alone.
+    """
+    previous = (
+        version_chain(file_repo)
+        .filter(version__lt=file_repo.version)
+        .exclude(scan_status__in=['pending', 'quarantined'])
+        .order_by('-version')
+        .first()
+    )
+    if previous is None:
+        return
+    try:
+        store_as_delta(previous, file_repo)
+    except Exception:
+        # The previous version simply stays in full
+        logger.exception("Could not store version %s of %s as a delta", previous.version, file_repo.name)
+
+
+def store_as_delta(file_repo, newer):
+    """
+    Replace the stored bytes of ``file_repo`` with a delta against ``newer`` when worthwhile.
+    Returns True if the version is now stored as a delta.
+    """
+    if file_repo.delta_base_id or file_repo.version % FULL_SNAPSHOT_EVERY == 0 or is_archived(file_repo):
+        return False
+
+    with open_repository_file(file_repo) as source:
+        target = source.read(DELTA_MAX_SIZE + 1)
+    with open_version(newer) as source:
+        base = source.read(DELTA_MAX_SIZE + 1)
+    if len(target) > DELTA_MAX_SIZE or len(base) > DELTA_MAX_SIZE:
+        return False
+
+    delta = encode_delta(target, base)
+    if len(delta) > len(target) * (1 - MIN_SAVING):
+        return False
+
+    storage = file_repo.file.storage
+    old_name = file_repo.file.name
+    new_name = storage.save(old_name + '.delta', ContentFile(delta))
+    FileRepository.objects.filter(pk=file_repo.pk).update(file=new_name, delta_base=newer, size=len(target))
+    storage.delete(old_name)
+    return True
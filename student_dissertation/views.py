@@ -1,21 +1,33 @@
+import os
+from datetime import timedelta
+
 from rest_framework.views import APIView
 from rest_framework.generics import ListAPIView, DestroyAPIView, RetrieveUpdateDestroyAPIView
 from rest_framework.response import Response
 from rest_framework import status, viewsets
 from rest_framework.parsers import MultiPartParser, FormParser
 from .models import Course, YearOfStudy, Student, Document, Consultation, Announcement, Feedback, Milestone, Stage, ProjectGroup, FileRepository, Notification
-from .serializers import CourseSerializer, YearOfStudySerializer, StudentSerializer, DocumentSerializer, ConsultationSerializer, AnnouncementSerializer, FeedbackSerializer, MilestoneSerializer, StageSerializer, StudentBasicSerializer, ProjectGroupSerializer, FileRepositorySerializer, NotificationSerializer
+from .models import StorageUsage, AvailabilitySlot, AuditEvent
+from .serializers import CourseSerializer, YearOfStudySerializer, StudentSerializer, DocumentSerializer, ConsultationSerializer, AnnouncementSerializer, FeedbackSerializer, MilestoneSerializer, StageSerializer, ProjectGroupSerializer, FileRepositorySerializer, NotificationSerializer
+from .serializers import AvailabilitySlotSerializer, StageRolloutSerializer, AuditEventSerializer
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User, Group
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from django.db.models import Q
+from django.db.models import Q, Exists, OuterRef
+from django.utils import timezone
 from django.shortcuts import get_object_or_404
 from rest_framework.authtoken.models import Token
 from rest_framework.authentication import TokenAuthentication
-from collections import defaultdict
 from django.contrib.contenttypes.models import ContentType
 from rest_framework.exceptions import ValidationError
 from rest_framework.decorators import action
+from rest_framework.pagination import LimitOffsetPagination
+from django.http import HttpResponse, HttpResponseRedirect, StreamingHttpResponse, FileResponse
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from . import metrics, exports, archives, storage_tiers, object_storage, versions, upload_validation, quotas, allocation, scheduling, milestones, listings
+from . import audit
 
 
 class CourseListView(ListAPIView):
@@ -81,20 +93,18 @@ class StudentProfileView(APIView):
     def get(self, request):
         user = request.user
         try:
-            student = Student.objects.get(user=user)
-            groups = student.project_groups.all()
-            is_in_group = groups.exists()
-            is_group_leader = groups.filter(leader=student).exists()
+            student = Student.objects.select_related('supervisor', 'current_group').get(user=user)
+            group = student.current_group
 
             return Response({
                 "full_name": student.full_name,
                 "reg_number": student.reg_number,
                 "project_title": student.project_title,
                 "supervisor": student.supervisor.username if student.supervisor else "Not Assigned",
-                "is_in_group": is_in_group,
-                "is_group_leader": is_group_leader,
-                "group_id": groups.first().id if is_in_group else None,
-                "group_name": groups.first().name if is_in_group else None,
+                "is_in_group": group is not None,
+                "is_group_leader": group is not None and group.leader_id == student.id,
+                "group_id": group.id if group else None,
+                "group_name": group.name if group else None,
             })
         except Student.DoesNotExist:
             return Response({"error": "Student profile not found"}, status=404)
@@ -191,37 +201,28 @@ class StudentListView(APIView):
         if not user.groups.filter(name='Admin').exists():
             return Response({'error': 'Unauthorized access'}, status=status.HTTP_403_FORBIDDEN)
 
-        students = Student.objects.all()
-        serializer = StudentSerializer(students, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return listings.student_list(request, Student.objects.all())
 
 
 class GroupedStudentView(APIView):
+    """
+    Students by course and year, optionally of one ?course and/or ?year (ids). With ?limit (and
+    ?offset) every bucket lists only that page of its students; ``count`` is the bucket's size.
+    """
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        students = Student.objects.select_related('course', 'year_of_study')
-        grouped = defaultdict(lambda: defaultdict(list))  # course -> year -> students list
-
-        for student in students:
-            if student.course and student.year_of_study:
-                course_name = student.course.name
-                year_name = student.year_of_study.year
-
-                grouped[course_name][year_name].append(student)
-
-        response_data = []
-
-        for course_name, years in grouped.items():
-            for year_name, student_list in years.items():
-                serialized_students = StudentBasicSerializer(student_list, many=True).data
-                response_data.append({
-                    'course': course_name,
-                    'year': year_name,
-                    'students': serialized_students
-                })
+        try:
+            params = {
+                key: int(request.query_params[key])
+                for key in ('course', 'year', 'limit', 'offset') if request.query_params.get(key)
+            }
+        except ValueError:
+            return Response({'error': 'course, year, limit and offset must be numbers.'}, status=status.HTTP_400_BAD_REQUEST)
+        if params.get('limit', 1) < 1 or params.get('offset', 0) < 0:
+            return Response({'error': 'limit must be positive and offset not negative.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response(response_data)
+        return listings.grouped_students(request, **params)
 
 
 class AutoCreateGroupsView(APIView):
@@ -290,9 +291,7 @@ class ProjectGroupListView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        groups = ProjectGroup.objects.all().select_related('course', 'year').prefetch_related('members')
-        serializer = ProjectGroupSerializer(groups, many=True)
-        return Response(serializer.data)
+        return listings.group_list(request, ProjectGroup.objects.all())
 
 
 class ProjectGroupDeleteView(DestroyAPIView):
@@ -302,7 +301,7 @@ class ProjectGroupDeleteView(DestroyAPIView):
 
 
 class ProjectGroupDetailView(RetrieveUpdateDestroyAPIView):
-    queryset = ProjectGroup.objects.all()
+    queryset = ProjectGroup.objects.select_related('course', 'year', 'supervisor').prefetch_related('members')
     serializer_class = ProjectGroupSerializer
     permission_classes = [IsAuthenticated]
 
@@ -312,7 +311,12 @@ class MyGroupView(APIView):
 
     def get(self, request):
         student = request.user.student  # Assuming you have a one-to-one `User -> Student`
-        group = ProjectGroup.objects.filter(members=student).select_related('course', 'year').prefetch_related('members').first()
+        group = None
+        if student.current_group_id:
+            group = (
+                ProjectGroup.objects.filter(pk=student.current_group_id)
+                .select_related('course', 'year', 'supervisor').prefetch_related('members').first()
+            )
 
         if group:
             serializer = ProjectGroupSerializer(group)
@@ -330,7 +334,7 @@ class RegisterProjectTitleView(APIView):
         try:
             student = Student.objects.get(user=request.user)
             # ❌ Block if student is already in a group
-            if student.project_groups.exists():
+            if student.current_group_id:
                 return Response({
                     'error': 'You are part of a project group. Title must be registered through the group leader.'
                 }, status=status.HTTP_403_FORBIDDEN)
@@ -376,7 +380,7 @@ class StudentsWithoutGroupsView(APIView):
         # Filter students who are not in any project group
         students_without_groups = Student.objects.filter(
             ~Q(project_groups__isnull=False)
-        ).distinct()
+        ).distinct().select_related('supervisor', 'course', 'year_of_study')
 
         serializer = StudentSerializer(students_without_groups, many=True)
         return Response(serializer.data)
@@ -467,8 +471,10 @@ class AssignGroupSupervisorView(APIView):
                 )
 
             # Assign the supervisor to the group
+            previous = group.supervisor_id
             group.supervisor = supervisor
             group.save()
+            audit.record('supervisor.assigned', 'group', group.id, supervisor=[previous, supervisor.id])
 
             return Response(
                 {'message': f"Supervisor {supervisor.username} successfully assigned to the group."},
@@ -481,6 +487,44 @@ class AssignGroupSupervisorView(APIView):
                             status=status.HTTP_404_NOT_FOUND)
 
 
+class SupervisorAllocationView(APIView):
+    """
+    Allocate supervisors to every unsupervised student without a group and every unsupervised
+    group in one go (Admin only); see allocation.py. POST to the preview URL for a dry run, to
+    the apply URL to save it. Body, all optional::
+
+        {"capacities": {"<supervisor id>": 12}, "balance": 1.0, "course": 1, "year": 2,
+         "scores": [{"student": "<reg number>", "supervisor_id": 3, "score": 2},
+                    {"group": 7, "supervisor_id": 3, "score": null}]}
+    """
+    permission_classes = [IsAuthenticated]
+    apply = False
+
+    def post(self, request):
+        if not request.user.groups.filter(name='Admin').exists():
+            return Response({'error': 'Unauthorized access.'}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            result = allocation.allocate(
+                capacities=request.data.get('capacities') or {},
+                scores=request.data.get('scores') or [],
+                balance=float(request.data.get('balance', 1.0)),
+                course=request.data.get('course'),
+                year=request.data.get('year'),
+            )
+        except (TypeError, ValueError, KeyError, AttributeError):
+            return Response(
+                {'error': 'capacities must map supervisor ids to numbers and each score needs supervisor_id and score.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        data = result.as_dict()
+        if self.apply:
+            students, groups = allocation.apply_allocation(result)
+            data['applied'] = {'students': students, 'groups': groups}
+        return Response(data, status=status.HTTP_200_OK)
+
+
 class SupervisorListView(APIView):
     def get(self, request):
         supervisors = User.objects.filter(groups__name="Supervisor")
@@ -494,7 +538,7 @@ class AssignedStudentsView(APIView):
 
     def get(self, request):
         supervisor = request.user
-        students = Student.objects.filter(supervisor=supervisor)
+        students = Student.objects.filter(supervisor=supervisor).select_related('supervisor', 'course', 'year_of_study')
         serializer = StudentSerializer(students, many=True)
         return Response(serializer.data)
 
@@ -505,7 +549,7 @@ class AssignedGroupsView(APIView):
 
     def get(self, request):
         supervisor = request.user
-        groups = ProjectGroup.objects.filter(supervisor=supervisor)
+        groups = ProjectGroup.objects.filter(supervisor=supervisor).select_related('course', 'year', 'supervisor').prefetch_related('members')
         serializer = ProjectGroupSerializer(groups, many=True)
         return Response(serializer.data)
 
@@ -539,10 +583,10 @@ class AssignedGroupSupervisorView(APIView):
     def get(self, request):
         try:
             # Get the logged-in student's profile
-            student = Student.objects.get(user=request.user)
+            student = Student.objects.select_related('current_group__supervisor').get(user=request.user)
 
             # Ensure the student is part of exactly one project group
-            project_group = student.project_groups.first()
+            project_group = student.current_group
             if not project_group:
                 return Response({'error': 'You are not assigned to any project group.'}, status=status.HTTP_404_NOT_FOUND)
 
@@ -572,11 +616,18 @@ class UploadStudentDocumentView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, *args, **kwargs):
-        data = request.data.copy()
-
         # Assuming the document is related to the Student model instance of the logged-in user
         student = request.user.student  # Adjust if your user model has a student relation
 
+        # Quota check from Content-Length before the body is read, then on the actual file
+        try:
+            quotas.check_content_length(student, request)
+            data = request.data.copy()
+            if request.FILES.get('file'):
+                quotas.check_quota(student, request.FILES['file'].size)
+        except upload_validation.UploadRejected as e:
+            return Response({'error': e.message}, status=e.status_code)
+
         content_type = ContentType.objects.get_for_model(student)
 
         data['content_type'] = content_type.pk  # Pass the pk of content type
@@ -609,9 +660,15 @@ class UploadGroupDocumentView(APIView):
         if not group.supervisor:
             return Response({'error': 'This group has no assigned supervisor.'}, status=400)
 
-        # Get file and title from the request
-        file = request.data.get('file')
-        title = request.data.get('title')
+        # Get file and title from the request, checking the group quota before and after reading it
+        try:
+            quotas.check_content_length(group, request)
+            file = request.data.get('file')
+            title = request.data.get('title')
+            if file:
+                quotas.check_quota(group, file.size)
+        except upload_validation.UploadRejected as e:
+            return Response({'error': e.message}, status=e.status_code)
         if not file or not title:
             return Response({'error': 'Both title and file are required.'}, status=400)
 
@@ -644,7 +701,7 @@ class SupervisorDocumentListView(APIView):
         if not supervisor.groups.filter(name='Supervisor').exists():
             return Response({"error": "Unauthorized access"}, status=status.HTTP_403_FORBIDDEN)
 
-        documents = Document.objects.filter(supervisor=supervisor)
+        documents = Document.objects.filter(supervisor=supervisor).select_related('supervisor', 'content_type').prefetch_related('owner')
         serializer = DocumentSerializer(documents, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -673,11 +730,29 @@ class BookConsultationView(APIView):
         data['student'] = student.id
         data['supervisor'] = supervisor.id
 
+        # Booking a published slot by id; its start is the proposed date
+        slot = None
+        if data.get('slot'):
+            try:
+                slot_id = int(data['slot'])
+            except (TypeError, ValueError):
+                return Response({'error': 'slot must be a slot id.'}, status=status.HTTP_400_BAD_REQUEST)
+            slot = AvailabilitySlot.objects.filter(pk=slot_id, supervisor=supervisor).first()
+            if slot is None:
+                return Response({'error': 'Slot not found.'}, status=status.HTTP_404_NOT_FOUND)
+            data['proposed_date'] = slot.start
+
         # Serialize the consultation data
         serializer = ConsultationSerializer(data=data)
         if serializer.is_valid():
-            # Save the consultation to the database
-            serializer.save()
+            # Save the consultation to the database unless the time is taken
+            try:
+                scheduling.book(serializer, supervisor, slot)
+            except scheduling.SchedulingConflict as e:
+                return Response({
+                    'error': e.message,
+                    'suggestions': AvailabilitySlotSerializer(e.suggestions, many=True).data,
+                }, status=e.status_code)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -687,35 +762,65 @@ class ManageConsultationView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        email = request.query_params.get("email")
-        if not email:
-            return Response({'error': 'Email is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        # The signed-in supervisor's own consultations, served by the (supervisor, status, proposed_date) index
+        consultations = Consultation.objects.filter(supervisor=request.user).select_related('student', 'supervisor')
 
+        # Optional ?status=Pending[,Approved...] and ?from= / ?to= on the proposed date
+        statuses = request.query_params.get('status')
+        if statuses:
+            consultations = consultations.filter(status__in=statuses.split(','))
         try:
-            consultations = Consultation.objects.filter(supervisor__email=email)
-
-            serializer = ConsultationSerializer(consultations, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
-
-        except Consultation.DoesNotExist:
-            return Response({'error': 'No consultations found for this supervisor.'}, status=status.HTTP_404_NOT_FOUND)
+            start = scheduling.parse_time(request.query_params.get('from'))
+            end = scheduling.parse_time(request.query_params.get('to'))
+        except scheduling.SchedulingConflict as e:
+            return Response({'error': e.message}, status=e.status_code)
+        if start:
+            consultations = consultations.filter(proposed_date__gte=start)
+        if end:
+            consultations = consultations.filter(proposed_date__lt=end)
+
+        serializer = ConsultationSerializer(consultations.order_by('proposed_date'), many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
     def patch(self, request, pk):
-        email = request.query_params.get("email")
-        if not email:
-            return Response({'error': 'Email is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        new_status = request.data.get('status')
+        if new_status not in scheduling.DECISIONS + ['Pending']:
+            return Response({'error': 'Invalid status.'}, status=status.HTTP_400_BAD_REQUEST)
 
+        # Only the consultation's supervisor may decide on it
+        consultation = Consultation.objects.filter(id=pk, supervisor=request.user)
+        if not consultation.exists():
+            return Response({'error': 'Consultation not found.'}, status=status.HTTP_404_NOT_FOUND)
         try:
-            consultation = Consultation.objects.get(id=pk)
-            status = request.data.get('status')
+            scheduling.set_status(consultation, new_status)
+        except scheduling.SchedulingConflict as e:
+            return Response({'error': e.message}, status=e.status_code)
 
-            consultation.status = status
-            consultation.save()
+        return Response({"message": "Consultation status updated successfully."}, status=status.HTTP_200_OK)
 
-            return Response({"message": "Consultation status updated successfully."}, status=status.HTTP_200_OK)
 
-        except Consultation.DoesNotExist:
-            return Response({'error': 'Consultation not found.'}, status=status.HTTP_404_NOT_FOUND)
+class BulkConsultationStatusView(APIView):
+    """
+    Approve or reject several of the supervisor's consultations in one request:
+    {"ids": [...], "status": "Approved" | "Rejected"}. Students are notified.
+    """
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        ids = request.data.get('ids')
+        new_status = request.data.get('status', 'Approved')
+        if not isinstance(ids, list) or not all(isinstance(pk, int) for pk in ids):
+            return Response({'error': 'ids must be a list of consultation ids.'}, status=status.HTTP_400_BAD_REQUEST)
+        if new_status not in scheduling.DECISIONS:
+            return Response({'error': 'status must be Approved or Rejected.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        consultations = Consultation.objects.filter(id__in=ids, supervisor=request.user)
+        try:
+            updated = scheduling.set_status(consultations, new_status)
+        except scheduling.SchedulingConflict as e:
+            return Response({'error': e.message}, status=e.status_code)
+        return Response({'updated': updated}, status=status.HTTP_200_OK)
 
 
 class StudentConsultationView(APIView):
@@ -729,7 +834,7 @@ class StudentConsultationView(APIView):
             return Response({"error": "Student registration number is required."}, status=status.HTTP_400_BAD_REQUEST)
 
         # Fetch consultations for the student using reg_number
-        consultations = Consultation.objects.filter(student__reg_number=reg_number)
+        consultations = Consultation.objects.filter(student__reg_number=reg_number).select_related('student', 'supervisor')
         if not consultations:
             return Response({"error": "No consultations found for this registration number."}, status=status.HTTP_404_NOT_FOUND)
 
@@ -738,6 +843,85 @@ class StudentConsultationView(APIView):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+class AvailabilitySlotView(APIView):
+    """
+    A supervisor's own availability. GET lists upcoming slots (from ?after) with whether
+    each is booked; POST publishes either {"start", "end", "length"} (the window cut into
+    ``length``-minute slots, or one slot without it) or {"slots": [{"start", "end"}, ...]};
+    DELETE removes a slot that has no active consultation.
+    """
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        if not request.user.groups.filter(name='Supervisor').exists():
+            return Response({'error': 'Unauthorized access.'}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            after = scheduling.parse_time(request.query_params.get('after')) or timezone.now()
+        except scheduling.SchedulingConflict as e:
+            return Response({'error': e.message}, status=e.status_code)
+        slots = AvailabilitySlot.objects.filter(supervisor=request.user, start__gte=after).annotate(
+            booked=Exists(Consultation.objects.filter(slot=OuterRef('pk'), status__in=scheduling.ACTIVE_STATUSES)),
+        )
+        return Response(AvailabilitySlotSerializer(slots, many=True).data, status=status.HTTP_200_OK)
+
+    def post(self, request):
+        if not request.user.groups.filter(name='Supervisor').exists():
+            return Response({'error': 'Unauthorized access.'}, status=status.HTTP_403_FORBIDDEN)
+
+        serializer = AvailabilitySlotSerializer(data=request.data.get('slots') or [request.data], many=True)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            length = int(request.data['length']) if request.data.get('length') else None
+            intervals = []
+            for slot in serializer.validated_data:
+                intervals += scheduling.split_interval(slot['start'], slot['end'], length)
+            slots = scheduling.create_slots(request.user, intervals)
+        except ValueError:
+            return Response({'error': 'length must be a number of minutes.'}, status=status.HTTP_400_BAD_REQUEST)
+        except scheduling.SchedulingConflict as e:
+            return Response({'error': e.message}, status=e.status_code)
+        return Response(AvailabilitySlotSerializer(slots, many=True).data, status=status.HTTP_201_CREATED)
+
+    def delete(self, request, pk):
+        slot = get_object_or_404(AvailabilitySlot, pk=pk, supervisor=request.user)
+        if slot.consultations.filter(status__in=scheduling.ACTIVE_STATUSES).exists():
+            return Response({'error': 'The slot has a consultation booked.'}, status=status.HTTP_409_CONFLICT)
+        slot.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class FreeSlotView(APIView):
+    """
+    The next ?count (default 5, at most 50) free slots of a student's supervisor
+    (?reg_number) from ?after (default now).
+    """
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        reg_number = request.query_params.get('reg_number')
+        if not reg_number:
+            return Response({'error': 'Registration number is required.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        student = get_object_or_404(Student.objects.select_related('supervisor'), reg_number=reg_number)
+        if not student.supervisor:
+            return Response({'error': 'Student does not have a supervisor assigned.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            count = max(min(int(request.query_params.get('count', 5)), 50), 1)
+            after = scheduling.parse_time(request.query_params.get('after'))
+        except ValueError:
+            return Response({'error': 'count must be a number.'}, status=status.HTTP_400_BAD_REQUEST)
+        except scheduling.SchedulingConflict as e:
+            return Response({'error': e.message}, status=e.status_code)
+        slots = scheduling.next_free_slots(student.supervisor, count, after)
+        return Response(AvailabilitySlotSerializer(slots, many=True).data, status=status.HTTP_200_OK)
+
+
 class AnnouncementView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -747,7 +931,7 @@ class AnnouncementView(APIView):
         if not supervisor.groups.filter(name='Supervisor').exists():
             return Response({'error': 'Unauthorized access'}, status=status.HTTP_403_FORBIDDEN)
 
-        announcements = Announcement.objects.filter(supervisor=supervisor).order_by('-created_at')
+        announcements = Announcement.objects.filter(supervisor=supervisor).select_related('supervisor').order_by('-created_at')
         serializer = AnnouncementSerializer(announcements, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -777,29 +961,17 @@ class StudentAnnouncementView(APIView):
         except Student.DoesNotExist:
             return Response({"error": "Student profile not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        # Supervisor announcements for individual student
-        supervisor_announcements = Announcement.objects.filter(supervisor=student.supervisor)
+        # Own supervisor, group supervisors and admin announcements, ordered by the database
+        announcements = Announcement.objects.for_student(student).select_related('supervisor')
 
-        # Fetch all groups the student belongs to
-        groups = ProjectGroup.objects.filter(members=student)
-
-        # Announcements for groups the student belongs to
-        group_supervisor_announcements = Announcement.objects.filter(
-            supervisor__in=[group.supervisor for group in groups]
-        )
-
-        # Global admin announcements for all students
-        admin_announcements = Announcement.objects.filter(
-            admin__isnull=False,
-            target_group="students"
-        )
+        # Paginate only when the client asks for it (?limit=&offset=)
+        paginator = LimitOffsetPagination()
+        page = paginator.paginate_queryset(announcements, request, view=self)
+        if page is not None:
+            serializer = AnnouncementSerializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
 
-        # Combine all announcements
-        all_announcements = list(supervisor_announcements) + list(group_supervisor_announcements) + list(admin_announcements)
-        all_announcements = sorted(all_announcements, key=lambda x: x.created_at, reverse=True)
-
-        # Serialize and return the response
-        serializer = AnnouncementSerializer(all_announcements, many=True)
+        serializer = AnnouncementSerializer(announcements, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
@@ -812,7 +984,7 @@ class AdminAnnouncementView(APIView):
         if not user.groups.filter(name='Admin').exists():
             return Response({"error": "Unauthorized access."}, status=status.HTTP_403_FORBIDDEN)
 
-        announcements = Announcement.objects.filter(admin=user).order_by('-created_at')
+        announcements = Announcement.objects.filter(admin=user).select_related('supervisor').order_by('-created_at')
         serializer = AnnouncementSerializer(announcements, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -882,7 +1054,7 @@ class ViewFeedbackView(APIView):
         except Student.DoesNotExist:
             return Response({'error': 'Student not found.'}, status=status.HTTP_404_NOT_FOUND)
 
-        feedbacks = Feedback.objects.filter(student=student).order_by('-created_at')
+        feedbacks = Feedback.objects.filter(student=student).select_related('supervisor', 'student').order_by('-created_at')
         serializer = FeedbackSerializer(feedbacks, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -923,6 +1095,38 @@ class CreateStageView(APIView):
             return Response({"error": "Stage not found."}, status=status.HTTP_404_NOT_FOUND)
 
 
+class StageRolloutView(APIView):
+    """
+    Create a stage's milestone for a whole cohort in one request. Supervisors roll it out to
+    their own students and groups; Admins to everyone, or to the course and/or year given in
+    the body (see StageRolloutSerializer), each milestone going to that student's or group's
+    supervisor. Targets that already have a milestone for the stage are skipped.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, stage_id):
+        roles = set(request.user.groups.filter(name__in=['Admin', 'Supervisor']).values_list('name', flat=True))
+        if not roles:
+            return Response({"error": "Access denied."}, status=status.HTTP_403_FORBIDDEN)
+
+        stage = get_object_or_404(Stage, id=stage_id)
+        serializer = StageRolloutSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        options = serializer.validated_data
+        created, skipped = milestones.rollout_stage(
+            stage,
+            milestone=options.get('milestone'),
+            completion_date=options.get('completion_date'),
+            remarks=options.get('remarks'),
+            supervisor=None if 'Admin' in roles else request.user,
+            course=options['course'].id if options.get('course') else None,
+            year=options['year'].id if options.get('year') else None,
+        )
+        return Response({'created': created, 'skipped': skipped}, status=status.HTTP_201_CREATED)
+
+
 class ProgressTrackingView(APIView):
     """
     View for managing progress tracking for students and supervisors.
@@ -938,7 +1142,7 @@ class ProgressTrackingView(APIView):
             return Response({"error": "Access denied."}, status=status.HTTP_403_FORBIDDEN)
 
         # Retrieve milestones for students or groups supervised by the user
-        milestones = Milestone.objects.filter(supervisor=request.user)
+        milestones = Milestone.objects.filter(supervisor=request.user).select_related('student', 'group', 'supervisor', 'stage')
         serializer = MilestoneSerializer(milestones, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -1013,14 +1217,12 @@ class StudentMilestoneView(APIView):
         # Get individual milestones for the student
         individual_milestones = Milestone.objects.filter(student=student)
 
-        # Determine the student's group by querying the ProjectGroup model
-        group = ProjectGroup.objects.filter(members=student).first()  # Adjust `students` to your field name
-
         # Get group milestones if the student belongs to a group
-        group_milestones = Milestone.objects.filter(group=group) if group else Milestone.objects.none()
+        group_id = student.current_group_id
+        group_milestones = Milestone.objects.filter(group_id=group_id) if group_id else Milestone.objects.none()
 
         # Combine both individual and group milestones
-        milestones = individual_milestones | group_milestones
+        milestones = (individual_milestones | group_milestones).select_related('student', 'group', 'supervisor', 'stage')
         serializer = MilestoneSerializer(milestones, many=True)
 
         return Response(serializer.data)
@@ -1030,11 +1232,13 @@ class FileUploadView(APIView):
     permission_classes = [IsAuthenticated]
     parser_classes = [MultiPartParser, FormParser]
 
+    def initialize_request(self, request, *args, **kwargs):
+        # The validating upload handler has to be in place before anything parses the body
+        self.upload_validator = upload_validation.install_upload_validation(request)
+        return super().initialize_request(request, *args, **kwargs)
+
     def post(self, request):
         user = request.user
-        file = request.FILES.get('file')
-        file_type = request.data.get('file_type')
-        description = request.data.get('description')
         student = None
         group = None
 
@@ -1043,22 +1247,44 @@ class FileUploadView(APIView):
         except Student.DoesNotExist:
             return Response({"error": "Student not found."}, status=status.HTTP_404_NOT_FOUND)
 
+        # Known before the body is parsed, so over-quota uploads stop at Content-Length
+        self.upload_validator.quota = quotas.upload_allowance(student)
+        file = request.FILES.get('file')
+        file_type = request.data.get('file_type')
+        description = request.data.get('description')
+
+        try:
+            if self.upload_validator.error:
+                raise self.upload_validator.error
+            if file:
+                upload_validation.check_upload(file_type, self.upload_validator.kind, file.size)
+        except upload_validation.UploadRejected as e:
+            return Response({"error": e.message}, status=e.status_code)
+
         # Check if a group is specified
         group_id = request.data.get('group_id')
         if group_id:
             try:
                 group = ProjectGroup.objects.get(id=group_id)
-                if not group.members.filter(id=student.id).exists():
+                # Only a student in several groups needs the membership table
+                if student.current_group_id != group.id and not group.members.filter(id=student.id).exists():
                     return Response({"error": "You are not a member of this group."}, status=status.HTTP_403_FORBIDDEN)
             except ProjectGroup.DoesNotExist:
                 return Response({"error": "Group not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        # Create the FileRepository instance
         try:
-            file_repo = FileRepository.objects.create(
+            if file:
+                quotas.check_quota(group or student, file.size)
+        except upload_validation.UploadRejected as e:
+            return Response({"error": e.message}, status=e.status_code)
+
+        # Create the FileRepository instance as the next version of this file
+        try:
+            file_repo = versions.add_version(
                 student=student if not group else None,
                 group=group,
                 file=file,
+                name=request.data.get('name'),
                 file_type=file_type,
                 description=description
             )
@@ -1081,14 +1307,20 @@ class AdminRepositoryView(APIView):
         if year:
             files = files.filter(year=year)
 
-        serializer = FileRepositorySerializer(files, many=True, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return listings.file_list(request, files)
 
     def patch(self, request, pk):
         file = get_object_or_404(FileRepository, pk=pk)
         serializer = FileRepositorySerializer(file, data=request.data, partial=True)
         if serializer.is_valid():
+            changes = {
+                field: [getattr(getattr(file, field), 'pk', getattr(file, field)), getattr(value, 'pk', value)]
+                for field, value in serializer.validated_data.items() if not isinstance(value, dict)
+            }
             serializer.save()
+            audit.record('repository.updated', 'file', file.pk, **{
+                field: values for field, values in changes.items() if values[0] != values[1]
+            })
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -1108,5 +1340,466 @@ class NotificationViewSet(viewsets.ModelViewSet):
     def mark_as_read(self, request, pk=None):
         notification = self.get_object()
         notification.is_read = True
-        notification.save()
+        notification.save(update_fields=['is_read'])
         return Response({'status': 'marked as read'}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'])
+    def mark_all_read(self, request):
+        """
+        Mark every unread notification of the user as read, or only those listed in `ids`,
+        with a single UPDATE.
+        """
+        notifications = Notification.objects.filter(recipient=request.user, is_read=False)
+
+        ids = request.data.get('ids')
+        if ids is not None:
+            if not isinstance(ids, list) or not all(isinstance(pk, int) for pk in ids):
+                return Response({'error': 'ids must be a list of notification ids.'}, status=status.HTTP_400_BAD_REQUEST)
+            notifications = notifications.filter(id__in=ids)
+
+        updated = notifications.update(is_read=True)
+        return Response({'status': 'marked as read', 'updated': updated}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'])
+    def unread_count(self, request):
+        """
+        Unread badge count, answered from the (recipient, is_read, created_at) index.
+        """
+        count = Notification.objects.filter(recipient=request.user, is_read=False).count()
+        return Response({'unread_count': count}, status=status.HTTP_200_OK)
+
+
+class MetricsView(APIView):
+    """
+    Per-endpoint request metrics of this worker in Prometheus text format (Admin only).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        if not request.user.groups.filter(name='Admin').exists():
+            return Response({'error': 'Unauthorized access'}, status=status.HTTP_403_FORBIDDEN)
+
+        return HttpResponse(metrics.registry.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class ExportView(APIView):
+    """
+    Stream an export of students, groups, milestones or repository files as CSV (default)
+    or XLSX (?output=xlsx). Admin only.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, kind):
+        if not request.user.groups.filter(name='Admin').exists():
+            return Response({'error': 'Unauthorized access'}, status=status.HTTP_403_FORBIDDEN)
+
+        if kind not in exports.EXPORTS:
+            return Response({'error': f"Unknown export '{kind}'."}, status=status.HTTP_404_NOT_FOUND)
+
+        output = request.query_params.get('output', 'csv')
+        if output == 'csv':
+            response = StreamingHttpResponse(exports.iter_csv(kind, request.query_params), content_type='text/csv')
+            response['Content-Disposition'] = f'attachment; filename="{kind}.csv"'
+            return response
+
+        if output == 'xlsx':
+            try:
+                workbook = exports.write_xlsx(kind, request.query_params)
+            except ImportError:
+                return Response({'error': 'XLSX export requires openpyxl.'}, status=status.HTTP_400_BAD_REQUEST)
+            return FileResponse(
+                workbook, as_attachment=True, filename=f'{kind}.xlsx',
+                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            )
+
+        return Response({'error': "output must be 'csv' or 'xlsx'."}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class RepositoryArchiveView(APIView):
+    """
+    Stream a ZIP of the repository files matching ?year= and ?file_type=, with one folder
+    per student or group and a manifest.csv. Admin only.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        if not request.user.groups.filter(name='Admin').exists():
+            return Response({'error': 'Unauthorized access'}, status=status.HTTP_403_FORBIDDEN)
+
+        file_type = request.query_params.get('file_type')
+        year = request.query_params.get('year')
+
+        files = FileRepository.objects.all()
+        if file_type:
+            files = files.filter(file_type=file_type)
+        if year:
+            files = files.filter(year=year)
+
+        filename = '-'.join(['repository', year or 'all-years', file_type or 'all-types']) + '.zip'
+        response = StreamingHttpResponse(archives.iter_repository_zip(files), content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+def can_access_repository_file(user, file_repo):
+    """
+    Admins, the owning student or group members, and the assigned supervisor.
+    """
+    return (
+        user.groups.filter(name='Admin').exists()
+        or (file_repo.student and user.id in (file_repo.student.user_id, file_repo.student.supervisor_id))
+        or (file_repo.group and (user.id == file_repo.group.supervisor_id or file_repo.group.members.filter(user=user).exists()))
+    )
+
+
+class RepositoryFileDownloadView(APIView):
+    """
+    Download a repository file from whichever storage tier holds it, rebuilding delta-stored
+    versions. Allowed for admins, the owning student or group members, and the assigned supervisor.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        file_repo = get_object_or_404(
+            FileRepository.objects.select_related('student', 'group', 'archive_entry__archive'), pk=pk
+        )
+        if not can_access_repository_file(request.user, file_repo):
+            return Response({'error': 'Unauthorized access'}, status=status.HTTP_403_FORBIDDEN)
+        if file_repo.scan_status == 'pending':
+            return Response({'error': 'File is still being scanned.'}, status=status.HTTP_409_CONFLICT)
+        if file_repo.scan_status == 'quarantined':
+            return Response({'error': 'File was quarantined by the malware scan.'}, status=status.HTTP_403_FORBIDDEN)
+
+        filename = file_repo.filename
+        archived = storage_tiers.is_archived(file_repo)
+        store = object_storage.get_object_storage()
+        if store.redirect_downloads and not archived and not file_repo.delta_base_id:
+            # Hot files are fetched straight from the object store
+            url = store.presigned_get_url(file_repo.file.name, filename=filename)
+            return HttpResponseRedirect(request.build_absolute_uri(url))
+
+        try:
+            source = versions.open_version(file_repo)
+        except (FileNotFoundError, OSError):
+            return Response({'error': 'File not found in storage.'}, status=status.HTTP_404_NOT_FOUND)
+
+        if archived and not file_repo.delta_base_id:
+            response = StreamingHttpResponse(source, content_type='application/octet-stream')
+            response['Content-Length'] = str(file_repo.archive_entry.size)
+            response['Content-Disposition'] = f'attachment; filename="{filename}"'
+            return response
+        return FileResponse(source, as_attachment=True, filename=filename)
+
+
+class RepositoryVersionListView(APIView):
+    """
+    All versions of a repository file, newest first, with how each one is stored.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        file_repo = get_object_or_404(FileRepository.objects.select_related('student', 'group'), pk=pk)
+        if not can_access_repository_file(request.user, file_repo):
+            return Response({'error': 'Unauthorized access'}, status=status.HTTP_403_FORBIDDEN)
+
+        chain = list(versions.version_chain(file_repo).select_related('student', 'group', 'archive_entry').order_by('-version'))
+        data = FileRepositorySerializer(chain, many=True, context={'request': request}).data
+        for item, version in zip(data, chain):
+            if storage_tiers.is_archived(version):
+                item['stored_as'] = 'archived'
+            else:
+                item['stored_as'] = 'delta' if version.delta_base_id else 'full'
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class RepositoryVersionDownloadView(RepositoryFileDownloadView):
+    """
+    Download one version of a repository file by its version number.
+    """
+
+    def get(self, request, pk, version):
+        file_repo = get_object_or_404(FileRepository, pk=pk)
+        target = get_object_or_404(versions.version_chain(file_repo), version=version)
+        return super().get(request, target.pk)
+
+
+UPLOAD_TARGETS = ('repository', 'student-document', 'group-document')
+
+
+class PresignedUploadView(APIView):
+    """
+    Step one of a direct upload: hand out an object key and a presigned PUT URL. The client
+    sends the bytes straight to the object store and then calls ConfirmUploadView.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        target = request.data.get('target', 'repository')
+        filename = request.data.get('filename')
+        content_type = request.data.get('content_type') or 'application/octet-stream'
+
+        if target not in UPLOAD_TARGETS:
+            return Response({'error': f"target must be one of {', '.join(UPLOAD_TARGETS)}."}, status=status.HTTP_400_BAD_REQUEST)
+        if not filename:
+            return Response({'error': 'filename is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        if not Student.objects.filter(user=request.user).exists():
+            return Response({'error': 'Student not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+        max_size = settings.OBJECT_STORAGE_MAX_UPLOAD_SIZE
+        if target == 'repository':
+            max_size = min(max_size, upload_validation.max_size_for(request.data.get('file_type')))
+        size = request.data.get('size')
+        if size is not None:
+            try:
+                size = int(size)
+            except (TypeError, ValueError):
+                size = -1
+            if size < 0:
+                return Response({'error': 'size must be a number of bytes.'}, status=status.HTTP_400_BAD_REQUEST)
+            if size > max_size:
+                return Response({'error': f'File exceeds the {max_size} byte upload limit.'}, status=status.HTTP_400_BAD_REQUEST)
+            if size > quotas.upload_allowance(Student.objects.get(user=request.user)):
+                return Response({'error': 'Storage quota exceeded.'}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        key = object_storage.new_object_key(target, filename)
+        url = object_storage.get_object_storage().presigned_put_url(key, content_type, max_size=max_size)
+        return Response({
+            'key': key,
+            'upload_url': request.build_absolute_uri(url),
+            'method': 'PUT',
+            'headers': {'Content-Type': content_type},
+            'expires_in': object_storage.DEFAULT_EXPIRY,
+            'upload_token': object_storage.sign_upload(key, target, request.user.id),
+        }, status=status.HTTP_201_CREATED)
+
+
+class ConfirmUploadView(APIView):
+    """
+    Step two of a direct upload: check the object landed in the store and record its metadata
+    as a FileRepository entry or a Document. No file bytes pass through the API.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        try:
+            upload = object_storage.load_upload(request.data.get('upload_token', ''))
+        except signing.BadSignature:
+            return Response({'error': 'Invalid or expired upload token.'}, status=status.HTTP_400_BAD_REQUEST)
+        if upload['user'] != request.user.id:
+            return Response({'error': 'Unauthorized access'}, status=status.HTTP_403_FORBIDDEN)
+
+        with transaction.atomic():
+            # Locking the student's row serialises their confirmations, so each token is used once
+            try:
+                student = Student.objects.select_for_update(of=('self',)).select_related('supervisor').get(user=request.user)
+            except Student.DoesNotExist:
+                return Response({'error': 'Student not found.'}, status=status.HTTP_404_NOT_FOUND)
+            if FileRepository.objects.filter(file=upload['key']).exists() or Document.objects.filter(file=upload['key']).exists():
+                return Response({'error': 'This upload has already been confirmed.'}, status=status.HTTP_409_CONFLICT)
+
+            store = object_storage.get_object_storage()
+            size = store.size(upload['key'])
+            if size is None:
+                return Response({'error': 'Upload not found in storage.'}, status=status.HTTP_400_BAD_REQUEST)
+            if size > settings.OBJECT_STORAGE_MAX_UPLOAD_SIZE:
+                store.delete(upload['key'])
+                return Response({'error': 'File exceeds the upload limit.'}, status=status.HTTP_400_BAD_REQUEST)
+
+            if upload['target'] == 'repository':
+                return self.create_repository_file(request, student, upload['key'])
+            return self.create_document(request, student, upload['key'], group=upload['target'] == 'group-document')
+
+    def create_repository_file(self, request, student, key):
+        # Same content rules as multipart uploads, checked on the stored object
+        storage = object_storage.repository_storage()
+        with storage.open(key, 'rb') as source:
+            kind = upload_validation.sniff(source.read(upload_validation.SNIFF_SIZE))
+        try:
+            upload_validation.check_upload(request.data.get('file_type'), kind, storage.size(key))
+        except upload_validation.UploadRejected as e:
+            storage.delete(key)
+            return Response({"error": e.message}, status=e.status_code)
+
+        group = None
+        group_id = request.data.get('group_id')
+        if group_id:
+            try:
+                group = ProjectGroup.objects.get(id=group_id)
+            except ProjectGroup.DoesNotExist:
+                return Response({"error": "Group not found."}, status=status.HTTP_404_NOT_FOUND)
+            if student.current_group_id != group.id and not group.members.filter(id=student.id).exists():
+                return Response({"error": "You are not a member of this group."}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            quotas.check_quota(group or student, storage.size(key))
+        except upload_validation.UploadRejected as e:
+            storage.delete(key)
+            return Response({"error": e.message}, status=e.status_code)
+
+        file_repo = versions.add_version(
+            student=student if not group else None,
+            group=group,
+            file=key,
+            name=request.data.get('name'),
+            file_type=request.data.get('file_type'),
+            description=request.data.get('description') or '',
+        )
+        return Response(FileRepositorySerializer(file_repo).data, status=status.HTTP_201_CREATED)
+
+    def create_document(self, request, student, key, group=False):
+        title = request.data.get('title')
+        if not title:
+            return Response({'error': 'title is required.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if group:
+            owner = ProjectGroup.objects.filter(leader=student).select_related('supervisor').first()
+            if not owner:
+                return Response({'error': 'Only group leaders can upload group documents.'}, status=status.HTTP_403_FORBIDDEN)
+        else:
+            owner = student
+        if not owner.supervisor:
+            return Response({'error': 'No assigned supervisor.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        storage = object_storage.repository_storage()
+        try:
+            quotas.check_quota(owner, storage.size(key))
+        except upload_validation.UploadRejected as e:
+            storage.delete(key)
+            return Response({'error': e.message}, status=e.status_code)
+
+        document = Document.objects.create(
+            content_type=ContentType.objects.get_for_model(owner),
+            object_id=owner.pk,
+            supervisor=owner.supervisor,
+            title=title,
+            file=key,
+        )
+        return Response(DocumentSerializer(document, context={'request': request}).data, status=status.HTTP_201_CREATED)
+
+
+class LocalObjectStorageView(APIView):
+    """
+    Serves the presigned URLs of LocalObjectStorage, standing in for an S3-compatible endpoint
+    in development and tests. Access is granted by the signed token alone.
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def _verify(self, token, method):
+        try:
+            payload = object_storage.LocalObjectStorage.verify(token)
+        except signing.BadSignature:
+            return None
+        return payload if payload['method'] == method else None
+
+    def put(self, request, token):
+        payload = self._verify(token, 'PUT')
+        if payload is None:
+            return Response({'error': 'Invalid or expired URL.'}, status=status.HTTP_403_FORBIDDEN)
+
+        path = object_storage.get_object_storage().path(payload['key'])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        max_size, written = payload.get('max_size'), 0
+        with open(path + '.part', 'wb') as target:
+            for chunk in iter(lambda: request._request.read(storage_tiers.CHUNK_SIZE), b''):
+                written += len(chunk)
+                if max_size and written > max_size:
+                    target.close()
+                    os.remove(path + '.part')
+                    return Response({'error': 'Upload too large.'}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+                target.write(chunk)
+        os.replace(path + '.part', path)
+        return Response(status=status.HTTP_200_OK)
+
+    def get(self, request, token):
+        payload = self._verify(token, 'GET')
+        if payload is None:
+            return Response({'error': 'Invalid or expired URL.'}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            source = open(object_storage.get_object_storage().path(payload['key']), 'rb')
+        except FileNotFoundError:
+            return Response({'error': 'File not found in storage.'}, status=status.HTTP_404_NOT_FOUND)
+        return FileResponse(source, as_attachment=True, filename=payload.get('filename') or os.path.basename(payload['key']))
+
+
+class StorageUsageReportView(APIView):
+    """
+    Top storage consumers among students and groups, read from the StorageUsage counters
+    (Admin only). ?owner=student|group restricts the report, ?limit sets its length.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        if not request.user.groups.filter(name='Admin').exists():
+            return Response({'error': 'Unauthorized access'}, status=status.HTTP_403_FORBIDDEN)
+
+        usage = StorageUsage.objects.select_related('student', 'group').order_by('-bytes')
+        owner = request.query_params.get('owner')
+        if owner == 'student':
+            usage = usage.filter(student__isnull=False)
+        elif owner == 'group':
+            usage = usage.filter(group__isnull=False)
+        try:
+            limit = max(min(int(request.query_params.get('limit', 20)), 500), 1)
+        except ValueError:
+            return Response({'error': 'limit must be a number.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        data = []
+        for row in usage[:limit]:
+            owner = row.student or row.group
+            quota = quotas.quota_for(owner)
+            data.append({
+                'owner_type': 'student' if row.student_id else 'group',
+                'owner_id': owner.pk,
+                'name': row.student.full_name if row.student_id else row.group.name,
+                'reg_number': row.student.reg_number if row.student_id else None,
+                'bytes': row.bytes,
+                'files': row.files,
+                'quota': quota,
+                'percent_used': round(100 * row.bytes / quota, 1) if quota else None,
+                'updated_at': row.updated_at,
+            })
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class AuditLogView(APIView):
+    """
+    Audit events, newest first (Admin only), from ?from to ?to (ISO dates or datetimes, a
+    date-only ?to including that day; the last 30 days by default), optionally of one ?actor (user id), ?action, ?target_type and
+    ?target_id. Pages of ?limit events (default 100) continue with ?before=<next_before>.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        if not request.user.groups.filter(name='Admin').exists():
+            return Response({'error': 'Unauthorized access'}, status=status.HTTP_403_FORBIDDEN)
+
+        params = request.query_params
+        try:
+            end = audit.parse_moment(params.get('to'), end_of_day=True) or timezone.now()
+            start = audit.parse_moment(params.get('from')) or end - timedelta(days=30)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = max(min(int(params.get('limit', 100)), 1000), 1)
+            numbers = {key: int(params[key]) for key in ('actor', 'target_id', 'before') if params.get(key)}
+        except ValueError:
+            return Response({'error': 'actor, target_id, before and limit must be numbers.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        events = AuditEvent.objects.between(start, end).select_related('actor')
+        if 'actor' in numbers:
+            events = events.filter(actor_id=numbers['actor'])
+        if params.get('action'):
+            events = events.filter(action=params['action'])
+        if params.get('target_type'):
+            events = events.filter(target_type=params['target_type'])
+        if 'target_id' in numbers:
+            events = events.filter(target_id=numbers['target_id'])
+        if 'before' in numbers:
+            events = events.filter(id__lt=numbers['before'])
+
+        page = list(events.order_by('-id')[:limit + 1])
+        return Response({
+            'results': AuditEventSerializer(page[:limit], many=True).data,
+            'next_before': page[limit - 1].id if len(page) > limit else None,
+        }, status=status.HTTP_200_OK)